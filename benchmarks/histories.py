@@ -0,0 +1,114 @@
+"""Synthetic SWF histories
+
+generate_history builds the raw events SWF would return for a
+BenchWorkflow execution that ran to completion: every step schedules
+and completes one activity, some steps sleep on a timer first and some
+activities fail once and are retried.
+"""
+from flowbee import compression
+from flowbee.models import TaskMeta
+
+META = TaskMeta(
+    task_token="token",
+    run_id="run",
+    workflow_id="workflow",
+    domain="flowbee-bench",
+    tasklist="flowbee-bench-tasks"
+)
+
+IDENTIFIER = "com.flowbee-bench.BenchWorkflow.workflow.run"
+
+
+class HistoryBuilder(object):
+
+    def __init__(self, payload_size=64):
+        self.events = []
+        self.payload = compression.compress_b64_json({"data": "x" * payload_size})
+
+    def add(self, event_type, attributes_name=None, **attributes):
+        event = {
+            "eventId": len(self.events) + 1,
+            "eventType": event_type,
+        }
+
+        if attributes_name is not None:
+            event[attributes_name] = attributes
+
+        self.events.append(event)
+        return event["eventId"]
+
+    def timer(self):
+        started_id = self.add(
+            "TimerStarted", "timerStartedEventAttributes",
+            timerId=IDENTIFIER, startToFireTimeout="1"
+        )
+        self.add(
+            "TimerFired", "timerFiredEventAttributes",
+            timerId=IDENTIFIER, startedEventId=started_id
+        )
+
+    def schedule(self, attempt):
+        scheduled_id = self.add(
+            "ActivityTaskScheduled", "activityTaskScheduledEventAttributes",
+            activityId="{0}.work@0.0.1-{1}".format(IDENTIFIER, attempt),
+            activityType={"name": "work", "version": "0.0.1"},
+            taskList={"name": META.tasklist},
+            taskPriority="0",
+            input=self.payload
+        )
+        started_id = self.add(
+            "ActivityTaskStarted", "activityTaskStartedEventAttributes",
+            scheduledEventId=scheduled_id
+        )
+        return scheduled_id, started_id
+
+    def activity(self, step, fail):
+        scheduled_id, started_id = self.schedule(0)
+
+        if fail:
+            self.add(
+                "ActivityTaskFailed", "activityTaskFailedEventAttributes",
+                scheduledEventId=scheduled_id, startedEventId=started_id,
+                reason="Exception"
+            )
+            scheduled_id, started_id = self.schedule(1)
+
+        self.add(
+            "ActivityTaskCompleted", "activityTaskCompletedEventAttributes",
+            scheduledEventId=scheduled_id, startedEventId=started_id,
+            result=compression.compress_b64_json(step)
+        )
+
+
+def generate_history(num_events, timer_every=10, fail_every=25, payload_size=64):
+    """Raw events of a completed BenchWorkflow execution
+
+    :param num_events: approximate number of events, the history ends
+                       with the first step reaching it
+    :param timer_every: every n-th step sleeps first (0: never)
+    :param fail_every: every n-th activity fails once (0: never)
+    :param payload_size: size of the activity inputs
+    :returns: list of raw events, decision events excluded like
+              Decider.iter_history does
+    """
+    builder = HistoryBuilder(payload_size=payload_size)
+    builder.add("WorkflowExecutionStarted")
+    steps = 0
+
+    while len(builder.events) < num_events:
+        if timer_every and steps % timer_every == timer_every - 1:
+            builder.timer()
+
+        builder.activity(steps, fail=bool(fail_every) and steps % fail_every == fail_every - 1)
+        steps += 1
+
+    builder.events[0]["workflowExecutionStartedEventAttributes"] = {
+        "workflowType": {"name": "BenchWorkflow.BenchActivities", "version": "0.0.1"},
+        "taskList": {"name": META.tasklist},
+        "input": compression.compress_b64_json({
+            "steps": steps,
+            "timer_every": timer_every,
+        }),
+    }
+
+    return builder.events
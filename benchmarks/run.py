@@ -0,0 +1,240 @@
+"""Benchmark decider replay, event preparation, payload codecs and
+activity lookup
+
+    python -m benchmarks.run
+    python -m benchmarks.run --events 100,1000 --repeat 5 --compare 0.0.19
+
+Results are written to benchmarks/results/<flowbee version>.json, run
+the suite on two versions and --compare them to spot regressions.
+Peak memory is only measured on Python 3, through tracemalloc.
+"""
+from __future__ import print_function
+import gc
+import io
+import os
+import sys
+import json
+import platform
+import datetime
+import timeit
+import click
+import six
+
+# boto3 needs a region to build the SWF client, nothing is sent to SWF
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import flowbee  # noqa
+from flowbee import compression  # noqa
+from flowbee import exceptions  # noqa
+from flowbee.decisions import Decisions  # noqa
+from flowbee.deciders import Decider  # noqa
+from flowbee.deciders.history import CachedHistory  # noqa
+from flowbee.deciders.utils import prepare_event  # noqa
+from flowbee.workers import Worker  # noqa
+from .histories import (META, IDENTIFIER, generate_history)  # noqa
+from .workflow import (BenchWorkflow, activities_class)  # noqa
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+PAYLOAD_SIZES = (100, 10000, 1000000)
+LOOKUPS = 1000
+
+
+def bench_entrypoint(num_events):
+    events = generate_history(num_events)
+    decider = Decider(BenchWorkflow(), history_cache_size=0)
+    workflow = decider.workflow
+    workflow.meta = META
+    workflow.client = decider.client
+    workflow.identifier = IDENTIFIER
+
+    def run():
+        workflow.decisions = workflow.activities.decisions = Decisions()
+
+        try:
+            decider.entrypoint(META, events)
+        except exceptions.WorkflowComplete:
+            pass
+
+    return run, {"events": len(events)}
+
+
+def bench_prepare_event(num_events):
+    events = generate_history(num_events)
+    history = CachedHistory()
+    history.extend(META, events)
+    index = history.index
+
+    def run():
+        for event in events:
+            prepare_event(META, event, index)
+
+    return run, {"events": len(events)}
+
+
+def payload(size):
+    """JSON document of roughly size characters, a mix of types"""
+    item = {"id": 123456, "name": "flowbee", "ratio": 0.25, "tags": ["a", "b"], "ok": True}
+    count = max(1, size // len(compression.to_json(item)))
+    return {"items": [dict(item, id=index) for index in range(count)]}
+
+
+def bench_compress(size):
+    value = payload(size)
+
+    def run():
+        compression.compress_b64_json(value)
+
+    return run, {"bytes": len(compression.to_json(value))}
+
+
+def bench_decompress(size):
+    value = compression.compress_b64_json(payload(size))
+
+    def run():
+        compression.decompress_b64_json(value)
+
+    return run, {"encoded": len(value)}
+
+
+def bench_find_activity(count):
+    cls = activities_class(count)
+
+    class LookupWorkflow(BenchWorkflow):
+        activities = cls()
+
+    worker = Worker(LookupWorkflow())
+
+    class Task(object):
+        name = "work_{0}".format(count - 1)
+        version = "0.0.1"
+
+    def run():
+        for _ in range(LOOKUPS):
+            worker.find_activity_in_workflow(Task)
+
+    return run, {"activities": count, "lookups": LOOKUPS}
+
+
+def cases(event_counts):
+    for count in event_counts:
+        yield "decider.entrypoint[{0}]".format(count), bench_entrypoint, count
+        yield "prepare_event[{0}]".format(count), bench_prepare_event, count
+
+    for size in PAYLOAD_SIZES:
+        yield "compress_b64_json[{0}]".format(size), bench_compress, size
+        yield "decompress_b64_json[{0}]".format(size), bench_decompress, size
+
+    yield "find_activity_in_workflow[200]", bench_find_activity, 200
+
+
+def measure(run, repeat):
+    times = []
+
+    for _ in range(repeat):
+        gc.collect()
+        start = timeit.default_timer()
+        run()
+        times.append(timeit.default_timer() - start)
+
+    times.sort()
+    result = {
+        "min": times[0],
+        "median": times[len(times) // 2],
+        "peak_memory": None,
+    }
+
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        run()
+        result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result
+
+
+def load(version):
+    path = os.path.join(RESULTS, "{0}.json".format(version))
+
+    if not os.path.exists(path):
+        return None
+
+    with io.open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(report):
+    if not os.path.isdir(RESULTS):
+        os.makedirs(RESULTS)
+
+    path = os.path.join(RESULTS, "{0}.json".format(report["version"]))
+
+    with io.open(path, "w", encoding="utf-8") as f:
+        f.write(six.text_type(json.dumps(report, indent=2, sort_keys=True)))
+
+    return path
+
+
+def format_memory(value):
+    if value is None:
+        return "-"
+
+    return "{0:.1f}MB".format(value / 1048576.0)
+
+
+@click.command()
+@click.option('--events', default="100,1000,5000,25000", help="Comma separated history sizes")
+@click.option('--repeat', default=3, help="Timed runs per benchmark, the minimum and median are reported")
+@click.option('--filter', "name_filter", default=None, help="Only run benchmarks whose name contains this")
+@click.option('--compare', default=None, help="flowbee version whose stored results to compare with")
+@click.option('--save/--no-save', "save_results", default=True, help="Store results for this flowbee version")
+def main(events, repeat, name_filter, compare, save_results):
+    event_counts = [int(value) for value in events.split(",") if value]
+    baseline = load(compare) if compare else None
+
+    if compare and baseline is None:
+        raise click.BadParameter("No stored results for version '{0}'".format(compare))
+
+    report = {
+        "version": flowbee.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.datetime.utcnow().isoformat(),
+        "results": {},
+    }
+
+    print("{0:<36} {1:>10} {2:>10} {3:>10} {4:>8}".format(
+        "benchmark", "min", "median", "memory", "change"))
+
+    for name, bench, argument in cases(event_counts):
+        if name_filter and name_filter not in name:
+            continue
+
+        run, params = bench(argument)
+        result = measure(run, repeat)
+        result["params"] = params
+        report["results"][name] = result
+
+        change = ""
+        previous = (baseline or {}).get("results", {}).get(name)
+
+        if previous:
+            change = "{0:+.0%}".format(result["min"] / previous["min"] - 1)
+
+        print("{0:<36} {1:>9.4f}s {2:>9.4f}s {3:>10} {4:>8}".format(
+            name, result["min"], result["median"],
+            format_memory(result["peak_memory"]), change))
+
+        sys.stdout.flush()
+
+    if save_results:
+        print("Results stored in {0}".format(save(report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Workflow replayed by the decider benchmarks"""
+from flowbee.activities import (Activities, Workflow)
+from flowbee.activities.utils import (activity, entrypoint, workflow)
+
+
+class BenchActivities(Activities):
+
+    @activity(version="0.0.1", retries=1)
+    def work(self, step):
+        return step
+
+
+@workflow(domain="flowbee-bench", tasklist="flowbee-bench-tasks")
+class BenchWorkflow(Workflow):
+    activities = BenchActivities()
+
+    @entrypoint(version="0.0.1")
+    def start(self, input=None):
+        timer_every = input["timer_every"]
+
+        for step in range(input["steps"]):
+            if timer_every and step % timer_every == timer_every - 1:
+                self.activities.sleep(1)
+
+            self.activities.work(step)
+
+
+def activities_class(count):
+    """Activities class with count activities, to benchmark lookups"""
+    attributes = {}
+
+    for index in range(count):
+        def work(self, index=index):
+            return index
+
+        work.__name__ = "work_{0}".format(index)
+        attributes[work.__name__] = activity(version="0.0.1")(work)
+
+    return type("ManyActivities", (Activities,), attributes)
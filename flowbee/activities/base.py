@@ -1,9 +1,19 @@
 from __future__ import absolute_import
 import logging
 import uuid
+import itertools
+from concurrent.futures import (ThreadPoolExecutor, FIRST_COMPLETED, wait)
 from .. import utils
 from .. import compression
-from .utils import timer
+from .. import exceptions
+from .. import ratelimit
+from ..models import StartResult
+from ..decisions import Decisions
+from .utils import (timer, schedule_options, payload_serializer, entrypoint_table)
+from .futures import (
+    ActivityFuture, ChildWorkflowFuture, CANCEL_EVENTS, CHILD_FAILURES, future_id, child_workflow_id
+)
+from ..workers import heartbeat
 
 
 log = logging.getLogger(__name__)
@@ -15,6 +25,257 @@ class Activities(object):
         self.client = utils.get_client()
         self.meta = None
         self.is_decider = False
+        self.decisions = Decisions()
+        self.future_events = {}
+        self.future_sequence = 0
+        self.child_sequence = 0
+
+    def start_activity(self, method, args, kwargs):
+        """Start an activity without waiting for its result
+
+        Called through `self.activities.<activity>.start(*args, **kwargs)`,
+        see `wait_all` and `wait_any` to collect the results.
+
+        :returns: ActivityFuture
+        """
+        if self.is_decider is False:
+            return self.run_activity(method, args, kwargs)
+
+        activity_id = future_id(
+            self.workflow.identifier, method.swf_name,
+            method.swf_version, self.future_sequence
+        )
+        self.future_sequence += 1
+
+        future = ActivityFuture(activity_id, method.swf_name, method.swf_version)
+        events = self.future_events.get(activity_id)
+
+        if not events:
+            log.info("Scheduling Activity '%s@%s' as a future", method.swf_name, method.swf_version)
+            payload = compression.compress_b64_json(
+                {"args": args, "kwargs": kwargs},
+                serializer=payload_serializer(method, self.workflow)
+            )
+            self.decisions.schedule_activity(
+                tasklist=self.workflow.meta.tasklist,
+                activity_id=activity_id,
+                name=method.swf_name,
+                version=method.swf_version,
+                payload=payload,
+                **schedule_options(method)
+            )
+            return future
+
+        # cancellation requests don't change the state of the activity,
+        # it keeps running until the worker reports back
+        state_events = [event for event in events if event.type not in CANCEL_EVENTS]
+        last_event = state_events[-1]
+
+        if last_event.type == "ActivityTaskCompleted":
+            future.set_result(event=last_event)
+
+        elif last_event.type == "ActivityTaskCanceled":
+            future.set_exception(
+                exceptions.ActivityCancelledException(
+                    last_event.details or "Activity cancelled"),
+                event=last_event
+            )
+
+        elif last_event.type in ("ActivityTaskFailed", "ActivityTaskTimedOut"):
+            if last_event.num_retries <= method.swf_retries:
+                self.decisions.append(last_event.retry_decision())
+            else:
+                future.set_exception(
+                    exceptions.RetryLimitExceededException(), event=last_event
+                )
+
+        return future
+
+    def run_activity(self, method, args, kwargs):
+        future = ActivityFuture(None, method.swf_name, method.swf_version)
+
+        try:
+            future.set_result(method(self, *args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+        return future
+
+    def cancel(self, future):
+        """Request cancellation of an activity started as a future
+
+        The worker running the activity sees the request with its next
+        heartbeat, the future fails with ActivityCancelledException once
+        the worker acknowledges it. Only activities declared with a
+        heartbeat_timeout can observe cancellation.
+        """
+        if self.is_decider is False or future.done():
+            return
+
+        events = self.future_events.get(future.activity_id, [])
+
+        if any(event.type == "ActivityTaskCancelRequested" for event in events):
+            # requested by an earlier decision task
+            return
+
+        scheduled = [event for event in events if event.type == "ActivityTaskScheduled"]
+
+        if not scheduled:
+            # scheduled by this decision task, it never has to start
+            self.decisions.discard_activity("{0}-0".format(future.activity_id))
+            future.set_exception(
+                exceptions.ActivityCancelledException("Activity cancelled before it started")
+            )
+            return
+
+        log.info("Requesting cancellation of activity '%s@%s'", future.name, future.version)
+        self.decisions.request_cancel_activity(scheduled[-1].activity_id)
+
+    def start_child_workflow(self, workflow_class, input=None, version="0.0.1", **options):
+        """Start a child workflow execution without waiting for its result
+
+        The child has its own history and is decided by the deciders of
+        its @workflow's tasklist, see `wait_all`, `wait_any` and
+        `map_child_workflows` to collect the results.
+
+        :param workflow_class: @workflow class of the child
+        :param input: JSON serializable input of the child's @entrypoint
+        :param version: @entrypoint version of the child
+        :param options: see flowbee.decisions.child_workflow_decision
+        :returns: ChildWorkflowFuture
+        """
+        if self.is_decider is False:
+            raise exceptions.DeciderException("Child workflows can only be started by a decider")
+
+        if version not in entrypoint_table(workflow_class):
+            raise exceptions.DeciderException("No @entrypoint found in {0}.{1} for version {2}".format(
+                workflow_class.__module__, workflow_class.__name__, version)
+            )
+
+        # cls.name is set with @workflow() from activities.utils
+        name = "{0}.{1}".format(workflow_class.name, workflow_class.activities.name)
+        workflow_id = child_workflow_id(self.workflow.meta, workflow_class.name, self.child_sequence)
+        self.child_sequence += 1
+
+        future = ChildWorkflowFuture(workflow_id, name, version)
+        events = self.future_events.get(workflow_id)
+
+        if not events:
+            log.info("Starting child workflow '%s@%s'", name, version)
+            options.setdefault("tasklist", workflow_class.tasklist)
+
+            if input is not None:
+                options["input"] = compression.compress_b64_json(input, serializer=workflow_class.serializer)
+
+            self.decisions.start_child_workflow(workflow_id, name, version, **options)
+            return future
+
+        last_event = events[-1]
+
+        if last_event.type == "ChildWorkflowExecutionCompleted":
+            future.set_result(event=last_event)
+
+        elif last_event.type in CHILD_FAILURES:
+            future.set_exception(
+                exceptions.ChildWorkflowFailedException(
+                    "Child workflow '{0}' {1}: {2}".format(
+                        workflow_id, last_event.type, last_event.reason or last_event.details or "")
+                ),
+                event=last_event
+            )
+
+        return future
+
+    def map_child_workflows(self, workflow_class, inputs, concurrency=10, version="0.0.1", **options):
+        """Run a child workflow for every input, at most `concurrency`
+        of them at a time
+
+        Blocks the workflow like `wait_all`. A child is started as soon as
+        an earlier one closes, inputs must be the same on every replay.
+
+        :param workflow_class: @workflow class of the children
+        :param inputs: input of each child
+        :param concurrency: maximum number of children running at once
+        :param options: see `start_child_workflow`
+        :returns: list of results in the order of inputs
+        :raises ChildWorkflowFailedException: as soon as a child fails
+        """
+        inputs = list(inputs)
+        futures = []
+        running = 0
+
+        for input in inputs:
+            if running >= concurrency:
+                break
+
+            future = self.start_child_workflow(workflow_class, input, version=version, **options)
+            futures.append(future)
+
+            if future.state == ActivityFuture.FAILED:
+                raise future.exception
+
+            if not future.done():
+                running += 1
+
+        if len(futures) == len(inputs) and not running:
+            return [future.result() for future in futures]
+
+        raise exceptions.ActivityTaskScheduled()
+
+    def heartbeat(self, details=None):
+        """Report progress of the running activity
+
+        Heartbeats are sent in the background, this only records the
+        details sent with the next one. A no-op for activities without
+        a heartbeat_timeout.
+
+        :param details: progress details, up to 2048 characters
+        :raises ActivityCancelledException: once cancellation of the
+                                            activity has been requested
+        """
+        current = heartbeat.current()
+
+        if current is not None:
+            current.report(details)
+
+    @property
+    def cancel_requested(self):
+        """True once cancellation of the running activity has been requested"""
+        current = heartbeat.current()
+        return current is not None and current.cancel_requested
+
+    def wait_all(self, *futures):
+        """Block the workflow until every future has completed
+
+        Pending activities are scheduled together in a single decision.
+
+        :param futures: ActivityFutures, or a single list of them
+        :returns: list of results in the order of futures
+        """
+        futures = flatten_futures(futures)
+
+        for future in futures:
+            if future.state == ActivityFuture.FAILED:
+                raise future.exception
+
+        if all(future.done() for future in futures):
+            return [future.result() for future in futures]
+
+        raise exceptions.ActivityTaskScheduled()
+
+    def wait_any(self, *futures):
+        """Block the workflow until at least one future has completed
+
+        :param futures: ActivityFutures, or a single list of them
+        :returns: the future that completed first according to the history
+        """
+        futures = flatten_futures(futures)
+        done = [future for future in futures if future.done()]
+
+        if done:
+            return min(done, key=lambda future: future.closed_event_id or 0)
+
+        raise exceptions.ActivityTaskScheduled()
 
     @timer
     def sleep(self, seconds):
@@ -29,9 +290,7 @@ class Activities(object):
             seconds = 0
 
         log.info("Scheduling '%s' to continue %ss from now", identifier, seconds)
-        utils.schedule_later(
-            client=self.client,
-            task_token=self.workflow.meta.task_token,
+        self.decisions.start_timer(
             seconds=seconds,
             timer_id=identifier
         )
@@ -39,7 +298,20 @@ class Activities(object):
         return identifier
 
 
+def flatten_futures(futures):
+    if len(futures) == 1 and isinstance(futures[0], (list, tuple)):
+        return list(futures[0])
+
+    return list(futures)
+
+
 class Workflow(object):
+    # set with @workflow(serializer=...)
+    serializer = None
+    # set with @workflow(max_history_events=..., max_history_bytes=...)
+    max_history_events = None
+    max_history_bytes = None
+
     @classmethod
     def cancel_execution(cls, workflow_id, run_id, reason, details="", child_policy="TERMINATE"):
         """Cancel Workflow Execution
@@ -67,11 +339,11 @@ class Workflow(object):
 
         try:
             log.debug("Canceling workflow execution with: %s", kwargs)
-            response = client.terminate_workflow_execution(**kwargs)
+            response = utils.request(client, "terminate_workflow_execution", **kwargs)
         except Exception as e:
             message = (
                 "Failed to cancel workflow '{}' with run_id '{}' "
-                "reason: {}".format(workflow_id, run_id, e.message)
+                "reason: {}".format(workflow_id, run_id, exceptions.get_message(e))
             )
             log.error(message)
             raise Exception(message)
@@ -81,7 +353,7 @@ class Workflow(object):
         except KeyError as e:
             message = (
                 "Failed to get status code from cancel "
-                "response. Missing key: '{}' {}".format(e.message, response)
+                "response. Missing key: '{}' {}".format(e.args[0], response)
             )
             log.error(message)
             raise Exception(message)
@@ -119,6 +391,101 @@ class Workflow(object):
         :param task_start_to_close_timeout: How long before this task is resent to the decider
         :returns: (workflow_id, run_id)
         """
+        kwargs = cls.execution_request(
+            input=input, version=version, child_policy=child_policy, priority=priority,
+            workflow_id=workflow_id, execution_start_to_close_timeout=execution_start_to_close_timeout,
+            task_start_to_close_timeout=task_start_to_close_timeout
+        )
+        workflow_type = kwargs["workflowType"]
+
+        client = utils.get_client()
+
+        try:
+            log.debug("Starting workflow execution with: %s", kwargs)
+            result = utils.request(client, "start_workflow_execution", **kwargs)
+        except Exception as e:
+            log.error(
+                "Failed to start workflow '%s@%s' "
+                "reason: %s",
+                workflow_type["name"], workflow_type["version"], exceptions.get_message(e)
+            )
+            raise
+
+        return kwargs["workflowId"], result["runId"]
+
+    @classmethod
+    def start_executions(cls, inputs, concurrency=10, rate=None, **options):
+        """Start an execution for every input
+
+        Requests are sent from a thread pool sharing the process' SWF
+        client. Inputs are read as the pool frees up, so any iterable
+        works, including generators that never fit in memory.
+
+        :param inputs: iterable of @entrypoint inputs
+        :param concurrency: StartWorkflowExecution requests in flight,
+                            keep it within the client's pool size
+        :param rate: maximum requests per second (default: unlimited)
+        :param options: arguments of start_execution but input and
+                        workflow_id, ids are generated for every input
+        :returns: generator of StartResult(input, workflow_id, run_id,
+                  error) in completion order, error is the exception
+                  that failed the input or None
+        """
+        if "workflow_id" in options:
+            raise ValueError("start_executions generates a workflow id for every input")
+
+        client = utils.get_client()
+        limiter = ratelimit.RateLimiter(rate) if rate else None
+
+        def start(input):
+            workflow_id = None
+
+            try:
+                kwargs = cls.execution_request(input=input, **options)
+                workflow_id = kwargs["workflowId"]
+
+                if limiter is not None:
+                    limiter.acquire()
+
+                result = utils.request(client, "start_workflow_execution", **kwargs)
+            except Exception as e:
+                log.error("Failed to start workflow '%s': %s", workflow_id, exceptions.get_message(e))
+                return StartResult(input, workflow_id, None, e)
+
+            return StartResult(input, workflow_id, result["runId"], None)
+
+        inputs = iter(inputs)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        pending = set()
+
+        try:
+            while True:
+                # a few inputs queued ahead keep every thread busy
+                for input in itertools.islice(inputs, concurrency * 2 - len(pending)):
+                    pending.add(executor.submit(start, input))
+
+                if not pending:
+                    return
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    yield future.result()
+        finally:
+            # the caller stopped iterating, drop what hasn't started
+            for future in pending:
+                future.cancel()
+
+            executor.shutdown(wait=False)
+
+    @classmethod
+    def execution_request(
+        cls, input=None, version="0.0.1",
+        child_policy="TERMINATE", priority=0, workflow_id=None,
+        execution_start_to_close_timeout=60,
+        task_start_to_close_timeout=10,
+    ):
+        """StartWorkflowExecution parameters, see start_execution"""
         domain = cls.domain
         tasklist = cls.tasklist
         workflow_type_version = version
@@ -129,24 +496,17 @@ class Workflow(object):
         )
 
         if input is not None:
-            input = compression.compress_b64_json(input)
+            input = compression.compress_b64_json(input, serializer=cls.serializer)
 
         if workflow_id is None:
             workflow_id = "{0}-{1}".format(workflow_type_name, uuid.uuid4().hex)
 
-        entrypoint = None
-
-        for name, method in cls.__dict__.iteritems():
-            if hasattr(method, "is_entrypoint") \
-               and method.version == version:
-                entrypoint = True
-
-        if entrypoint is None:
+        if version not in entrypoint_table(cls):
             raise Exception("No @entrypoint found in {0}.{1} for version {2}".format(
                 cls.__module__, cls.__name__, version)
             )
 
-        kwargs = {
+        return {
             "domain": domain,
             "workflowId": workflow_id,
             "workflowType": {
@@ -163,25 +523,56 @@ class Workflow(object):
             "childPolicy": child_policy
         }
 
-        client = utils.get_client()
-
-        try:
-            log.debug("Starting workflow execution with: %s", kwargs)
-            result = client.start_workflow_execution(**kwargs)
-        except Exception as e:
-            log.error(
-                "Failed to start workflow '%s@%s' "
-                "reason: %s",
-                workflow_type_name, workflow_type_version, e.message
-            )
-            raise
-
-        run_id = result["runId"]
-        workflow_id = workflow_id
-
-        return workflow_id, run_id
-
     def __init__(self):
         self.meta = None
         self.client = None
         self.identifier = None
+        self.decisions = None
+        # set by the decider while replaying
+        self.history = None
+        self.started_event = None
+
+    def continue_as_new(self, state=None, version=None, **options):
+        """Close this run and start a new one with state as its input
+
+        Every decision task replays the full history, long lived
+        workflows keep their decisions fast by carrying their state into
+        a fresh run now and then. The new run calls the @entrypoint of
+        `version` with input=state and keeps this run's tasklist,
+        priority, child policy and timeouts unless given in options.
+
+        :param state: JSON serializable input of the new run
+        :param version: @entrypoint version of the new run (default: this run's)
+        :param options: see flowbee.decisions.continue_as_new_decision
+        :raises WorkflowContinuedAsNew: always, the replay ends here
+        """
+        started = self.started_event
+        kwargs = dict(started.execution_options, **options)
+        kwargs["version"] = version or started.workflow_version
+
+        if state is not None:
+            kwargs["input"] = compression.compress_b64_json(state, serializer=self.serializer)
+
+        log.info("Continuing '%s' as new", self.identifier)
+        self.decisions.continue_as_new(**kwargs)
+        raise exceptions.WorkflowContinuedAsNew()
+
+    def checkpoint(self, state=None):
+        """Continue as new with state once the history outgrows
+        max_history_events or max_history_bytes
+
+        Only checked once the replay has caught up with the history,
+        earlier checkpoints replay as they ran. Call it where state holds
+        all the workflow needs to resume and no activity or timer is in
+        flight, e.g. at the top of a polling loop.
+        """
+        history = self.history
+
+        if history is None or self.activities.event_queue:
+            return
+
+        events = self.max_history_events
+        size = self.max_history_bytes
+
+        if (events and history.last_event_id >= events) or (size and history.payload_bytes >= size):
+            self.continue_as_new(state)
@@ -0,0 +1,183 @@
+from __future__ import absolute_import
+import logging
+import re
+import hashlib
+from .. import exceptions
+
+log = logging.getLogger(__name__)
+
+# activity id prefixes of futures end with '#<sequence>', see future_id
+FUTURE_ID = re.compile(r"#\d+$")
+
+# SWF's limit, child ids start with the parent's id
+MAX_WORKFLOW_ID_LENGTH = 256
+
+ACTIVITY_EVENTS = frozenset([
+    "ActivityTaskScheduled",
+    "ActivityTaskStarted",
+    "ActivityTaskCompleted",
+    "ActivityTaskFailed",
+    "ActivityTaskTimedOut",
+    "ActivityTaskCancelRequested",
+    "ActivityTaskCanceled",
+    "RequestCancelActivityTaskFailed",
+])
+
+# events of cancellation requests, see Activities.cancel
+CANCEL_EVENTS = frozenset([
+    "ActivityTaskCancelRequested",
+    "RequestCancelActivityTaskFailed",
+])
+
+# child workflows are always futures, matched by their workflow id
+CHILD_EVENTS = frozenset([
+    "StartChildWorkflowExecutionInitiated",
+    "StartChildWorkflowExecutionFailed",
+    "ChildWorkflowExecutionStarted",
+    "ChildWorkflowExecutionCompleted",
+    "ChildWorkflowExecutionFailed",
+    "ChildWorkflowExecutionTimedOut",
+    "ChildWorkflowExecutionCanceled",
+    "ChildWorkflowExecutionTerminated",
+])
+
+CHILD_FAILURES = frozenset([
+    "StartChildWorkflowExecutionFailed",
+    "ChildWorkflowExecutionFailed",
+    "ChildWorkflowExecutionTimedOut",
+    "ChildWorkflowExecutionCanceled",
+    "ChildWorkflowExecutionTerminated",
+])
+
+
+def future_id(identifier, name, version, sequence):
+    return "{0}.{1}@{2}#{3}".format(identifier, name, version, sequence)
+
+
+def child_workflow_id(meta, name, sequence):
+    """Workflow id of a child, unique to the parent's run so a parent
+    continued as new never collides with the children of its previous
+    runs
+
+    SWF rejects ids with ':', '/' or '|' and run ids may contain '/',
+    the run is identified by a digest of its id instead.
+    """
+    run = hashlib.sha1(meta.run_id.encode("utf-8")).hexdigest()[:12]
+    workflow_id = "{0}.{1}.{2}#{3}".format(meta.workflow_id, run, name, sequence)
+
+    if len(workflow_id) > MAX_WORKFLOW_ID_LENGTH:
+        parent = hashlib.sha1(meta.workflow_id.encode("utf-8")).hexdigest()
+        workflow_id = "{0}.{1}.{2}#{3}".format(parent, run, name, sequence)
+
+    return workflow_id
+
+
+def is_future_event(event):
+    if event.type in CHILD_EVENTS:
+        return True
+
+    if event.type not in ACTIVITY_EVENTS:
+        return False
+
+    return FUTURE_ID.search(event.activity_prefix) is not None
+
+
+def split_events(events):
+    """Separate the events of activities started as futures
+
+    Sequential activities and timers replay by walking the history in
+    order, futures are matched back to their events by activity id.
+
+    :returns: (sequential events, {activity id prefix or child
+              workflow id: [events]})
+    """
+    sequential = []
+    futures = {}
+
+    for event in events:
+        if event.type in CHILD_EVENTS:
+            futures.setdefault(event.workflow_id, []).append(event)
+        elif is_future_event(event):
+            futures.setdefault(event.activity_prefix, []).append(event)
+        else:
+            sequential.append(event)
+
+    return sequential, futures
+
+
+class ActivityFuture(object):
+    """Result of an activity started with `activity.start()`
+
+    Futures are rebuilt on every decision task while the workflow
+    replays, their state comes from the latest attempt found in the
+    history for their activity id.
+    """
+
+    PENDING = "PENDING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+    def __init__(self, activity_id, name, version):
+        self.activity_id = activity_id
+        self.name = name
+        self.version = version
+        self.state = self.PENDING
+        self.event = None
+        self.exception = None
+        self._result = None
+
+    def __repr__(self):
+        return "<ActivityFuture '{0}@{1}' {2}>".format(self.name, self.version, self.state)
+
+    @property
+    def closed_event_id(self):
+        if self.event is None:
+            return None
+
+        return self.event.event_id
+
+    def done(self):
+        return self.state != self.PENDING
+
+    def set_result(self, result=None, event=None):
+        self.state = self.COMPLETED
+        self.event = event
+        self._result = result
+
+    def set_exception(self, exception, event=None):
+        self.state = self.FAILED
+        self.event = event
+        self.exception = exception
+
+    def result(self):
+        if self.state == self.PENDING:
+            raise exceptions.DeciderException(
+                "Activity '{0}@{1}' has not completed, wait for it first".format(
+                    self.name, self.version)
+            )
+
+        if self.exception is not None:
+            raise self.exception
+
+        # completed events decode their payload lazily
+        if self.event is not None:
+            return self.event.payload
+
+        return self._result
+
+
+class ChildWorkflowFuture(ActivityFuture):
+    """Result of a child workflow started with
+    `activities.start_child_workflow()`
+
+    Completes with the value returned by the child's @entrypoint, fails
+    with ChildWorkflowFailedException when the child fails, times out,
+    is canceled or terminated or could not be started.
+    """
+
+    @property
+    def workflow_id(self):
+        return self.activity_id
+
+    def __repr__(self):
+        return "<ChildWorkflowFuture '{0}' {1}>".format(self.activity_id, self.state)
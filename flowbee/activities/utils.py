@@ -1,10 +1,15 @@
 from __future__ import absolute_import
 import logging
+import functools
 from collections import deque
 from functools import wraps
+import six
 from .. import exceptions
-from .. import utils
 from .. import compression
+from .. import compat
+from .. import serializers
+from .. import logs
+from .futures import split_events
 
 log = logging.getLogger(__name__)
 
@@ -24,7 +29,14 @@ def timer(func):
             raise exceptions.TimerStarted()
 
         if event.type == "TimerStarted":
-            next_event = self.event_queue.popleft()
+            try:
+                next_event = self.event_queue.popleft()
+            except IndexError:
+                # the decision task was triggered by something else,
+                # an activity future for example, the timer is still
+                # running
+                raise exceptions.TimerStarted()
+
             try:
                 assert(next_event.type == "TimerFired")
             except:
@@ -37,17 +49,102 @@ def timer(func):
     return action
 
 
-def activity(name=None, version="0.0.1", retries=0):
+class ActivityMethod(object):
+    """Wraps an @activity so instances expose `start()` on it
+
+    `self.activities.stage1(...)` runs the activity and blocks the
+    workflow until it completes, `self.activities.stage1.start(...)`
+    returns an ActivityFuture instead so several activities can be
+    scheduled in the same decision.
+    """
+
+    def __init__(self, action):
+        functools.update_wrapper(self, action)
+        self.action = action
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        return BoundActivityMethod(self, instance)
+
+    def __call__(self, instance, *args, **kwargs):
+        return self.action(instance, *args, **kwargs)
+
+
+class BoundActivityMethod(object):
+    def __init__(self, method, instance):
+        self.method = method
+        self.instance = instance
+
+    def __getattr__(self, name):
+        return getattr(self.method, name)
+
+    def __call__(self, *args, **kwargs):
+        return self.method.action(self.instance, *args, **kwargs)
+
+    def start(self, *args, **kwargs):
+        return self.instance.start_activity(self.method, args, kwargs)
+
+
+EXECUTORS = ("thread", "process")
+
+
+def payload_serializer(method, workflow=None):
+    """Serializer name for an activity's payloads, the activity's own
+    or else the workflow's"""
+    return getattr(method, "swf_serializer", None) or getattr(workflow, "serializer", None)
+
+
+def schedule_options(method):
+    """Timeouts of an @activity for the ScheduleActivityTask decision"""
+    heartbeat_timeout = getattr(method, "swf_heartbeat_timeout", None)
+
+    return {
+        "timeout": str(getattr(method, "swf_timeout", 10)),
+        "heartbeat_timeout": "NONE" if heartbeat_timeout is None else str(heartbeat_timeout),
+    }
+
+
+def activity(name=None, version="0.0.1", retries=0, executor=None,
+             timeout=10, heartbeat_timeout=None, serializer=None):
+    """Declare an SWF activity
+
+    :param executor: where workers run the activity, "thread" or
+                     "process" for CPU bound activities (default: the
+                     worker's executor)
+    :param timeout: seconds the activity may take from being scheduled
+                    to completing, raise it for long running activities
+    :param heartbeat_timeout: seconds without heartbeat after which SWF
+                              times the activity out, workers send
+                              heartbeats automatically (default: no
+                              heartbeats)
+    :param serializer: serializer of the activity's input and result,
+                       see flowbee.serializers (default: the workflow's)
+    """
+    if executor is not None and executor not in EXECUTORS:
+        raise ValueError(
+            "Unknown executor '{0}', expected one of {1}".format(executor, EXECUTORS)
+        )
+
+    if serializer is not None:
+        serializers.get_serializer(serializer)
+
     def wrap(func):
         name_value = name
 
         if name_value is None:
-            name_value = func.func_name
+            name_value = func.__name__
 
         func.swf_version = version
         func.swf_name = name_value
         func.swf_retries = retries
+        func.swf_executor = executor
+        func.swf_timeout = timeout
+        func.swf_heartbeat_timeout = heartbeat_timeout
+        func.swf_serializer = serializer
         func.is_activity = True
+        func.is_coroutine = compat.iscoroutinefunction(func)
 
         @wraps(func)
         def action(self, *args, **kwargs):
@@ -64,22 +161,25 @@ def activity(name=None, version="0.0.1", retries=0):
 
             if event is None:
                 payload = {"args": args, "kwargs": kwargs}
-                z_payload = compression.compress_b64_json(payload)
+                z_payload = compression.compress_b64_json(
+                    payload, serializer=payload_serializer(func, self.workflow)
+                )
 
                 activity_id = "{0}.{1}@{2}".format(
                     self.workflow.identifier, func.swf_name, func.swf_version
                 )
 
-                log.info("Scheduling Activity '%s@%s' with payload %s", func.swf_name, func.swf_version, z_payload)
-                print("Scheduling Activity")
-                utils.schedule_activity(
-                    client=self.client,
+                log.info(
+                    "Scheduling Activity '%s@%s'", func.swf_name, func.swf_version,
+                    extra=logs.fields(activity_id=activity_id, payload_size=len(z_payload))
+                )
+                self.decisions.schedule_activity(
                     tasklist=self.workflow.meta.tasklist,
                     activity_id=activity_id,
-                    task_token=self.workflow.meta.task_token,
                     name=func.swf_name,
                     version=func.swf_version,
                     payload=z_payload,
+                    **schedule_options(func)
                 )
                 raise exceptions.ActivityTaskScheduled()
 
@@ -91,24 +191,33 @@ def activity(name=None, version="0.0.1", retries=0):
 
                 # --- next_event = self.event_queue.popleft()
 
-                # WARNING THIS WILL NOT HANDLE PARALLEL TASK
-                # DECISIONS. IT *WILL* BLOW UP. PARALLEL TASK
-                # DECISIONS WILL REQUIRE A REFACTOR
+                # Sequential calls are matched by their position in the
+                # history, activities running in parallel must be
+                # started with `.start()` which returns a future that
+                # is matched by activity id instead.
                 #
                 # because we can retry, we need to find the last
-                # activity event in the chain (NOT PARALLEL SAFE)
+                # activity event in the chain
+
+                next_event = event
 
                 while len(self.event_queue) > 0:
                     next_event = self.event_queue.popleft()
                     if next_event.type == "ActivityTaskCompleted":
                         break
 
+                if next_event.type == "ActivityTaskScheduled" or \
+                   next_event.type == "ActivityTaskStarted":
+                    # still running, the decision task was triggered
+                    # by something else, an activity future for example
+                    raise exceptions.ActivityTaskScheduled()
+
                 if next_event.type == "ActivityTaskFailed" or \
                    next_event.type == "ActivityTaskTimedOut":
 
                     if next_event.num_retries <= func.swf_retries:
                         log.info("ActivityTask timed out, Retrying...")
-                        next_event.retry()
+                        self.decisions.append(next_event.retry_decision())
                         if next_event.type == "ActivityTaskFailed":
                             raise exceptions.ActivityFailedException()
                         if next_event.type == "ActivityTaskTimedOut":
@@ -118,7 +227,7 @@ def activity(name=None, version="0.0.1", retries=0):
 
                 if next_event.type == "ActivityTaskCompleted":
                     return next_event.payload
-        return action
+        return ActivityMethod(action)
     return wrap
 
 
@@ -130,9 +239,13 @@ def entrypoint(version="0.0.1"):
         @wraps(func)
         def action(self, meta, events, *args, **kwargs):
             complete = False
-            event_queue = deque(events)
+            sequential_events, future_events = split_events(events)
+            event_queue = deque(sequential_events)
             self.activities.event_history = events
             self.activities.event_queue = event_queue
+            self.activities.future_events = future_events
+            self.activities.future_sequence = 0
+            self.activities.child_sequence = 0
             self.activities.meta = meta
             self.activities.workflow = self
 
@@ -140,10 +253,11 @@ def entrypoint(version="0.0.1"):
 
             if first_event.type != "WorkflowExecutionStarted":
                 raise exceptions.DeciderException(
-                    "Unexpected first event '%s' expecting "
-                    "'WorkflowExecutionStarted'", first_event.type
+                    "Unexpected first event '{0}' expecting "
+                    "'WorkflowExecutionStarted'".format(first_event.type)
                 )
 
+            self.started_event = first_event
             kwargs["input"] = first_event.payload
 
             try:
@@ -152,7 +266,7 @@ def entrypoint(version="0.0.1"):
             except:
                 raise
             if complete:
-                raise exceptions.WorkflowComplete()
+                raise exceptions.WorkflowComplete(result)
         return action
 
     # the user just used @entrypoint with no arguments
@@ -165,12 +279,105 @@ def entrypoint(version="0.0.1"):
     return wrap
 
 
-def workflow(domain, tasklist):
+def class_attributes(cls):
+    """Attributes of cls including inherited ones, subclasses win"""
+    attributes = {}
+
+    for klass in reversed(cls.__mro__):
+        attributes.update(klass.__dict__)
+
+    return attributes
+
+
+def activity_table(activities_class):
+    """(name, version) -> @activity method of an Activities class
+
+    Built once per class, @workflow builds it when the workflow is
+    declared.
+
+    :raises ValueError: when two methods declare the same activity
+    """
+    table = activities_class.__dict__.get("swf_activities")
+
+    if table is not None:
+        return table
+
+    table = {}
+
+    for attribute, method in sorted(six.iteritems(class_attributes(activities_class))):
+        if not getattr(method, "is_activity", False):
+            continue
+
+        key = (method.swf_name, method.swf_version)
+
+        if key in table:
+            raise ValueError(
+                "Activity '{0}@{1}' is declared twice on {2}".format(
+                    key[0], key[1], activities_class.__name__)
+            )
+
+        table[key] = method
+
+    activities_class.swf_activities = table
+    return table
+
+
+def entrypoint_table(workflow_class):
+    """version -> @entrypoint method of a Workflow class
+
+    :raises ValueError: when two entrypoints share a version
+    """
+    table = workflow_class.__dict__.get("swf_entrypoints")
+
+    if table is not None:
+        return table
+
+    table = {}
+
+    for attribute, method in sorted(six.iteritems(class_attributes(workflow_class))):
+        if not getattr(method, "is_entrypoint", False):
+            continue
+
+        if method.version in table:
+            raise ValueError(
+                "Entrypoint version '{0}' is declared twice on {1}".format(
+                    method.version, workflow_class.__name__)
+            )
+
+        table[method.version] = method
+
+    workflow_class.swf_entrypoints = table
+    return table
+
+
+def workflow(domain, tasklist, serializer=None, max_history_events=None, max_history_bytes=None):
+    """Declare an SWF workflow
+
+    :param serializer: serializer of the workflow input and of its
+                       activities' payloads, see flowbee.serializers
+                       (default: the fastest JSON backend installed)
+    :param max_history_events: Workflow.checkpoint continues as new
+                               once the history has this many events
+    :param max_history_bytes: Workflow.checkpoint continues as new once
+                              the history's payloads add up to this size
+    """
+    if serializer is not None:
+        # fail on import, not on the first payload
+        serializers.get_serializer(serializer)
 
     def wrap(cls):
         cls.domain = domain
         cls.tasklist = tasklist
 
+        if serializer is not None:
+            cls.serializer = serializer
+
+        if max_history_events is not None:
+            cls.max_history_events = max_history_events
+
+        if max_history_bytes is not None:
+            cls.max_history_bytes = max_history_bytes
+
         if not hasattr(cls, "activities"):
             raise ValueError("@workflows must specify an 'activities' class level attribute")
 
@@ -180,6 +387,10 @@ def workflow(domain, tasklist):
         if not hasattr(cls.activities.__class__, "name"):
             cls.activities.__class__.name = cls.activities.__class__.__name__
 
+        # dispatch tables, workers and deciders never scan the classes
+        entrypoint_table(cls)
+        activity_table(cls.activities.__class__)
+
         return cls
 
     return wrap
@@ -3,14 +3,14 @@ import os
 import sys
 import logging
 import click
-from .utils import (init_environment, init_logging)
+from .utils import (init_environment, init_logging, init_client, init_metrics, init_rate_limits)
 from .runner import Runner
 from ..deciders import Decider
 from .. import utils
 
 
 class DeciderRunner(Runner):
-    def process(self, workflow_name, environ=None, log_config=None, log_level="INFO"):
+    def process(self, workflow_name, environ=None, log_config=None, log_level="INFO", history_cache_size=100, runtime="sync", pollers=None, page_size=None):
         log = logging.getLogger("flowbee.cli.decider")
 
         pid = os.getpid()
@@ -25,7 +25,18 @@ class DeciderRunner(Runner):
         log.debug("Loaded decider workflow '%s'", workflow_name)
 
         workflow = workflow_class()
-        decider = Decider(workflow)
+        if runtime == "asyncio":
+            # Python 3.7+ only, imported on demand
+            from ..deciders.aio import AsyncDecider
+            decider = AsyncDecider(
+                workflow,
+                history_cache_size=history_cache_size,
+                pollers=pollers or 4,
+                page_size=page_size
+            )
+        else:
+            decider = Decider(workflow, history_cache_size=history_cache_size, page_size=page_size)
+
         decider.poll()
 
 
@@ -36,12 +47,32 @@ class DeciderRunner(Runner):
 @click.option('--environ', "-e", default=None, help="Enviroment variables to load")
 @click.option('--log-config', default=None, help="Standard python logging configuration formatted file")
 @click.option('--log-level', default="INFO", help="Logging level. Specifying a log config negates this option")
-def main(workflow, sync, environ, log_config, log_level):
+@click.option('--pool-size', default=None, type=int, help="SWF client HTTP connection pool size")
+@click.option('--connect-timeout', default=None, type=int, help="SWF client connect timeout in seconds")
+@click.option('--read-timeout', default=None, type=int, help="SWF client read timeout in seconds, must exceed the 60s long poll")
+@click.option('--retry-mode', default=None, type=click.Choice(["legacy", "standard", "adaptive"]), help="SWF client retry mode")
+@click.option('--max-attempts', default=None, type=int, help="SWF client maximum retry attempts")
+@click.option('--history-cache-size', default=100, help="Number of workflow executions to keep decoded history for")
+@click.option('--runtime', default="sync", type=click.Choice(["sync", "asyncio"]), help="Poll decision tasks in a loop or concurrently on an asyncio event loop (Python 3.7+)")
+@click.option('--pollers', default=None, type=int, help="Number of concurrent decision task polls with the asyncio runtime, defaults to 4")
+@click.option('--page-size', default=None, type=int, help="Events per decision task history page, up to 1000")
+def main(workflow, sync, environ, log_config, log_level,
+         pool_size, connect_timeout, read_timeout, retry_mode, max_attempts,
+         history_cache_size, runtime, pollers, page_size):
     log_level = log_level.upper()
     # load environment first as logging can use environment
     # var expansion via os.path.expandvars
     init_environment(environ)
     init_logging(log_config, workflow=workflow, log_level=log_level)
+    init_client(
+        pool_size=pool_size,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retry_mode=retry_mode,
+        max_attempts=max_attempts
+    )
+    init_metrics()
+    init_rate_limits()
 
     runner = DeciderRunner(
         workflow=workflow,
@@ -50,7 +81,13 @@ def main(workflow, sync, environ, log_config, log_level):
         log_level=log_level
     )
 
-    runner.start(sync=sync)
+    runner.start(
+        sync=sync,
+        history_cache_size=history_cache_size,
+        runtime=runtime,
+        pollers=pollers,
+        page_size=page_size
+    )
 
 if __name__ == "__main__":
     main()
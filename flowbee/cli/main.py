@@ -2,19 +2,37 @@ import os
 from circus import get_arbiter
 from circus.pidfile import Pidfile
 import click
+from .. import ratelimit
 
 
 @click.command()
 @click.version_option(version='0.0.1')
 @click.option('--type', required=True, type=click.Choice(["worker", "decider", "both"]))
 @click.option('--workers', "-w", default=1, help="Number of workers.")
+@click.option('--concurrency', "-c", default=1, help="Number of activities each worker runs at the same time")
+@click.option('--pollers', default=None, type=int, help="Number of concurrent activity task polls per worker")
+@click.option('--runtime', default="sync", type=click.Choice(["sync", "asyncio"]), help="Run workers and deciders on threads or on an asyncio event loop (Python 3.7+)")
+@click.option('--executor', default="thread", type=click.Choice(["thread", "process"]), help="Default executor for worker activities, use process for CPU bound activities")
+@click.option('--processes', default=None, type=int, help="Size of each worker's process pool, defaults to the number of cores")
 @click.option('--workflow', "-f", required=True, help="Python path for workflow ex: foo.bar.Baz")
 @click.option('--pidfile', "-p", default=None, help="PID file")
 @click.option('--sync/--no-sync', default=True, help="Should AWS SWF Resources be created?")
 @click.option('--environ', "-e", default=None, help="Enviroment variables to load")
 @click.option('--log-config', default=None, help="Standard python logging configuration formatted file")
 @click.option('--log-level', default="INFO", help="Logging level. Specifying a log config negates this option")
-def main(type, workers, workflow, pidfile, sync, environ, log_config, log_level):
+@click.option('--pool-size', default=None, type=int, help="SWF client HTTP connection pool size")
+@click.option('--connect-timeout', default=None, type=int, help="SWF client connect timeout in seconds")
+@click.option('--read-timeout', default=None, type=int, help="SWF client read timeout in seconds, must exceed the 60s long poll")
+@click.option('--retry-mode', default=None, type=click.Choice(["legacy", "standard", "adaptive"]), help="SWF client retry mode")
+@click.option('--max-attempts', default=None, type=int, help="SWF client maximum retry attempts")
+@click.option('--poll-rate', default=None, help="Polls per second across all processes, RATE[:BURST]")
+@click.option('--respond-rate', default=None, help="Task responses and heartbeats per second across all processes, RATE[:BURST]")
+@click.option('--start-rate', default=None, help="Execution starts and terminations per second across all processes, RATE[:BURST]")
+@click.option('--register-rate', default=None, help="Domain and type registrations per second across all processes, RATE[:BURST]")
+@click.option('--rate-file', default=None, help="File the processes share their rate limits through")
+def main(type, workers, concurrency, pollers, runtime, executor, processes, workflow, pidfile, sync, environ, log_config, log_level,
+         pool_size, connect_timeout, read_timeout, retry_mode, max_attempts,
+         poll_rate, respond_rate, start_rate, register_rate, rate_file):
     log_level = log_level.upper()
 
     types = []
@@ -26,6 +44,16 @@ def main(type, workers, workflow, pidfile, sync, environ, log_config, log_level)
     if pidfile is None:
         pidfile = "/tmp/flowbee_{}.pid".format(type)
 
+    # the processes copy this environment, see flowbee.ratelimit
+    share_rate_limits(
+        type,
+        poll=poll_rate,
+        respond=respond_rate,
+        start=start_rate,
+        register=register_rate,
+        path=rate_file
+    )
+
     apps = build_apps(
         types,
         workers=workers,
@@ -33,7 +61,19 @@ def main(type, workers, workflow, pidfile, sync, environ, log_config, log_level)
         sync=sync,
         environ=environ,
         log_config=log_config,
-        log_level=log_level
+        log_level=log_level,
+        concurrency=concurrency,
+        pollers=pollers,
+        runtime=runtime,
+        executor=executor,
+        processes=processes,
+        client_options={
+            "pool-size": pool_size,
+            "connect-timeout": connect_timeout,
+            "read-timeout": read_timeout,
+            "retry-mode": retry_mode,
+            "max-attempts": max_attempts,
+        }
     )
 
     arbiter = get_arbiter(
@@ -52,7 +92,27 @@ def main(type, workers, workflow, pidfile, sync, environ, log_config, log_level)
         arbiter.stop()
 
 
-def build_apps(types, workers, workflow, sync, environ, log_config, log_level, **kw):
+def share_rate_limits(type, **limits):
+    """Export the rate limits for the processes to share
+
+    Rates fall back to the FLOWBEE_RATE_* environment variables, once
+    any is set the processes share them through a file, by default
+    /tmp/flowbee_<type>.ratelimit
+    """
+    for key, value in limits.items():
+        if value is not None:
+            os.environ[ratelimit.RATE_ENVIRON[key]] = str(value)
+
+    limited = any(os.getenv(ratelimit.RATE_ENVIRON[family]) for family in ratelimit.FAMILIES)
+    path = ratelimit.RATE_ENVIRON["path"]
+
+    if limited and not os.getenv(path):
+        os.environ[path] = "/tmp/flowbee_{}.ratelimit".format(type)
+
+
+def build_apps(types, workers, workflow, sync, environ, log_config, log_level,
+               concurrency=1, pollers=None, runtime="sync", executor="thread",
+               processes=None, client_options=None, **kw):
     apps = []
     for type in types:
         app = build_app(
@@ -63,13 +123,21 @@ def build_apps(types, workers, workflow, sync, environ, log_config, log_level, *
             environ=environ,
             log_config=log_config,
             log_level=log_level,
+            concurrency=concurrency,
+            pollers=pollers,
+            runtime=runtime,
+            executor=executor,
+            processes=processes,
+            client_options=client_options,
             **kw
         )
         apps.append(app)
     return apps
 
 
-def build_app(type, workers, workflow, sync, environ, log_config, log_level, **kw):
+def build_app(type, workers, workflow, sync, environ, log_config, log_level,
+              concurrency=1, pollers=None, runtime="sync", executor="thread",
+              processes=None, client_options=None, **kw):
     cmd = [
         "python",
         "-m", "flowbee.cli.{}".format(type),
@@ -90,6 +158,25 @@ def build_app(type, workers, workflow, sync, environ, log_config, log_level, **k
     if log_level:
         cmd.extend(["--log-level", log_level])
 
+    if type == "worker":
+        cmd.extend(["--concurrency", str(concurrency)])
+
+        if pollers:
+            cmd.extend(["--pollers", str(pollers)])
+
+        if executor != "thread":
+            cmd.extend(["--executor", executor])
+
+        if processes:
+            cmd.extend(["--processes", str(processes)])
+
+    if runtime != "sync":
+        cmd.extend(["--runtime", runtime])
+
+    for option, value in sorted((client_options or {}).items()):
+        if value is not None:
+            cmd.extend(["--{}".format(option), str(value)])
+
     app = {
         "cmd": " ".join(cmd),
         "numprocesses": workers,
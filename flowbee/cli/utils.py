@@ -5,6 +5,10 @@ import os
 import os.path
 import json
 import dotenv
+from .. import utils
+from .. import logs
+from .. import metrics
+from .. import ratelimit
 
 
 def normalize_path(path):
@@ -33,11 +37,33 @@ def init_environment(filename):
         raise
 
 
+def init_client(pool_size=None, connect_timeout=None, read_timeout=None,
+                retry_mode=None, max_attempts=None):
+    utils.configure_client(
+        max_pool_connections=pool_size,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retry_mode=retry_mode,
+        max_attempts=max_attempts
+    )
+
+
+def init_metrics():
+    """Start the exporters set up in FLOWBEE_METRICS_PORT and FLOWBEE_STATSD"""
+    metrics.configure_metrics()
+
+
+def init_rate_limits():
+    """Set up the limiters from FLOWBEE_RATE_* and FLOWBEE_RATE_FILE"""
+    ratelimit.configure_rate_limits()
+
+
 def init_logging(filename, workflow, log_level="INFO"):
     if filename is None:
         logging.config.dictConfig(
             default_logging_config(workflow=workflow, log_level=log_level)
         )
+        logs.configure_logging()
         return
 
     path = normalize_path(filename)
@@ -48,6 +74,7 @@ def init_logging(filename, workflow, log_level="INFO"):
         result = json.loads(data)
 
     logging.config.dictConfig(result)
+    logs.configure_logging()
 
 
 def default_logging_config(workflow=None, log_level="INFO"):
@@ -55,7 +82,8 @@ def default_logging_config(workflow=None, log_level="INFO"):
         "version": 1,
         "formatters": {
             "simple": {
-                "format": '[%(levelname)s] %(asctime)s %(message)s'
+                "()": "flowbee.logs.KeyValueFormatter",
+                "fmt": '[%(levelname)s] %(asctime)s %(message)s'
             }
         },
         "handlers": {
@@ -3,14 +3,15 @@ import os
 import sys
 import logging
 import click
-from .utils import (init_environment, init_logging)
+from .utils import (init_environment, init_logging, init_client, init_metrics, init_rate_limits)
 from .runner import Runner
 from ..workers import Worker
 from .. import utils
 
 
 class WorkerRunner(Runner):
-    def process(self, workflow_name, environ=None, log_config=None, log_level="INFO"):
+    def process(self, workflow_name, environ=None, log_config=None, log_level="INFO", concurrency=1, pollers=None, runtime="sync",
+                executor="thread", processes=None):
         log = logging.getLogger("flowbee.cli.worker")
 
         pid = os.getpid()
@@ -25,7 +26,21 @@ class WorkerRunner(Runner):
         log.debug("Loaded worker workflow '%s'", workflow_name)
 
         workflow = workflow_class()
-        worker = Worker(workflow)
+        if runtime == "asyncio":
+            # Python 3.7+ only, imported on demand
+            from ..workers.aio import AsyncWorker
+            worker_class = AsyncWorker
+        else:
+            worker_class = Worker
+
+        worker = worker_class(
+            workflow,
+            concurrency=concurrency,
+            pollers=pollers,
+            executor=executor,
+            processes=processes
+        )
+
         worker.poll()
 
 
@@ -36,12 +51,44 @@ class WorkerRunner(Runner):
 @click.option('--environ', "-e", default=None, help="Enviroment variables to load")
 @click.option('--log-config', default=None, help="Standard python logging configuration formatted file")
 @click.option('--log-level', default="INFO", help="Logging level. Specifying a log config negates this option")
-def main(workflow, sync, environ, log_config, log_level):
+@click.option('--pool-size', default=None, type=int, help="SWF client HTTP connection pool size")
+@click.option('--connect-timeout', default=None, type=int, help="SWF client connect timeout in seconds")
+@click.option('--read-timeout', default=None, type=int, help="SWF client read timeout in seconds, must exceed the 60s long poll")
+@click.option('--retry-mode', default=None, type=click.Choice(["legacy", "standard", "adaptive"]), help="SWF client retry mode")
+@click.option('--max-attempts', default=None, type=int, help="SWF client maximum retry attempts")
+@click.option('--concurrency', "-c", default=1, help="Number of activities to run at the same time")
+@click.option('--pollers', default=None, type=int, help="Number of concurrent activity task polls, defaults to min(concurrency, 4)")
+@click.option('--runtime', default="sync", type=click.Choice(["sync", "asyncio"]), help="Run activities on threads or on an asyncio event loop (Python 3.7+)")
+@click.option('--executor', default="thread", type=click.Choice(["thread", "process"]), help="Default executor for activities that don't set one, use process for CPU bound activities")
+@click.option('--processes', default=None, type=int, help="Size of the process pool for process activities, defaults to the number of cores")
+def main(workflow, sync, environ, log_config, log_level,
+         pool_size, connect_timeout, read_timeout, retry_mode, max_attempts,
+         concurrency, pollers, runtime, executor, processes):
     log_level = log_level.upper()
     # load environment first as logging can use environment
     # var expansion via os.path.expandvars
     init_environment(environ)
     init_logging(log_config, workflow=workflow, log_level=log_level)
+    if pool_size is None and concurrency > 1:
+        # every poller holds a connection for up to 60s and every
+        # running activity needs one to respond, on asyncio the
+        # blocking calls are bounded by the thread pool
+        pollers = pollers or min(concurrency, 4)
+        running = min(concurrency, 32) if runtime == "asyncio" else concurrency
+        pool_size = max(
+            utils.CLIENT_DEFAULTS["max_pool_connections"],
+            running + pollers
+        )
+
+    init_client(
+        pool_size=pool_size,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retry_mode=retry_mode,
+        max_attempts=max_attempts
+    )
+    init_metrics()
+    init_rate_limits()
 
     runner = WorkerRunner(
         workflow=workflow,
@@ -50,7 +97,14 @@ def main(workflow, sync, environ, log_config, log_level):
         log_level=log_level
     )
 
-    runner.start(sync=sync)
+    runner.start(
+        sync=sync,
+        concurrency=concurrency,
+        pollers=pollers,
+        runtime=runtime,
+        executor=executor,
+        processes=processes
+    )
 
 if __name__ == "__main__":
     main()
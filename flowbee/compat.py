@@ -0,0 +1,40 @@
+"""Python 2/3 helpers
+
+Coroutines only exist on Python 3, on Python 2 every check is False.
+"""
+from __future__ import absolute_import
+import inspect
+import multiprocessing
+from concurrent import futures
+
+
+def iscoroutinefunction(func):
+    check = getattr(inspect, "iscoroutinefunction", None)
+    return check is not None and check(func)
+
+
+def iscoroutine(value):
+    check = getattr(inspect, "iscoroutine", None)
+    return check is not None and check(value)
+
+
+def run_coroutine(coroutine):
+    """Run a coroutine to completion from synchronous code"""
+    import asyncio
+    return asyncio.run(coroutine)
+
+
+def process_pool_executor(max_workers=None):
+    """ProcessPoolExecutor whose children don't inherit the parent's state
+
+    Python 3 spawns fresh interpreters so the children never share the
+    poller threads' locks or the parent's SWF connections. Python 2 can
+    only fork, create the pool before starting any thread.
+    """
+    if hasattr(multiprocessing, "get_context"):
+        return futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    return futures.ProcessPoolExecutor(max_workers=max_workers)
@@ -1,50 +1,235 @@
+"""Payload encoding
+
+Payloads are serialized (see flowbee.serializers), compressed with one
+of the registered codecs and base64 encoded. The first character of an
+encoded payload is the tag of its codec, so the decoding side never
+needs to be told which codec was used:
+
+    z eJyrVkpUslJQSlKqBQAbvwPj
+
+Payloads written before codecs existed are untagged gzip, they always
+start with 'H4sI' (the base64 gzip magic) and still decode.
+"""
 from __future__ import absolute_import
 import logging
 import gzip
 import json
+import zlib
 import base64
-from cStringIO import StringIO
+from io import BytesIO
+import six
 from . import encoders
+from . import serializers
+from . import storage
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
 
 
 log = logging.getLogger(__name__)
 
+LEGACY_GZIP_PREFIX = "H4sI"
+
+# payloads smaller than min_size bytes are cheaper to send as is, the
+# codec header alone can outweigh the savings
+COMPRESSION_DEFAULTS = {
+    "codec": None,
+    "level": None,
+    "min_size": 128,
+}
+
+_compression_settings = dict(COMPRESSION_DEFAULTS)
+
+
+class Codec(object):
+
+    def __init__(self, name, tag, compress, decompress, level=None):
+        """Compression codec
+
+        :param name: name used by configure_compression
+        :param tag: single character prefixed to encoded payloads
+        :param compress: function(data, level) -> bytes
+        :param decompress: function(data) -> bytes
+        :param level: default compression level
+        """
+        self.name = name
+        self.tag = tag
+        self.level = level
+        self._compress = compress
+        self._decompress = decompress
+
+    def __repr__(self):
+        return "<Codec '{0}'>".format(self.name)
+
+    def compress(self, data, level=None):
+        return self._compress(data, self.level if level is None else level)
+
+    def decompress(self, data):
+        return self._decompress(data)
+
+
+CODECS = {}
+TAGS = {}
+
+
+def register_codec(codec):
+    if len(codec.tag) != 1 or codec.tag == LEGACY_GZIP_PREFIX[0]:
+        raise ValueError("Invalid tag '{0}' for codec '{1}'".format(codec.tag, codec.name))
+
+    CODECS[codec.name] = codec
+    TAGS[codec.tag] = codec
+
+
+def gzip_compress(data, level):
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=level) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+def gzip_decompress(data):
+    buffer = BytesIO(data)
+    gz_file = gzip.GzipFile(fileobj=buffer)
+    data = gz_file.read()
+    gz_file.close()
+
+    return data
+
+
+register_codec(Codec("none", "0", lambda data, level: data, lambda data: data))
+register_codec(Codec("zlib", "z", zlib.compress, zlib.decompress, level=6))
+register_codec(Codec("gzip", "g", gzip_compress, gzip_decompress, level=6))
+
+if lzma is not None:
+    register_codec(Codec(
+        "lzma", "x",
+        lambda data, level: lzma.compress(data, preset=level),
+        lzma.decompress,
+        level=6
+    ))
+
+if zstandard is not None:
+    register_codec(Codec(
+        "zstd", "s",
+        lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+        level=3
+    ))
+
+if lz4 is not None:
+    register_codec(Codec(
+        "lz4", "l",
+        lambda data, level: lz4.frame.compress(data, compression_level=level),
+        lz4.frame.decompress,
+        level=0
+    ))
+
+
+def configure_compression(codec=None, level=None, min_size=None):
+    """Configure how payloads are compressed
+
+    Decoding is not affected, every registered codec always decodes.
+
+    :param codec: name of the codec used for payloads of min_size bytes
+                  and more (default: zstd when installed, zlib otherwise)
+    :param level: compression level passed to the codec (default: the
+                  codec's own default)
+    :param min_size: payloads smaller than this are not compressed
+    """
+    if codec is not None and codec not in CODECS:
+        raise ValueError(
+            "Unknown codec '{0}', expected one of {1}".format(codec, sorted(CODECS))
+        )
+
+    _compression_settings.clear()
+    _compression_settings.update(COMPRESSION_DEFAULTS)
+    _compression_settings.update(
+        (key, value) for key, value in
+        (("codec", codec), ("level", level), ("min_size", min_size))
+        if value is not None
+    )
+
+
+def select_codec(size):
+    if size < _compression_settings["min_size"]:
+        return CODECS["none"]
+
+    if _compression_settings["codec"] is not None:
+        return CODECS[_compression_settings["codec"]]
+
+    return CODECS.get("zstd") or CODECS["zlib"]
+
 
 def to_json(data):
     return json.dumps(data, cls=encoders.JSONEncoder)
 
 
-def compress_b64_json(value):
-    result = compress_b64(to_json(value))
-    return result
+def compress_b64_json(value, serializer=None):
+    """Encode a payload for SWF, large payloads are offloaded to the
+    configured payload store, see flowbee.storage
+
+    :param serializer: serializer name (default: the fastest JSON
+                       backend installed)
+    """
+    result = compress_b64(serializers.dumps(value, serializer))
+    return storage.offload(result)
+
+
+def compress_b64(value, codec=None):
+    """Compress and base64 encode value, prefixed with the codec tag
 
+    :param codec: name of the codec to use (default: chosen by size)
+    """
+    if isinstance(value, six.text_type):
+        value = value.encode("utf-8")
 
-def compress_b64(value):
-    result = base64.b64encode(compress(value))
-    return result
+    if codec is None:
+        codec = select_codec(len(value))
+    else:
+        codec = CODECS[codec]
+
+    data = codec.compress(value, _compression_settings["level"])
+    return codec.tag + base64.b64encode(data).decode("ascii")
 
 
 def compress(value):
-    buffer = StringIO()
-    with gzip.GzipFile(fileobj=buffer, mode="w") as f:
-        f.write(value)
-    return buffer.getvalue()
+    """gzip value, the untagged legacy format"""
+    if isinstance(value, six.text_type):
+        value = value.encode("utf-8")
+
+    return gzip_compress(value, 9)
 
 
 def decompress_b64_json(value):
-    payload = json.loads(decompress_b64(value))
+    value = storage.resolve(value)
+    payload = serializers.loads(decompress_b64(value))
     return payload
 
 
 def decompress_b64(value):
-    bytes = base64.b64decode(value)
-    return decompress(bytes)
+    if value.startswith(LEGACY_GZIP_PREFIX):
+        return decompress(base64.b64decode(value))
 
+    try:
+        codec = TAGS[value[:1]]
+    except KeyError:
+        raise ValueError("Unknown payload codec tag '{0}'".format(value[:1]))
 
-def decompress(value):
-    buffer = StringIO(value)
-    gz_file = gzip.GzipFile(fileobj=buffer)
-    data = gz_file.read()
-    gz_file.close()
+    return codec.decompress(base64.b64decode(value[1:]))
 
-    return data
+
+def decompress(value):
+    """gunzip value, the untagged legacy format"""
+    return gzip_decompress(value)
@@ -0,0 +1,110 @@
+"""asyncio Decider runtime
+
+Requires Python 3.7+. Long polls and history pages are fetched
+concurrently on a thread pool while the workflow replays on the event
+loop, one decision task at a time.
+"""
+import asyncio
+import functools
+import logging
+from concurrent import futures
+from .base import Decider
+from .. import utils
+from .. import exceptions
+from .. import polling
+
+log = logging.getLogger(__name__)
+
+
+class AsyncDecider(Decider):
+
+    def __init__(self, workflow, history_cache_size=100, pollers=4, adaptive_pollers=True, page_size=None,
+                 max_pages=10):
+        super(AsyncDecider, self).__init__(
+            workflow, history_cache_size=history_cache_size, page_size=page_size, max_pages=max_pages
+        )
+        self.pollers = max(1, pollers)
+        self.thread_pool = None
+        self.scaler = None
+
+        if adaptive_pollers and self.pollers > 1:
+            self.scaler = polling.PollerScaler(self.pollers)
+
+    def poll(self):
+        asyncio.run(self.run())
+
+    async def run(self):
+        # every poller needs a thread for its long poll and one to
+        # fetch pages or respond while the next poll is running
+        self.thread_pool = futures.ThreadPoolExecutor(max_workers=self.pollers * 2)
+
+        log.info("Running %s decision pollers on asyncio", self.pollers)
+
+        try:
+            await asyncio.gather(*[
+                self.run_poller(index) for index in range(self.pollers)
+            ])
+        finally:
+            self.thread_pool.shutdown(wait=False)
+
+    async def call(self, func, *args, **kwargs):
+        """Run a blocking call on the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.thread_pool, functools.partial(func, *args, **kwargs)
+        )
+
+    async def run_poller(self, index=0):
+        while True:
+            while self.scaler is not None and not self.scaler.is_active(index):
+                await asyncio.sleep(1)
+
+            try:
+                task = await self.call(
+                    self.poll_for_task,
+                    domain=self.workflow.domain,
+                    identity=self.workflow.name,
+                    tasklist=self.workflow.tasklist
+                )
+
+                if self.scaler is not None:
+                    self.scaler.record(task is not None)
+
+                if task is None:
+                    continue
+
+                await self.handle_task_async(task)
+            except Exception as e:
+                log.exception(e)
+
+    async def handle_task_async(self, task):
+        meta = utils.get_task_meta(task, self.workflow.domain, self.workflow.tasklist)
+        history = self.get_history(meta, task)
+
+        pages = self.iter_history(task, history.last_event_id)
+        prepare_error = None
+
+        try:
+            # pages are fetched on the thread pool one at a time and
+            # prepared into history as they arrive, only iter_history
+            # holds any of them
+            while True:
+                page = await self.call(next, pages, None)
+
+                if page is None:
+                    break
+
+                try:
+                    history.extend(meta, *page)
+                except Exception as e:
+                    # decide() fails the workflow with it
+                    prepare_error = e
+                    break
+        except exceptions.HistoryException as e:
+            log.error(exceptions.get_message(e))
+            return
+
+        # decide() never awaits, the workflow instance is only ever
+        # replaying one execution at a time
+        decisions = self.decide(meta, task, history, prepare_error=prepare_error)
+        await self.call(self.respond, self.client, meta.task_token, decisions)
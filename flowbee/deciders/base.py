@@ -1,24 +1,44 @@
 from __future__ import absolute_import
+import time
 import logging
 import pprint
 from botocore.exceptions import ClientError
-from .utils import prepare_event
+from .history import (CachedHistory, HistoryCache)
+from ..decisions import Decisions
+from ..activities.utils import entrypoint_table
 from .. import utils
+from .. import compression
 from .. import exceptions
+from .. import logs
+from .. import metrics
+from .. import polling
 
 log = logging.getLogger(__name__)
 
+# SWF caps the result of CompleteWorkflowExecution at 32k characters
+MAX_RESULT_LENGTH = 32768
+
 
 class Decider(object):
-    def __init__(self, workflow):
+    def __init__(self, workflow, history_cache_size=100, page_size=None, max_pages=10):
+        """
+        :param page_size: events per history page, up to 1000 (default: SWF's)
+        :param max_pages: history pages held in memory while paging
+                          newest first, past it the history is streamed
+                          oldest first one page at a time
+        """
         self.workflow = workflow
         self.workflow.activities.is_decider = True
         self.meta = None
         self.client = utils.get_client()
+        self.history_cache = HistoryCache(max_size=history_cache_size)
+        self.backoff = polling.Backoff()
+        self.page_size = page_size
+        self.max_pages = max(1, max_pages)
 
     def poll(self):
         while True:
-            task, event_history = self.poll_for_task(
+            task = self.poll_for_task(
                 domain=self.workflow.domain,
                 identity=self.workflow.name,
                 tasklist=self.workflow.tasklist
@@ -27,77 +47,197 @@ class Decider(object):
             if task is None:
                 continue
 
-            last_event = event_history[-1]
-            log.debug("Received new task '%s'", last_event["eventType"])
+            self.handle_task(task)
+
+    def handle_task(self, task):
+        meta = utils.get_task_meta(task, self.workflow.domain, self.workflow.tasklist)
+        history = self.get_history(meta, task)
+
+        try:
+            decisions = self.decide(
+                meta, task, history, pages=self.iter_history(task, history.last_event_id)
+            )
+        except exceptions.HistoryException as e:
+            # a page failed to load, SWF will hand the task out
+            # again once taskStartToCloseTimeout expires
+            log.error(exceptions.get_message(e))
+            return
+
+        self.respond(self.client, meta.task_token, decisions)
 
-            meta = utils.get_task_meta(task, self.workflow.domain, self.workflow.tasklist)
-            client = self.client
+    def get_history(self, meta, task):
+        history = self.history_cache.get((meta.workflow_id, meta.run_id))
+        result = "hit"
 
-            self.meta = meta
-            self.workflow.meta = meta
-            self.workflow.client = client
-            self.workflow.identifier = "com.{0}.{1}.{2}.{3}".format(
-                meta.domain, self.workflow.name, meta.workflow_id, meta.run_id
+        if history is None:
+            log.debug("History cache miss for '%s'", meta.workflow_id)
+            history = CachedHistory()
+            result = "miss"
+        elif history.last_event_id < task.get("previousStartedEventId", 0):
+            log.debug(
+                "Cached history for '%s' is behind, another decider "
+                "handled the previous task", meta.workflow_id
             )
+            result = "behind"
+
+        metrics.increment("flowbee_history_cache_total", workflow=self.workflow.name, result=result)
+        return history
+
+    def decide(self, meta, task, history, event_history=(), pages=None, prepare_error=None):
+        """Replay the workflow and collect its decisions
+
+        :param event_history: raw events not yet seen by history
+        :param pages: (events, last event id) chunks prepared into
+                      history before the replay, see iter_history
+        :param prepare_error: exception raised while preparing pages
+                              into history beforehand, fails the
+                              workflow instead of replaying it
+        :returns: Decisions to answer the decision task with
+        :raises HistoryException: when one of pages could not be fetched
+        """
+        client = self.client
+        key = (meta.workflow_id, meta.run_id)
+        started = time.time()
 
+        log.debug("Received new task for '%s'", meta.workflow_id)
+
+        self.meta = meta
+        self.workflow.meta = meta
+        self.workflow.client = client
+        self.workflow.identifier = "com.{0}.{1}.{2}.{3}".format(
+            meta.domain, self.workflow.name, meta.workflow_id, meta.run_id
+        )
+
+        self.history_cache.put(key, history)
+
+        decisions = Decisions()
+        self.workflow.decisions = decisions
+        self.workflow.activities.decisions = decisions
+
+        try:
+            if prepare_error is not None:
+                raise prepare_error
+
+            for events, last_event_id in pages or ():
+                history.extend(meta, events, last_event_id)
+
+            self.entrypoint(meta, event_history, history, task.get("startedEventId"))
+        except exceptions.HistoryException:
+            raise
+        except (exceptions.EventException, exceptions.DeciderException) as e:
+            log.error("Workflow failed")
+            self.fail_workflow(
+                decisions,
+                reason=e.__class__.__name__,
+                details=exceptions.get_message(e)
+            )
+        except exceptions.RetryLimitExceededException as e:
+            message = "Retry limit exceeded, failing workflow"
+            log.error(message)
+            self.fail_workflow(
+                decisions,
+                reason=e.__class__.__name__,
+                details=exceptions.get_message(e)
+            )
+        except exceptions.TimerStarted:
+            pass
+        except exceptions.ActivityTimeoutException:
+            pass
+        except exceptions.ActivityFailedException:
+            pass
+        except exceptions.ActivityTaskScheduled:
+            pass
+        except exceptions.WorkflowComplete as e:
             try:
-                self.entrypoint(meta, event_history)
-            except (exceptions.EventException, exceptions.DeciderException) as e:
-                log.error("Workflow failed")
-                self.fail_workflow(
-                    client, meta.task_token,
-                    reason=e.__class__.__name__,
-                    details=e.message
-                )
-            except exceptions.RetryLimitExceededException as e:
-                message = "Retry limit exceeded, failing workflow"
-                log.error(message)
-                self.fail_workflow(
-                    client, meta.task_token,
-                    reason=e.__class__.__name__,
-                    details=e.message
-                )
-            except exceptions.TimerStarted:
-                continue
-            except exceptions.ActivityTimeoutException:
-                continue
-            except exceptions.ActivityFailedException:
-                continue
-            except exceptions.ActivityTaskScheduled:
-                continue
-            except exceptions.WorkflowComplete:
-                self.complete_workflow(client, meta.task_token)
-            except ClientError as e:
-                log.error(e.message)
-                self.fail_workflow(
-                    client, meta.task_token,
-                    reason=e.__class__.__name__,
-                    details=e.message
-                )
-            except Exception as e:
-                log.error("Unhandled Workflow Failure %s", e.message)
-                log.exception(e)
+                result = self.encode_result(e.result)
+            except Exception as error:
+                # a result SWF can't take fails the workflow, raising
+                # would abandon the task until it times out
+                log.error("Unable to encode the workflow result: %s", exceptions.get_message(error))
                 self.fail_workflow(
-                    client, meta.task_token,
-                    reason=e.__class__.__name__,
-                    details=e.message
+                    decisions,
+                    reason=error.__class__.__name__,
+                    details=exceptions.get_message(error)
                 )
-
-    def complete_workflow(self, client, task_token, result="success"):
-        try:
-            utils.complete_workflow(client, task_token, result=result)
+            else:
+                self.complete_workflow(decisions, result=result)
+        except exceptions.WorkflowContinuedAsNew:
+            pass
         except ClientError as e:
-            log.error("Unable to complete workflow: %s", e.message)
+            log.error(exceptions.get_message(e))
+            self.fail_workflow(
+                decisions,
+                reason=e.__class__.__name__,
+                details=exceptions.get_message(e)
+            )
+        except Exception as e:
+            log.error("Unhandled Workflow Failure %s", exceptions.get_message(e))
+            log.exception(e)
+            self.fail_workflow(
+                decisions,
+                reason=e.__class__.__name__,
+                details=exceptions.get_message(e)
+            )
+
+        if decisions.closed:
+            # the execution is closing, its history won't be needed again
+            self.history_cache.discard(key)
+
+        metrics.observe(
+            "flowbee_decision_seconds", time.time() - started,
+            workflow=self.workflow.name, tasklist=meta.tasklist
+        )
+        metrics.observe(
+            "flowbee_decision_events", len(history.events), buckets=metrics.SIZE_BUCKETS,
+            workflow=self.workflow.name
+        )
+
+        return decisions
 
-    def fail_workflow(self, client, task_token, reason, details=""):
+    def respond(self, client, task_token, decisions):
         try:
-            utils.fail_workflow(client, task_token, reason=reason, details=details)
+            decisions.flush(client, task_token)
         except ClientError as e:
-            log.error("Unable to fail workflow: %s", e.message)
+            log.error("Unable to respond to decision task: %s", exceptions.get_message(e))
 
-    def entrypoint(self, meta, event_history):
+    def complete_workflow(self, decisions, result="success"):
+        decisions.complete_workflow(result=result)
+
+    def encode_result(self, result):
+        """Result sent with CompleteWorkflowExecution, parents of child
+        workflows receive it, see Activities.start_child_workflow"""
+        if result is None:
+            return "success"
+
+        encoded = compression.compress_b64_json(result, serializer=self.workflow.serializer)
+
+        if len(encoded) > MAX_RESULT_LENGTH:
+            raise exceptions.DeciderException(
+                "Workflow result is {0} characters, SWF accepts up to {1}, "
+                "configure a payload store to offload it".format(len(encoded), MAX_RESULT_LENGTH)
+            )
+
+        return encoded
+
+    def fail_workflow(self, decisions, reason, details=""):
+        decisions.fail_workflow(reason=reason, details=details)
+
+    def entrypoint(self, meta, event_history, history=None, last_event_id=None):
+        """Replay the workflow against its event history
+
+        :param meta: TaskMeta of the current decision task
+        :param event_history: raw events not yet seen by history
+        :param history: CachedHistory holding the events prepared on
+                        previous decision tasks (default: empty)
+        :param last_event_id: newest event id of this decision task
+        """
         workflow = self.workflow
-        events = [prepare_event(meta, evt, event_history) for evt in event_history]
+
+        if history is None:
+            history = CachedHistory()
+
+        events = history.extend(meta, event_history, last_event_id)
+        workflow.history = history
 
         # event[0] should be WorkflowExecutionStarted, that will have workflow_name
         # and workflow_version, which we will use to match the entry point to
@@ -112,48 +252,155 @@ class Decider(object):
         version = events[0].workflow_version
 
         try:
-            entrypoint = [
-                name for name, obj in workflow.__class__.__dict__.iteritems()
-                if hasattr(obj, "is_entrypoint") and obj.version == version
-            ][0]
-        except IndexError:
+            entrypoint = entrypoint_table(workflow.__class__)[version]
+        except KeyError:
             log.error("No @entrypoint defined on workflow '%s' @ %s", workflow.__class__, version)
+            raise NameError(
+                "Unable to find @entrypoint for version '{0}' on {1}".format(
+                    version, workflow.__class__.__name__)
+            )
 
-        method = getattr(workflow, entrypoint)
-        method(meta, events)
+        entrypoint(workflow, meta, events)
 
     def filter_out_decision_events(self, events):
         events = (evt for evt in events if not evt["eventType"].startswith("Decision"))
         return events
 
-    def poll_for_task(self, domain, identity, tasklist, next_page_token=None):
+    def poll_for_task(self, domain, identity, tasklist):
         client = self.client
 
-        if next_page_token is None:
-            log.debug("Listening for Decision Task on '%s@%s'", tasklist, domain)
-        else:
-            log.debug("Fetching next page for '%s@%s'", tasklist, domain)
+        log.debug("Listening for Decision Task on '%s@%s'", tasklist, domain)
 
+        # newest events first, so a warm cache only needs the first pages
         task = utils.poll_for_decision_task(
             client=client,
             domain=domain,
             identity=identity,
             tasklist=tasklist,
-            next_page_token=next_page_token
+            reverse_order=True,
+            backoff=self.backoff,
+            maximum_page_size=self.page_size
+        )
+
+        return task
+
+    def fetch_page(self, task, next_page):
+        """Next newest first page of a decision task
+
+        :raises HistoryException: when the page could not be fetched
+        """
+        page = utils.poll_for_decision_task(
+            client=self.client,
+            domain=self.workflow.domain,
+            identity=self.workflow.name,
+            tasklist=self.workflow.tasklist,
+            next_page_token=next_page,
+            reverse_order=True,
+            backoff=self.backoff,
+            maximum_page_size=self.page_size
         )
 
-        if task is None:
-            return task, []
+        if page is None:
+            raise exceptions.HistoryException(
+                "Failed to fetch history page of '{0}'".format(task["workflowExecution"]["workflowId"])
+            )
+
+        return page
+
+    def iter_history(self, task, last_event_id=0):
+        """Yield the events of task newer than last_event_id, page by page
+
+        Pages are requested newest first and paging stops as soon as a
+        page reaches last_event_id, so a cached execution only downloads
+        the events added since it was last seen. Those pages are held
+        until the oldest one arrives; past max_pages they are dropped
+        and the history is streamed oldest first instead, so only one
+        raw page is ever held for the longest histories.
+
+        :returns: generator of (filtered events in ascending order, id
+                  of the newest event fetched, decision events included)
+        :raises HistoryException: when a page could not be fetched
+        """
+        pages = []
+        page = task
+
+        while True:
+            raw_events = page["events"]
+            new_events = [evt for evt in raw_events if evt["eventId"] > last_event_id]
+
+            if raw_events:
+                pages.append((list(self.filter_out_decision_events(new_events)), raw_events[0]["eventId"]))
+
+            next_page = page.get("nextPageToken")
+
+            if not next_page or len(new_events) < len(raw_events):
+                break
+
+            if len(pages) >= self.max_pages:
+                log.debug(
+                    "History of '%s' is over %s pages, streaming it oldest first",
+                    task["workflowExecution"]["workflowId"], self.max_pages
+                )
+                del pages[:]
+
+                for item in self.stream_history(task, last_event_id):
+                    yield item
+                return
+
+            page = self.fetch_page(task, next_page)
+
+        # popped so each page is released once it has been prepared
+        while pages:
+            events, newest_event_id = pages.pop()
+            events.reverse()
+            log.debug("Filtered events:\n%s", logs.lazy(pprint.pformat, events))
+            yield events, newest_event_id
+
+    def stream_history(self, task, last_event_id=0):
+        """Yield the events of task newer than last_event_id oldest first
+
+        Pages come from GetWorkflowExecutionHistory and stop at the
+        task's startedEventId, events recorded since then belong to the
+        next decision task.
+
+        :returns: generator of (filtered events in ascending order, id
+                  of the newest event fetched, decision events included)
+        :raises HistoryException: when a page could not be fetched
+        """
+        execution = task["workflowExecution"]
+        started_event_id = task["startedEventId"]
+        next_page = None
+
+        while True:
+            page = utils.get_workflow_execution_history(
+                client=self.client,
+                domain=self.workflow.domain,
+                workflow_id=execution["workflowId"],
+                run_id=execution["runId"],
+                next_page_token=next_page,
+                backoff=self.backoff,
+                maximum_page_size=self.page_size
+            )
+
+            if page is None:
+                raise exceptions.HistoryException(
+                    "Failed to fetch history page of '{0}'".format(execution["workflowId"])
+                )
+
+            raw_events = page["events"]
 
-        events = task["events"]
-        events = list(self.filter_out_decision_events(events))
+            if not raw_events:
+                return
 
-        log.debug("Filtered events:\n%s", pprint.pformat(events))
+            newest_event_id = min(raw_events[-1]["eventId"], started_event_id)
+            events = [
+                evt for evt in raw_events
+                if last_event_id < evt["eventId"] <= started_event_id
+            ]
 
-        next_page = task.get('nextPageToken')
+            yield list(self.filter_out_decision_events(events)), newest_event_id
 
-        if next_page:
-            _, more_events = self.poll_for_task(domain, identity, tasklist, next_page_token=next_page)
-            events.extend(more_events)
+            next_page = page.get("nextPageToken")
 
-        return task, events
+            if not next_page or newest_event_id >= started_event_id:
+                return
@@ -63,26 +63,78 @@ import logging
 from .. import exceptions
 from .. import compression
 from .. import utils
+from .history import activity_prefix
 
 log = logging.getLogger(__name__)
 
+NOT_DECODED = object()
+
 
 class DeciderEvent(object):
+    """Event prepared for replay
+
+    Only the fields replay needs are copied out of the raw event, so
+    neither the raw event nor the page it came from outlive preparation.
+    Events of long histories are kept by the history cache, hence the
+    __slots__ on every subclass.
+    """
+    __slots__ = ("type", "event_id", "raw_payload", "_payload")
 
-    def __init__(
-            self, meta, event, event_history):
-        self.client = utils.get_client()
-        self.meta = meta
+    def __init__(self, event, history):
         self.type = event["eventType"]
-        self.event = event
-        self.event_history = event_history
-        self.payload = None
+        self.event_id = event.get("eventId")
+        self.raw_payload = None
+        self._payload = NOT_DECODED
+
+        self.prepare_event(event, history)
+
+    def __repr__(self):
+        return "<{0} {1}>".format(self.type, self.event_id)
 
-        self.prepare_event()
+    @property
+    def payload(self):
+        """Decoded payload, decompressed on first access
 
-    def prepare_event(self, event):
+        Replaying a history only touches a few payloads, so events
+        keep the encoded value around and only pay the gunzip + JSON
+        cost when the workflow actually reads it.
+        """
+        if self._payload is NOT_DECODED:
+            if self.raw_payload is None:
+                self._payload = None
+            else:
+                self._payload = self.deserialize(self.raw_payload)
+
+        return self._payload
+
+    def prepare_event(self, event, history):
         raise NotImplementedError()
 
+    def get_scheduled_activity(self, event, attributes, history):
+        """Prepared ActivityTaskScheduled event an activity event refers
+        to through its scheduledEventId"""
+        try:
+            scheduled_event_id = attributes["scheduledEventId"]
+        except (KeyError, TypeError):
+            message = "Unable to lookup 'scheduledEventId' in {0}".format(event)
+            log.error(message)
+            raise exceptions.EventException(message=message)
+
+        try:
+            scheduled_activity_event = history.get_event(scheduled_event_id)
+        except KeyError:
+            message = "Unable to find event id '{0}' in event_history".format(scheduled_event_id)
+            log.error(message)
+            raise exceptions.EventException(message=message)
+
+        if scheduled_activity_event.type != "ActivityTaskScheduled":
+            message = "Expected event id '{0}' to be 'ActivityTaskScheduled', found '{1}'".format(
+                scheduled_event_id, scheduled_activity_event.type)
+            log.error(message)
+            raise exceptions.EventException(message=message)
+
+        return scheduled_activity_event
+
     def deserialize(self, data):
         return compression.decompress_b64_json(data)
 
@@ -111,11 +163,13 @@ class WorkflowExecutionStarted(DeciderEvent):
         }
     }
     """
-    def prepare_event(self):
+    __slots__ = ("workflow_name", "workflow_version", "execution_options")
+
+    def prepare_event(self, event, history):
         try:
-            attributes = self.event["workflowExecutionStartedEventAttributes"]
+            attributes = event["workflowExecutionStartedEventAttributes"]
         except KeyError as e:
-            message = "Unable to lookup '{0}' in {1}".format(e.message, self.event)
+            message = "Unable to lookup '{0}' in {1}".format(e.args[0], event)
             log.error(message)
             raise exceptions.EventException(message=message)
 
@@ -125,71 +179,62 @@ class WorkflowExecutionStarted(DeciderEvent):
             self.workflow_name = attributes["workflowType"]["name"]
             self.workflow_version = attributes["workflowType"]["version"]
         except KeyError as e:
-            message = "Unable to lookup '{0}' in {1}".format(e.message, attributes)
+            message = "Unable to lookup '{0}' in {1}".format(e.args[0], attributes)
             log.error(message)
             raise exceptions.EventException(message=message)
 
-        if data is not None:
-            self.payload = self.deserialize(data)
-        else:
-            self.payload = None
+        # a continued run keeps the settings of the run it replaces,
+        # see Workflow.continue_as_new
+        options = (
+            ("tasklist", attributes.get("taskList", {}).get("name")),
+            ("priority", attributes.get("taskPriority")),
+            ("child_policy", attributes.get("childPolicy")),
+            ("execution_start_to_close_timeout", attributes.get("executionStartToCloseTimeout")),
+            ("task_start_to_close_timeout", attributes.get("taskStartToCloseTimeout")),
+            ("tags", attributes.get("tagList")),
+        )
+        self.execution_options = {name: value for name, value in options if value is not None}
+        self.raw_payload = data
 
 
 class ActivityAbstractFailure(DeciderEvent):
-    def retry(self):
+    __slots__ = (
+        "history", "activity_id", "activity_prefix", "tasklist", "task_name", "task_version", "timeouts"
+    )
+
+    @property
+    def num_retries(self):
+        # read from the index so events cached across decision tasks
+        # see attempts scheduled after they were prepared
+        return self.history.count_activity_attempts(self.activity_id)
+
+    def retry_decision(self):
         log.info(
             "Retrying task '%s@%s'. Retry attempt: %s",
             self.task_name, self.task_version, self.num_retries
         )
-        utils.schedule_activity(
-            client=self.client,
+        return utils.activity_decision(
             tasklist=self.tasklist,
             activity_id=self.activity_id,
-            task_token=self.meta.task_token,
             name=self.task_name,
             version=self.task_version,
-            payload=self.payload,
-            attempt=self.num_retries
+            payload=self.raw_payload,
+            attempt=self.num_retries,
+            **self.timeouts
         )
 
-    def process_history(self, attributes):
-        try:
-            scheduled_event_id = attributes["scheduledEventId"]
-        except KeyError as e:
-            message = "Unable to lookup '{0}' in {1}".format(e.message, self.event)
-            log.error(message)
-            raise exceptions.EventException(message=message)
+    def process_history(self, event, attributes, history):
+        activity = self.get_scheduled_activity(event, attributes, history)
 
-        try:
-            scheduled_activity_event = [evt for evt in self.event_history if evt["eventId"] == scheduled_event_id][0]
-        except IndexError:
-            message = "Unable to find event id '{0}' in event_history".format(scheduled_event_id)
-            log.error(message)
-            raise exceptions.EventException(message=message)
-
-        try:
-            activity = scheduled_activity_event["activityTaskScheduledEventAttributes"]
-        except KeyError as e:
-            message = "Unable to lookup '{0}' in {1}".format(e.message, scheduled_activity_event)
-            log.error(message)
-            raise exceptions.EventException(message=message)
-
-        try:
-            self.activity_id = activity["activityId"].rsplit("-", 1)[0]
-            self.tasklist = activity["taskList"]["name"]
-            self.task_name = activity["activityType"]["name"]
-            self.task_version = activity["activityType"]["version"]
-            self.payload = activity["input"]
-        except KeyError as e:
-            message = "Unable to find key '{0}' in 'activityTaskScheduledEventAttributes'".format(e.message)
-            log.error(message)
-            raise exceptions.EventException(message=message)
-
-        self.num_retries = sum([
-            1 for evt in self.event_history
-            if evt["eventType"] == "ActivityTaskScheduled" and
-            evt["activityTaskScheduledEventAttributes"]["activityId"].startswith(self.activity_id)
-        ])
+        self.history = history
+        self.activity_id = activity.activity_prefix
+        self.activity_prefix = activity.activity_prefix
+        self.tasklist = activity.tasklist
+        self.task_name = activity.name
+        self.task_version = activity.version
+        self.raw_payload = activity.raw_payload
+        # retries keep the timeouts of the first attempt
+        self.timeouts = activity.timeouts
 
 
 class ActivityTaskScheduled(DeciderEvent):
@@ -215,26 +260,39 @@ class ActivityTaskScheduled(DeciderEvent):
     }
     """
 
-    def prepare_event(self):
+    __slots__ = ("tasklist", "priority", "name", "version", "activity_id", "activity_prefix", "timeouts")
+
+    def prepare_event(self, event, history):
         try:
-            attributes = self.event["activityTaskScheduledEventAttributes"]
-        except KeyError:
-            message = "Unable to lookup '{0}' in {1}".format(e.message, self.event)
+            attributes = event["activityTaskScheduledEventAttributes"]
+        except KeyError as e:
+            message = "Unable to lookup '{0}' in {1}".format(e.args[0], event)
             log.error(message)
             raise exceptions.EventException(message=message)
 
-        self.tasklist = attributes["taskList"]["name"]
-        self.priority = attributes["taskPriority"]
-        self.name = attributes["activityType"]["name"]
-        self.version = attributes["activityType"]["version"]
-        self.activity_id = attributes["activityId"]
+        try:
+            self.tasklist = attributes["taskList"]["name"]
+            self.priority = attributes["taskPriority"]
+            self.name = attributes["activityType"]["name"]
+            self.version = attributes["activityType"]["version"]
+            self.activity_id = attributes["activityId"]
+        except KeyError as e:
+            message = "Unable to find key '{0}' in 'activityTaskScheduledEventAttributes'".format(e.args[0])
+            log.error(message)
+            raise exceptions.EventException(message=message)
+
+        self.activity_prefix = activity_prefix(self.activity_id)
+        # copied onto failures, retries keep the timeouts of the first attempt
+        self.timeouts = {
+            "timeout": attributes.get("scheduleToCloseTimeout", "10"),
+            "start_timeout": attributes.get("scheduleToStartTimeout", "10"),
+            "close_timeout": attributes.get("startToCloseTimeout", "NONE"),
+            "heartbeat_timeout": attributes.get("heartbeatTimeout", "NONE"),
+        }
 
         data = attributes.get("input", None)
 
-        if data is not None:
-            self.payload = self.deserialize(data)
-        else:
-            self.payload = None
+        self.raw_payload = data
 
 
 class ActivityTaskStarted(DeciderEvent):
@@ -250,8 +308,12 @@ class ActivityTaskStarted(DeciderEvent):
     }
     """
 
-    def prepare_event(self):
-        return
+    __slots__ = ("activity_prefix",)
+
+    def prepare_event(self, event, history):
+        attributes = event.get("activityTaskStartedEventAttributes")
+        activity = self.get_scheduled_activity(event, attributes, history)
+        self.activity_prefix = activity.activity_prefix
 
 
 class ActivityTaskCompleted(DeciderEvent):
@@ -268,15 +330,14 @@ class ActivityTaskCompleted(DeciderEvent):
     }
     """
 
-    def prepare_event(self):
-        data = self.event \
-            .get("activityTaskCompletedEventAttributes", {}) \
-            .get("result", None)
+    __slots__ = ("activity_prefix",)
+
+    def prepare_event(self, event, history):
+        attributes = event.get("activityTaskCompletedEventAttributes", {})
+        activity = self.get_scheduled_activity(event, attributes, history)
 
-        if data is not None:
-            self.payload = self.deserialize(data)
-        else:
-            self.payload = None
+        self.activity_prefix = activity.activity_prefix
+        self.raw_payload = attributes.get("result", None)
 
 
 class ActivityTaskTimedOut(ActivityAbstractFailure):
@@ -293,22 +354,100 @@ class ActivityTaskTimedOut(ActivityAbstractFailure):
     }
     """
 
-    def prepare_event(self):
-        self.num_retries = 0
-        attributes = self.event.get("activityTaskTimedOutEventAttributes")
-        self.process_history(attributes)
+    __slots__ = ()
+
+    def prepare_event(self, event, history):
+        attributes = event.get("activityTaskTimedOutEventAttributes")
+        self.process_history(event, attributes, history)
 
 
 class ActivityTaskFailed(ActivityAbstractFailure):
-    def prepare_event(self):
-        self.num_retries = 0
-        attributes = self.event.get("activityTaskFailedEventAttributes")
-        self.process_history(attributes)
+    __slots__ = ()
+
+    def prepare_event(self, event, history):
+        attributes = event.get("activityTaskFailedEventAttributes")
+        self.process_history(event, attributes, history)
+
+
+class ActivityTaskCancelRequested(DeciderEvent):
+    """ActivityTaskCancelRequested Event
+
+    {
+        u'activityTaskCancelRequestedEventAttributes': {
+            u'activityId': u'com.flowbee-test.MyWorkflow.MyWorkflow.MyActivities-eb4d44a2c088452a8de053caf50209f7.23gHXuoeTXnzl8Xts+14bNNscjpxZaCJmit8tr2y2Ofzs=.stage1@0.0.1#0-0',
+            u'decisionTaskCompletedEventId': 14},
+        u'eventId': 15,
+        u'eventType': u'ActivityTaskCancelRequested'
+    }
+    """
+
+    __slots__ = ("activity_id", "activity_prefix")
+
+    def prepare_event(self, event, history):
+        attributes = event.get("activityTaskCancelRequestedEventAttributes", {})
+
+        try:
+            self.activity_id = attributes["activityId"]
+        except KeyError as e:
+            message = "Unable to lookup '{0}' in {1}".format(e.args[0], event)
+            log.error(message)
+            raise exceptions.EventException(message=message)
+
+        self.activity_prefix = activity_prefix(self.activity_id)
+
+
+class ActivityTaskCanceled(DeciderEvent):
+    """ActivityTaskCanceled Event
+
+    {
+        u'activityTaskCanceledEventAttributes': {
+            u'details': u'Cancellation requested',
+            u'latestCancelRequestedEventId': 15,
+            u'scheduledEventId': 10,
+            u'startedEventId': 11},
+        u'eventId': 18,
+        u'eventType': u'ActivityTaskCanceled'
+    }
+    """
+
+    __slots__ = ("activity_prefix", "details")
+
+    def prepare_event(self, event, history):
+        attributes = event.get("activityTaskCanceledEventAttributes")
+        activity = self.get_scheduled_activity(event, attributes, history)
+
+        self.activity_prefix = activity.activity_prefix
+        self.details = attributes.get("details")
+
+
+class RequestCancelActivityTaskFailed(DeciderEvent):
+    """RequestCancelActivityTaskFailed Event
+
+    The activity closed before the cancellation request reached it.
+    """
+
+    __slots__ = ("activity_id", "activity_prefix", "cause")
+
+    def prepare_event(self, event, history):
+        attributes = event.get("requestCancelActivityTaskFailedEventAttributes", {})
+
+        try:
+            self.activity_id = attributes["activityId"]
+        except KeyError as e:
+            message = "Unable to lookup '{0}' in {1}".format(e.args[0], event)
+            log.error(message)
+            raise exceptions.EventException(message=message)
+
+        self.activity_prefix = activity_prefix(self.activity_id)
+        self.cause = attributes.get("cause")
+        log.info("Unable to cancel activity '%s': %s", self.activity_id, self.cause)
 
 
 class ScheduleActivityTaskFailed(DeciderEvent):
-    def prepare_event(self):
-        attributes = self.event["scheduleActivityTaskFailed"]
+    __slots__ = ()
+
+    def prepare_event(self, event, history):
+        attributes = event["scheduleActivityTaskFailed"]
         activity_id = attributes.get("activityId", "unknown activity id")
         activity_name = attributes.get("activityType", {}).get("name", "unknown name")
         activity_version = attributes.get("activityType", {}).get("version", "unknown version")
@@ -335,12 +474,13 @@ class TimerStarted(DeciderEvent):
     }
     """
 
-    def prepare_event(self):
+    __slots__ = ("timer_id", "seconds")
 
+    def prepare_event(self, event, history):
         try:
-            attributes = self.event["timerStartedEventAttributes"]
+            attributes = event["timerStartedEventAttributes"]
         except KeyError:
-            message = "Unable to locate 'timerStartedEventAttributes' on {0}".format(self.event)
+            message = "Unable to locate 'timerStartedEventAttributes' on {0}".format(event)
             log.error(message)
             raise exceptions.EventException(message=message)
 
@@ -351,10 +491,7 @@ class TimerStarted(DeciderEvent):
         except KeyError:
             data = None
 
-        if data is None:
-            self.payload = None
-        else:
-            self.payload = self.deserialize(data)
+        self.raw_payload = data
 
 
 class TimerFired(DeciderEvent):
@@ -370,8 +507,11 @@ class TimerFired(DeciderEvent):
     }
     """
 
-    def prepare_event(self):
-        timer_id = self.event.get("timerFiredEventAttributes", {}).get("timerId")
+    __slots__ = ("timer_id",)
+
+    def prepare_event(self, event, history):
+        attributes = event.get("timerFiredEventAttributes", {})
+        timer_id = attributes.get("timerId")
         self.timer_id = timer_id
 
         if timer_id is None:
@@ -380,25 +520,109 @@ class TimerFired(DeciderEvent):
             raise exceptions.EventException(message=message)
 
         try:
-            timer_started_event = [
-                x for x in self.event_history
-                if x["eventType"] == "TimerStarted" and
-                x["timerStartedEventAttributes"]["timerId"] == timer_id][0]
+            timer_started_event = history.get_timer_started(
+                timer_id, attributes.get("startedEventId")
+            )
         except KeyError as e:
-            message = "Failed to find key in event_history '{0}'".format(e.message)
+            message = "Failed to locate corresponding 'TimerStarted' event with id '{0}'".format(timer_id)
             log.error(message)
             raise exceptions.EventException(message=message)
 
-        except IndexError as e:
-            message = "Failed to locate corresponding 'TimerStarted' event with id '{0}'".format(timer_id)
+        self.raw_payload = timer_started_event.raw_payload
+
+
+class ChildWorkflowEvent(DeciderEvent):
+    """Event of a child workflow execution
+
+    Child workflows are told apart by their workflow id, which the
+    initiating events carry as workflowId and the others as part of
+    workflowExecution.
+    """
+    __slots__ = ("workflow_id", "run_id", "reason", "details")
+
+    def prepare_event(self, event, history):
+        key = "{0}{1}EventAttributes".format(self.type[0].lower(), self.type[1:])
+        attributes = event.get(key, {})
+        execution = attributes.get("workflowExecution", {})
+
+        try:
+            self.workflow_id = attributes.get("workflowId") or execution["workflowId"]
+        except KeyError as e:
+            message = "Unable to lookup '{0}' in {1}".format(e.args[0], event)
             log.error(message)
             raise exceptions.EventException(message=message)
 
-        data = timer_started_event \
-            .get("timerStartedEventAttributes", {}) \
-            .get("control", None)
+        self.run_id = execution.get("runId")
+        self.reason = None
+        self.details = None
+        self.prepare_child(attributes)
+
+    def prepare_child(self, attributes):
+        pass
+
+
+class StartChildWorkflowExecutionInitiated(ChildWorkflowEvent):
+    __slots__ = ()
+
+
+class StartChildWorkflowExecutionFailed(ChildWorkflowEvent):
+    __slots__ = ()
+
+    def prepare_child(self, attributes):
+        self.reason = attributes.get("cause")
+
+
+class ChildWorkflowExecutionStarted(ChildWorkflowEvent):
+    __slots__ = ()
+
+
+class ChildWorkflowExecutionCompleted(ChildWorkflowEvent):
+    """ChildWorkflowExecutionCompleted Event
+
+    {
+        u'childWorkflowExecutionCompletedEventAttributes': {
+            u'initiatedEventId': 5,
+            u'result': u'H4sIABZt91YC/1MqLilKLE9KLSrKTC1WAgBhRJKGDgAAAA==',
+            u'startedEventId': 6,
+            u'workflowExecution': {
+                u'runId': u'22LDwdNBShXb7YcnNVJJ+SBsh8DgyUXPm5E9MDzRXrs9U=',
+                u'workflowId': u'MyWorkflow.MyActivities-eb4d44a2c088452a8de053caf50209f7:22fH9+1OfMkAKBA6bnQqqYwwhWLpGJ38xMuJSEHtl3L2Y=.Child#0'},
+            u'workflowType': {u'name': u'Child.ChildActivities', u'version': u'0.0.1'}},
+        u'eventId': 12,
+        u'eventType': u'ChildWorkflowExecutionCompleted'
+    }
+    """
+    __slots__ = ()
+
+    def prepare_child(self, attributes):
+        result = attributes.get("result")
+
+        # children returning nothing complete with the default result
+        if result != "success":
+            self.raw_payload = result
+
+
+class ChildWorkflowExecutionFailed(ChildWorkflowEvent):
+    __slots__ = ()
+
+    def prepare_child(self, attributes):
+        self.reason = attributes.get("reason")
+        self.details = attributes.get("details")
+
+
+class ChildWorkflowExecutionTimedOut(ChildWorkflowEvent):
+    __slots__ = ()
+
+    def prepare_child(self, attributes):
+        self.reason = attributes.get("timeoutType")
+
+
+class ChildWorkflowExecutionCanceled(ChildWorkflowEvent):
+    __slots__ = ()
+
+    def prepare_child(self, attributes):
+        self.details = attributes.get("details")
+
 
-        if data is not None:
-            self.payload = self.deserialize(data)
-        else:
-            self.payload = None
+class ChildWorkflowExecutionTerminated(ChildWorkflowEvent):
+    __slots__ = ()
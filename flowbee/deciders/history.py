@@ -0,0 +1,151 @@
+from __future__ import absolute_import
+import logging
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+def activity_prefix(activity_id):
+    """Strip the '-<attempt>' suffix added by utils.schedule_activity"""
+    return activity_id.rsplit("-", 1)[0]
+
+
+class HistoryIndex(object):
+    """Lookup tables over the prepared events of an execution
+
+    Filled as events are prepared so later events can resolve the
+    events they refer to without scanning the full history. Only the
+    events something refers back to are kept:
+
+    - eventId -> ActivityTaskScheduled and TimerStarted events
+    - timerId -> most recent TimerStarted event
+    - activityId prefix -> ActivityTaskScheduled events, one per attempt
+    """
+
+    def __init__(self, events=None):
+        self.events = {}
+        self.timers = {}
+        self.activities = {}
+
+        for event in events or []:
+            self.add(event)
+
+    def add(self, event):
+        event_type = event.type
+
+        if event_type == "TimerStarted":
+            self.events[event.event_id] = event
+            self.timers[event.timer_id] = event
+
+        elif event_type == "ActivityTaskScheduled":
+            self.events[event.event_id] = event
+            self.activities.setdefault(event.activity_prefix, []).append(event)
+
+    def get_event(self, event_id):
+        return self.events[event_id]
+
+    def get_timer_started(self, timer_id, started_event_id=None):
+        """Find the TimerStarted event for a TimerFired event
+
+        Timer ids are reused across timers, so prefer the
+        startedEventId reported by TimerFired and only fall back to the
+        latest timer started with timer_id.
+        """
+        if started_event_id is not None:
+            try:
+                return self.events[started_event_id]
+            except KeyError:
+                pass
+
+        return self.timers[timer_id]
+
+    def get_activity_attempts(self, prefix):
+        return self.activities.get(prefix, [])
+
+    def count_activity_attempts(self, prefix):
+        return len(self.get_activity_attempts(prefix))
+
+
+class CachedHistory(object):
+    """Prepared events of a single workflow execution
+
+    Holds everything needed to pick a replay back up on the next
+    decision task: the index over the prepared events, the events
+    in order and the id of the last event that has been fetched.
+    """
+
+    def __init__(self):
+        self.index = HistoryIndex()
+        self.events = []
+        self.last_event_id = 0
+        # encoded payloads, the bulk of a history's size
+        self.payload_bytes = 0
+
+    def extend(self, meta, event_history, last_event_id=None):
+        """Prepare and append newly fetched events
+
+        Raw events can be dropped once prepared, nothing keeps a
+        reference to them.
+
+        :param meta: TaskMeta of the current decision task
+        :param event_history: new raw events in ascending order
+        :param last_event_id: id of the newest event fetched, including
+                              filtered decision events (default: the id
+                              of the last event in event_history)
+        :returns: the full list of prepared events
+        """
+        # imported here, .utils imports the events which need this module
+        from .utils import prepare_event
+
+        for raw_event in event_history:
+            event = prepare_event(meta, raw_event, self.index)
+            self.index.add(event)
+            self.events.append(event)
+            self.payload_bytes += len(event.raw_payload or "")
+
+        if last_event_id is None and event_history:
+            last_event_id = event_history[-1]["eventId"]
+
+        if last_event_id is not None:
+            self.last_event_id = max(self.last_event_id, last_event_id)
+
+        return self.events
+
+
+class HistoryCache(object):
+    """Bounded LRU of CachedHistory keyed by (workflow_id, run_id)"""
+
+    def __init__(self, max_size=100):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            try:
+                history = self.entries.pop(key)
+            except KeyError:
+                return None
+
+            self.entries[key] = history
+            return history
+
+    def put(self, key, history):
+        if self.max_size <= 0:
+            return
+
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = history
+
+            while len(self.entries) > self.max_size:
+                evicted, _ = self.entries.popitem(last=False)
+                log.debug("Evicted cached history for '%s'", evicted)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
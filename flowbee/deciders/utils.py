@@ -15,7 +15,7 @@ def maybe_get_event_type(event):
     return event_type
 
 
-def prepare_event(meta, event, event_history):
+def prepare_event(meta, event, history):
     event_type = maybe_get_event_type(event)
 
     if event_type is None:
@@ -33,6 +33,17 @@ def prepare_event(meta, event, event_history):
         "ActivityTaskStarted": events.ActivityTaskStarted,
         "ActivityTaskCompleted": events.ActivityTaskCompleted,
         "ActivityTaskFailed": events.ActivityTaskFailed,
+        "ActivityTaskCancelRequested": events.ActivityTaskCancelRequested,
+        "ActivityTaskCanceled": events.ActivityTaskCanceled,
+        "RequestCancelActivityTaskFailed": events.RequestCancelActivityTaskFailed,
+        "StartChildWorkflowExecutionInitiated": events.StartChildWorkflowExecutionInitiated,
+        "StartChildWorkflowExecutionFailed": events.StartChildWorkflowExecutionFailed,
+        "ChildWorkflowExecutionStarted": events.ChildWorkflowExecutionStarted,
+        "ChildWorkflowExecutionCompleted": events.ChildWorkflowExecutionCompleted,
+        "ChildWorkflowExecutionFailed": events.ChildWorkflowExecutionFailed,
+        "ChildWorkflowExecutionTimedOut": events.ChildWorkflowExecutionTimedOut,
+        "ChildWorkflowExecutionCanceled": events.ChildWorkflowExecutionCanceled,
+        "ChildWorkflowExecutionTerminated": events.ChildWorkflowExecutionTerminated,
     }.get(event_type)
 
     if event_class is None:
@@ -41,5 +52,4 @@ def prepare_event(meta, event, event_history):
         raise exceptions.EventException(message)
 
     log.info("Initializing event class '%s'", event_type)
-    event = event_class(meta, event, event_history)
-    return event
+    return event_class(event, history)
@@ -0,0 +1,256 @@
+"""SWF Decisions
+
+Builders for the decisions sent with RespondDecisionTaskCompleted and
+the Decisions buffer collecting them while a decision task is handled:
+http://boto3.readthedocs.org/en/latest/reference/services/swf.html#SWF.Client.respond_decision_task_completed
+"""
+from __future__ import absolute_import
+import logging
+from . import exceptions
+
+log = logging.getLogger(__name__)
+
+CLOSE_DECISIONS = frozenset([
+    "CompleteWorkflowExecution",
+    "FailWorkflowExecution",
+    "CancelWorkflowExecution",
+    "ContinueAsNewWorkflowExecution",
+])
+
+
+def timer_decision(seconds, timer_id, payload=None):
+    decision = {
+        "timerId": timer_id,
+        "startToFireTimeout": str(seconds)
+    }
+
+    if payload is not None:
+        decision["control"] = payload
+
+    return {
+        "decisionType": "StartTimer",
+        "startTimerDecisionAttributes": decision
+    }
+
+
+def activity_decision(
+        name, version, activity_id, tasklist, payload="",
+        close_timeout="NONE", start_timeout="10", timeout="10",
+        heartbeat_timeout="NONE", priority=0, attempt=0):
+
+    return {
+        "decisionType": "ScheduleActivityTask",
+        "scheduleActivityTaskDecisionAttributes": {
+            "activityId": "{0}-{1}".format(activity_id, attempt),
+            "input": payload,
+            "taskPriority": str(priority),
+            "scheduleToCloseTimeout": timeout,  # maximum duration for this task
+            "scheduleToStartTimeout": start_timeout,  # maximum duration the task can wait to be assigned to a worker
+            "startToCloseTimeout": close_timeout,  # maximum duration a worker may take to process this task
+            "heartbeatTimeout": heartbeat_timeout,  # maximum time before which a worker processing a task of this type must report progress
+            "activityType": {
+                "name": name,
+                "version": version
+            },
+            "taskList": {
+                "name": tasklist
+            },
+        }
+    }
+
+
+def request_cancel_activity_decision(activity_id):
+    return {
+        "decisionType": "RequestCancelActivityTask",
+        "requestCancelActivityTaskDecisionAttributes": {
+            "activityId": activity_id
+        }
+    }
+
+
+def cancel_workflow_decision(reason=""):
+    return {
+        "decisionType": "CancelWorkflowExecution",
+        "cancelWorkflowExecutionDecisionAttributes": {
+            "details": reason
+        }
+    }
+
+
+def fail_workflow_decision(reason, details=""):
+    return {
+        "decisionType": "FailWorkflowExecution",
+        "failWorkflowExecutionDecisionAttributes": {
+            "reason": reason,
+            "details": details
+        }
+    }
+
+
+def complete_workflow_decision(result="success"):
+    return {
+        "decisionType": "CompleteWorkflowExecution",
+        "completeWorkflowExecutionDecisionAttributes": {
+            "result": result
+        }
+    }
+
+
+def continue_as_new_decision(
+        input=None, version=None, tasklist=None, priority=None, child_policy=None,
+        execution_start_to_close_timeout=None, task_start_to_close_timeout=None, tags=None):
+    """Close the execution and start a new run with the same workflow id
+
+    Options left to None take the defaults registered with the workflow
+    type.
+    """
+    options = (
+        ("input", input),
+        ("workflowTypeVersion", version),
+        ("taskList", {"name": tasklist} if tasklist is not None else None),
+        ("taskPriority", str(priority) if priority is not None else None),
+        ("childPolicy", child_policy),
+        ("executionStartToCloseTimeout",
+         str(execution_start_to_close_timeout) if execution_start_to_close_timeout is not None else None),
+        ("taskStartToCloseTimeout",
+         str(task_start_to_close_timeout) if task_start_to_close_timeout is not None else None),
+        ("tagList", list(tags) if tags is not None else None),
+    )
+
+    return {
+        "decisionType": "ContinueAsNewWorkflowExecution",
+        "continueAsNewWorkflowExecutionDecisionAttributes": {
+            name: value for name, value in options if value is not None
+        }
+    }
+
+
+def child_workflow_decision(
+        workflow_id, name, version, input=None, tasklist=None, priority=None, child_policy=None,
+        execution_start_to_close_timeout=None, task_start_to_close_timeout=None, tags=None, control=None):
+    """Start a child workflow execution
+
+    Options left to None take the defaults registered with the workflow
+    type.
+    """
+    options = (
+        ("input", input),
+        ("taskList", {"name": tasklist} if tasklist is not None else None),
+        ("taskPriority", str(priority) if priority is not None else None),
+        ("childPolicy", child_policy),
+        ("executionStartToCloseTimeout",
+         str(execution_start_to_close_timeout) if execution_start_to_close_timeout is not None else None),
+        ("taskStartToCloseTimeout",
+         str(task_start_to_close_timeout) if task_start_to_close_timeout is not None else None),
+        ("tagList", list(tags) if tags is not None else None),
+        ("control", control),
+    )
+    attributes = {name: value for name, value in options if value is not None}
+    attributes["workflowId"] = workflow_id
+    attributes["workflowType"] = {"name": name, "version": version}
+
+    return {
+        "decisionType": "StartChildWorkflowExecution",
+        "startChildWorkflowExecutionDecisionAttributes": attributes
+    }
+
+
+class Decisions(object):
+    """Decisions made while handling a single decision task
+
+    Activities, timers and the decider append to the buffer and the
+    decider flushes it exactly once, so everything decided in a task
+    goes out in one RespondDecisionTaskCompleted call. SWF requires a
+    close decision to be the last one, it is always appended last.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.flushed = False
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    @property
+    def closed(self):
+        return any(item["decisionType"] in CLOSE_DECISIONS for item in self.items)
+
+    def append(self, decision):
+        if self.closed:
+            raise exceptions.DeciderException(
+                "Unable to add '{0}', the workflow execution is already closing".format(
+                    decision["decisionType"])
+            )
+
+        self.items.append(decision)
+
+    def clear(self):
+        del self.items[:]
+
+    def start_timer(self, seconds, timer_id, payload=None):
+        self.append(timer_decision(seconds, timer_id, payload=payload))
+
+    def schedule_activity(self, *args, **kwargs):
+        self.append(activity_decision(*args, **kwargs))
+
+    def request_cancel_activity(self, activity_id):
+        self.append(request_cancel_activity_decision(activity_id))
+
+    def start_child_workflow(self, *args, **kwargs):
+        self.append(child_workflow_decision(*args, **kwargs))
+
+    def discard_activity(self, activity_id):
+        """Drop an activity scheduled earlier in this decision task
+
+        :returns: True if the activity was scheduled in this task
+        """
+        items = [
+            item for item in self.items
+            if item.get("scheduleActivityTaskDecisionAttributes", {}).get("activityId") != activity_id
+        ]
+        discarded = len(items) != len(self.items)
+        self.items[:] = items
+
+        return discarded
+
+    def cancel_workflow(self, reason=""):
+        self.append(cancel_workflow_decision(reason=reason))
+
+    def fail_workflow(self, reason, details=""):
+        # nothing else matters once the execution fails
+        self.clear()
+        self.append(fail_workflow_decision(reason, details=details))
+
+    def complete_workflow(self, result="success"):
+        self.append(complete_workflow_decision(result=result))
+
+    def continue_as_new(self, *args, **kwargs):
+        self.append(continue_as_new_decision(*args, **kwargs))
+
+    def flush(self, client, task_token):
+        """Answer the decision task with every collected decision
+
+        A decision task must be answered even when there is nothing
+        new to decide, otherwise SWF waits for it to time out.
+        """
+        if self.flushed:
+            raise exceptions.DeciderException("Decisions have already been sent")
+
+        self.flushed = True
+
+        log.debug(
+            "Responding with %s decision(s): %s",
+            len(self.items), [item["decisionType"] for item in self.items]
+        )
+
+        # imported here, flowbee.utils imports this module
+        from .utils import request
+
+        request(
+            client, "respond_decision_task_completed",
+            taskToken=task_token,
+            decisions=self.items
+        )
@@ -0,0 +1,33 @@
+"""Run the SWF emulator as a local HTTP endpoint
+
+    python -m flowbee.emulator --port 8600
+"""
+from __future__ import absolute_import
+import logging
+import click
+from .core import (SWFEmulator, POLL_TIMEOUT)
+from .server import EmulatorServer
+
+
+@click.command()
+@click.option('--host', default="127.0.0.1", help="Interface to listen on")
+@click.option('--port', default=8600, type=int, help="Port to listen on")
+@click.option('--poll-timeout', default=POLL_TIMEOUT, type=float, help="Seconds a poll waits for a task")
+@click.option('--strict/--no-strict', default=False, help="Reject unregistered domains and types")
+@click.option('--log-level', default="INFO", help="Logging level")
+def main(host, port, poll_timeout, strict, log_level):
+    logging.basicConfig(level=log_level.upper())
+    emulator = SWFEmulator(poll_timeout=poll_timeout, strict=strict)
+    server = EmulatorServer((host, port), emulator=emulator)
+    logging.getLogger("flowbee.emulator").info("Serving SWF on %s", server.url)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
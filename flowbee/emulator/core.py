@@ -0,0 +1,1009 @@
+from __future__ import absolute_import
+import time
+import uuid
+import logging
+import datetime
+import threading
+from collections import (deque, OrderedDict)
+from botocore.exceptions import ClientError
+
+log = logging.getLogger(__name__)
+
+# SWF's own limits
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+POLL_TIMEOUT = 60
+MAX_WORKFLOW_ID_LENGTH = 256
+# besides control characters, SWF rejects ids containing these
+WORKFLOW_ID_FORBIDDEN = (":", "/", "|", "arn")
+# pages nobody asked for expire, deciders with a warm cache stop early
+MAX_PAGE_TOKENS = 10000
+
+# events that hand control back to the decider
+DECISION_EVENTS = frozenset([
+    "WorkflowExecutionStarted",
+    "WorkflowExecutionCancelRequested",
+    "WorkflowExecutionSignaled",
+    "ActivityTaskCompleted",
+    "ActivityTaskFailed",
+    "ActivityTaskTimedOut",
+    "ActivityTaskCanceled",
+    "ScheduleActivityTaskFailed",
+    "RequestCancelActivityTaskFailed",
+    "TimerFired",
+    "StartTimerFailed",
+    "DecisionTaskTimedOut",
+    "StartChildWorkflowExecutionFailed",
+    "ChildWorkflowExecutionStarted",
+    "ChildWorkflowExecutionCompleted",
+    "ChildWorkflowExecutionFailed",
+    "ChildWorkflowExecutionTimedOut",
+    "ChildWorkflowExecutionCanceled",
+    "ChildWorkflowExecutionTerminated",
+])
+
+CLOSE_EVENTS = {
+    "WorkflowExecutionCompleted": "COMPLETED",
+    "WorkflowExecutionFailed": "FAILED",
+    "WorkflowExecutionCanceled": "CANCELED",
+    "WorkflowExecutionTerminated": "TERMINATED",
+    "WorkflowExecutionTimedOut": "TIMED_OUT",
+    "WorkflowExecutionContinuedAsNew": "CONTINUED_AS_NEW",
+}
+
+# supported decisions and the attributes they require
+DECISION_ATTRIBUTES = {
+    "ScheduleActivityTask": ("activityType", "activityId"),
+    "RequestCancelActivityTask": ("activityId",),
+    "StartTimer": ("timerId", "startToFireTimeout"),
+    "CancelTimer": ("timerId",),
+    "CompleteWorkflowExecution": (),
+    "FailWorkflowExecution": (),
+    "CancelWorkflowExecution": (),
+    "ContinueAsNewWorkflowExecution": (),
+    "StartChildWorkflowExecution": ("workflowId", "workflowType"),
+}
+
+# event recorded in the parent when a child closes and the attributes it keeps
+CHILD_CLOSE_EVENTS = {
+    "WorkflowExecutionCompleted": ("ChildWorkflowExecutionCompleted", ("result",)),
+    "WorkflowExecutionFailed": ("ChildWorkflowExecutionFailed", ("reason", "details")),
+    "WorkflowExecutionCanceled": ("ChildWorkflowExecutionCanceled", ("details",)),
+    "WorkflowExecutionTerminated": ("ChildWorkflowExecutionTerminated", ()),
+    "WorkflowExecutionTimedOut": ("ChildWorkflowExecutionTimedOut", ("timeoutType",)),
+}
+
+
+def fault(operation, code, message=""):
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+def validate_workflow_id(operation, workflow_id):
+    """Reject the workflow ids SWF rejects"""
+    invalid = (
+        not workflow_id or len(workflow_id) > MAX_WORKFLOW_ID_LENGTH or
+        workflow_id != workflow_id.strip() or
+        any(part in workflow_id for part in WORKFLOW_ID_FORBIDDEN) or
+        any(ord(char) < 0x20 or 0x7f <= ord(char) <= 0x9f for char in workflow_id)
+    )
+
+    if invalid:
+        raise fault(operation, "ValidationException", "Invalid workflowId '{0}'".format(workflow_id))
+
+
+def decision_attributes_key(decision_type):
+    return "{0}{1}DecisionAttributes".format(decision_type[0].lower(), decision_type[1:])
+
+
+def attributes_key(event_type):
+    return "{0}{1}EventAttributes".format(event_type[0].lower(), event_type[1:])
+
+
+def seconds(value):
+    """SWF durations are strings, 'NONE' disables the timeout"""
+    if value is None or value == "NONE":
+        return None
+
+    return float(value)
+
+
+def response(**kwargs):
+    kwargs["ResponseMetadata"] = {"HTTPStatusCode": 200}
+    return kwargs
+
+
+class Activity(object):
+
+    def __init__(self, execution, scheduled_event_id, attributes, now):
+        self.execution = execution
+        self.scheduled_event_id = scheduled_event_id
+        self.attributes = attributes
+        self.activity_id = attributes["activityId"]
+        self.tasklist = attributes["taskList"]["name"]
+        self.scheduled_at = now
+        self.started_event_id = None
+        self.started_at = None
+        self.heartbeat_at = None
+        self.heartbeat_details = None
+        self.token = None
+        self.cancel_requested_event_id = None
+
+    def deadline(self):
+        """(time, timeoutType) of the next timeout of this activity"""
+        attributes = self.attributes
+        deadlines = []
+
+        schedule_to_close = seconds(attributes.get("scheduleToCloseTimeout"))
+        if schedule_to_close is not None:
+            deadlines.append((self.scheduled_at + schedule_to_close, "SCHEDULE_TO_CLOSE"))
+
+        if self.started_at is None:
+            schedule_to_start = seconds(attributes.get("scheduleToStartTimeout"))
+            if schedule_to_start is not None:
+                deadlines.append((self.scheduled_at + schedule_to_start, "SCHEDULE_TO_START"))
+        else:
+            start_to_close = seconds(attributes.get("startToCloseTimeout"))
+            if start_to_close is not None:
+                deadlines.append((self.started_at + start_to_close, "START_TO_CLOSE"))
+
+            heartbeat = seconds(attributes.get("heartbeatTimeout"))
+            if heartbeat is not None:
+                deadlines.append((self.heartbeat_at + heartbeat, "HEARTBEAT"))
+
+        if not deadlines:
+            return None
+
+        return min(deadlines)
+
+
+class Execution(object):
+
+    def __init__(self, domain, workflow_id, run_id, attributes, now):
+        self.domain = domain
+        self.workflow_id = workflow_id
+        self.run_id = run_id
+        self.attributes = attributes
+        self.workflow_type = attributes["workflowType"]
+        self.tasklist = attributes["taskList"]["name"]
+        self.started_at = now
+        self.events = []
+        self.close_status = None
+        self.activities = {}
+        self.timers = {}
+        self.decision_scheduled_event_id = None
+        self.decision_started_event_id = None
+        self.decision_started_at = None
+        self.decision_token = None
+        self.decision_pending = False
+        self.previous_started_event_id = 0
+        # (parent Execution, initiatedEventId, startedEventId) of a child
+        self.parent = None
+        self.children = []
+
+    @property
+    def open(self):
+        return self.close_status is None
+
+    @property
+    def reference(self):
+        return {"workflowId": self.workflow_id, "runId": self.run_id}
+
+    def find_activity(self, activity_id):
+        for activity in self.activities.values():
+            if activity.activity_id == activity_id:
+                return activity
+
+        return None
+
+    def deadline(self):
+        """(time, callback name, key) of the next timeout of this execution"""
+        deadlines = []
+
+        timeout = seconds(self.attributes.get("executionStartToCloseTimeout"))
+        if timeout is not None:
+            deadlines.append((self.started_at + timeout, "execution", None))
+
+        if self.decision_started_at is not None:
+            timeout = seconds(self.attributes.get("taskStartToCloseTimeout"))
+            if timeout is not None:
+                deadlines.append((self.decision_started_at + timeout, "decision", None))
+
+        for timer_id, (started_event_id, fire_at) in self.timers.items():
+            deadlines.append((fire_at, "timer", timer_id))
+
+        for activity in self.activities.values():
+            deadline = activity.deadline()
+            if deadline is not None:
+                deadlines.append((deadline[0], "activity", activity.scheduled_event_id))
+
+        if not deadlines:
+            return None
+
+        return min(deadlines)
+
+
+class SWFEmulator(object):
+    """In memory stand-in for the SWF API used by flowbee
+
+    Implements domains and types registration, workflow executions with
+    their histories, decision and activity task lists with long
+    polling, history pagination, timers, child workflows, activity
+    heartbeats, cancellation and every SWF timeout. Its methods take and return the
+    same values as the boto3 SWF client, so it can replace it:
+
+        emulator = SWFEmulator(poll_timeout=1)
+        flowbee.utils.set_client(emulator)
+
+    Faults are raised as botocore ClientErrors with SWF's error codes.
+    Events handed out are shared with the emulator, treat them as read
+    only.
+
+    :param poll_timeout: seconds a poll waits for a task (SWF: 60)
+    :param clock: function returning the current time in seconds
+    :param strict: reject activities and workflows of unregistered types
+    """
+
+    def __init__(self, poll_timeout=POLL_TIMEOUT, clock=time.time, strict=False):
+        self.poll_timeout = poll_timeout
+        self.clock = clock
+        self.strict = strict
+        self.condition = threading.Condition(threading.RLock())
+        self.domains = {}
+        self.workflow_types = set()
+        self.activity_types = set()
+        self.executions = {}
+        self.open_executions = {}
+        self.decision_tasks = {}
+        self.activity_tasks = {}
+        self.decision_tokens = {}
+        self.activity_tokens = {}
+        self.page_tokens = OrderedDict()
+
+    # registration
+
+    def register_domain(self, name, workflowExecutionRetentionPeriodInDays, description=""):
+        with self.condition:
+            if name in self.domains:
+                raise fault("RegisterDomain", "DomainAlreadyExistsFault", name)
+
+            self.domains[name] = {
+                "name": name,
+                "description": description,
+                "retention": workflowExecutionRetentionPeriodInDays,
+            }
+
+        return response()
+
+    def register_workflow_type(self, domain, name, version, **kwargs):
+        return self.register_type("RegisterWorkflowType", self.workflow_types, domain, name, version)
+
+    def register_activity_type(self, domain, name, version, **kwargs):
+        return self.register_type("RegisterActivityType", self.activity_types, domain, name, version)
+
+    def register_type(self, operation, types, domain, name, version):
+        with self.condition:
+            self.require_domain(operation, domain)
+            key = (domain, name, version)
+
+            if key in types:
+                raise fault(operation, "TypeAlreadyExistsFault", "{0}@{1}".format(name, version))
+
+            types.add(key)
+
+        return response()
+
+    def require_domain(self, operation, domain):
+        if self.strict and domain not in self.domains:
+            raise fault(operation, "UnknownResourceFault", "Unknown domain: {0}".format(domain))
+
+    # executions
+
+    def start_workflow_execution(
+            self, domain, workflowId, workflowType, taskList=None, input=None,
+            executionStartToCloseTimeout=None, taskStartToCloseTimeout=None,
+            childPolicy="TERMINATE", taskPriority="0", **kwargs):
+
+        validate_workflow_id("StartWorkflowExecution", workflowId)
+
+        with self.condition:
+            self.require_domain("StartWorkflowExecution", domain)
+
+            if self.strict and (domain, workflowType["name"], workflowType["version"]) not in self.workflow_types:
+                raise fault("StartWorkflowExecution", "UnknownResourceFault", "Unknown workflow type")
+
+            if (domain, workflowId) in self.open_executions:
+                raise fault(
+                    "StartWorkflowExecution", "WorkflowExecutionAlreadyStartedFault", workflowId
+                )
+
+            attributes = {
+                "workflowType": workflowType,
+                "taskList": taskList or {"name": "default"},
+                "childPolicy": childPolicy,
+                "executionStartToCloseTimeout": executionStartToCloseTimeout or "NONE",
+                "taskStartToCloseTimeout": taskStartToCloseTimeout or "NONE",
+                "taskPriority": taskPriority,
+            }
+
+            if input is not None:
+                attributes["input"] = input
+
+            execution = self.start(domain, workflowId, attributes)
+
+        return response(runId=execution.run_id)
+
+    def start(self, domain, workflow_id, attributes):
+        now = self.clock()
+        execution = Execution(domain, workflow_id, uuid.uuid4().hex, attributes, now)
+        self.executions[(domain, workflow_id, execution.run_id)] = execution
+        self.open_executions[(domain, workflow_id)] = execution
+        self.add_event(execution, "WorkflowExecutionStarted", **attributes)
+        return execution
+
+    def terminate_workflow_execution(self, domain, workflowId, runId=None, reason="", details="", **kwargs):
+        with self.condition:
+            execution = self.get_execution("TerminateWorkflowExecution", domain, workflowId, runId)
+            self.close(execution, "WorkflowExecutionTerminated", reason=reason, details=details, cause="OPERATOR_INITIATED")
+
+        return response()
+
+    def get_execution(self, operation, domain, workflow_id, run_id=None):
+        if run_id:
+            execution = self.executions.get((domain, workflow_id, run_id))
+        else:
+            execution = self.open_executions.get((domain, workflow_id))
+
+        if execution is None or not execution.open:
+            raise fault(operation, "UnknownResourceFault", "Unknown execution: {0}".format(workflow_id))
+
+        return execution
+
+    def describe_workflow_execution(self, domain, execution):
+        with self.condition:
+            found = self.executions.get((domain, execution["workflowId"], execution["runId"]))
+
+            if found is None:
+                raise fault("DescribeWorkflowExecution", "UnknownResourceFault", execution["workflowId"])
+
+            info = {
+                "execution": found.reference,
+                "workflowType": found.workflow_type,
+                "executionStatus": "OPEN" if found.open else "CLOSED",
+            }
+
+            if not found.open:
+                info["closeStatus"] = found.close_status
+
+            return response(
+                executionInfo=info,
+                openCounts={
+                    "openActivityTasks": len(found.activities),
+                    "openDecisionTasks": 1 if found.decision_scheduled_event_id else 0,
+                    "openTimers": len(found.timers),
+                    "openChildWorkflowExecutions": 0,
+                }
+            )
+
+    def get_workflow_execution_history(self, domain, execution, nextPageToken=None,
+                                       maximumPageSize=DEFAULT_PAGE_SIZE, reverseOrder=False):
+        with self.condition:
+            found = self.executions.get((domain, execution["workflowId"], execution["runId"]))
+
+            if found is None:
+                raise fault("GetWorkflowExecutionHistory", "UnknownResourceFault", execution["workflowId"])
+
+            if nextPageToken:
+                events, offset, _ = self.next_page("GetWorkflowExecutionHistory", nextPageToken)
+            else:
+                events, offset = self.snapshot(found, reverseOrder), 0
+
+            page, token = self.paginate(events, offset, maximumPageSize)
+
+        result = response(events=page)
+
+        if token:
+            result["nextPageToken"] = token
+
+        return result
+
+    # history
+
+    def add_event(self, execution, event_type, **attributes):
+        event_id = len(execution.events) + 1
+        event = {
+            "eventId": event_id,
+            "eventType": event_type,
+            "eventTimestamp": datetime.datetime.utcfromtimestamp(self.clock()),
+        }
+
+        if attributes:
+            event[attributes_key(event_type)] = attributes
+
+        execution.events.append(event)
+
+        if event_type in DECISION_EVENTS:
+            self.schedule_decision(execution)
+
+        return event_id
+
+    def schedule_decision(self, execution):
+        if not execution.open:
+            return
+
+        if execution.decision_started_event_id is not None:
+            # picked up with the next decision task once this one completes
+            execution.decision_pending = True
+            return
+
+        if execution.decision_scheduled_event_id is not None:
+            return
+
+        execution.decision_scheduled_event_id = self.add_event(
+            execution, "DecisionTaskScheduled",
+            taskList={"name": execution.tasklist},
+            startToCloseTimeout=execution.attributes.get("taskStartToCloseTimeout", "NONE")
+        )
+
+        queue = self.decision_tasks.setdefault((execution.domain, execution.tasklist), deque())
+        queue.append(execution)
+        self.condition.notify_all()
+
+    def close(self, execution, event_type, **attributes):
+        if not execution.open:
+            return
+
+        self.add_event(execution, event_type, **attributes)
+        execution.close_status = CLOSE_EVENTS[event_type]
+        self.open_executions.pop((execution.domain, execution.workflow_id), None)
+
+        if execution.parent is not None and event_type in CHILD_CLOSE_EVENTS:
+            self.close_child(execution, event_type, attributes)
+
+        if execution.attributes.get("childPolicy") == "TERMINATE":
+            for child in execution.children:
+                self.close(child, "WorkflowExecutionTerminated", cause="CHILD_POLICY_APPLIED")
+
+        for activity in execution.activities.values():
+            self.activity_tokens.pop(activity.token, None)
+
+        execution.activities.clear()
+        execution.timers.clear()
+        self.decision_tokens.pop(execution.decision_token, None)
+        execution.decision_token = None
+        execution.decision_started_event_id = None
+        execution.decision_started_at = None
+
+    def close_child(self, child, event_type, attributes):
+        parent, initiated_event_id, started_event_id = child.parent
+        child_event_type, kept = CHILD_CLOSE_EVENTS[event_type]
+
+        if not parent.open:
+            return
+
+        self.add_event(
+            parent, child_event_type,
+            workflowExecution=child.reference,
+            workflowType=child.workflow_type,
+            initiatedEventId=initiated_event_id,
+            startedEventId=started_event_id,
+            **{name: attributes[name] for name in kept if attributes.get(name) is not None}
+        )
+
+    # polling
+
+    def wait(self, deadline):
+        """Wait for a notification, a due timeout or the end of the poll
+
+        :returns: False once the poll has timed out
+        """
+        now = self.clock()
+
+        if now >= deadline:
+            return False
+
+        due = self.next_deadline()
+        timeout = deadline - now
+
+        if due is not None:
+            timeout = max(0, min(timeout, due - now))
+
+        self.condition.wait(timeout)
+        return True
+
+    def next_deadline(self):
+        deadlines = [
+            deadline for deadline in
+            (execution.deadline() for execution in self.open_executions.values())
+            if deadline is not None
+        ]
+
+        if not deadlines:
+            return None
+
+        return min(deadlines)[0]
+
+    def process_timeouts(self):
+        now = self.clock()
+
+        for execution in list(self.open_executions.values()):
+            while execution.open:
+                deadline = execution.deadline()
+
+                if deadline is None or deadline[0] > now:
+                    break
+
+                self.timeout(execution, deadline[1], deadline[2])
+
+    def timeout(self, execution, kind, key):
+        if kind == "execution":
+            self.close(execution, "WorkflowExecutionTimedOut", timeoutType="START_TO_CLOSE",
+                       childPolicy=execution.attributes.get("childPolicy"))
+
+        elif kind == "decision":
+            self.add_event(
+                execution, "DecisionTaskTimedOut",
+                scheduledEventId=execution.decision_scheduled_event_id,
+                startedEventId=execution.decision_started_event_id,
+                timeoutType="START_TO_CLOSE"
+            )
+            self.end_decision(execution)
+
+        elif kind == "timer":
+            started_event_id, _ = execution.timers.pop(key)
+            self.add_event(execution, "TimerFired", timerId=key, startedEventId=started_event_id)
+
+        elif kind == "activity":
+            activity = execution.activities.pop(key)
+            self.activity_tokens.pop(activity.token, None)
+            attributes = {
+                "scheduledEventId": activity.scheduled_event_id,
+                "timeoutType": activity.deadline()[1],
+            }
+
+            if activity.started_event_id is not None:
+                attributes["startedEventId"] = activity.started_event_id
+
+            if activity.heartbeat_details is not None:
+                attributes["details"] = activity.heartbeat_details
+
+            self.add_event(execution, "ActivityTaskTimedOut", **attributes)
+
+    def end_decision(self, execution):
+        self.decision_tokens.pop(execution.decision_token, None)
+        execution.decision_token = None
+        execution.decision_scheduled_event_id = None
+        execution.decision_started_event_id = None
+        execution.decision_started_at = None
+
+        if execution.decision_pending:
+            execution.decision_pending = False
+            self.schedule_decision(execution)
+
+    def snapshot(self, execution, reverse_order):
+        events = list(execution.events)
+
+        if reverse_order:
+            events.reverse()
+
+        return events
+
+    def next_page(self, operation, next_page_token):
+        try:
+            return self.page_tokens.pop(next_page_token)
+        except KeyError:
+            raise fault(operation, "ValidationException", "Invalid nextPageToken")
+
+    def paginate(self, events, offset, page_size, context=None):
+        """Cut a page out of a history snapshot
+
+        :returns: (events, next page token or None)
+        """
+        page_size = min(page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        end = offset + page_size
+        token = None
+
+        if end < len(events):
+            token = uuid.uuid4().hex
+            self.page_tokens[token] = (events, end, context)
+
+            while len(self.page_tokens) > MAX_PAGE_TOKENS:
+                self.page_tokens.popitem(last=False)
+
+        return events[offset:end], token
+
+    def poll_for_decision_task(self, domain, taskList, identity="", nextPageToken=None,
+                               maximumPageSize=DEFAULT_PAGE_SIZE, reverseOrder=False):
+        if nextPageToken:
+            with self.condition:
+                events, offset, task = self.next_page("PollForDecisionTask", nextPageToken)
+                return self.decision_page(task, events, offset, maximumPageSize)
+
+        queue_key = (domain, taskList["name"])
+
+        with self.condition:
+            deadline = self.clock() + self.poll_timeout
+
+            while True:
+                self.process_timeouts()
+                queue = self.decision_tasks.get(queue_key)
+
+                while queue:
+                    execution = queue.popleft()
+
+                    if execution.open and execution.decision_started_event_id is None:
+                        return self.start_decision(execution, identity, maximumPageSize, reverseOrder)
+
+                if not self.wait(deadline):
+                    return response(startedEventId=0, previousStartedEventId=0)
+
+    def start_decision(self, execution, identity, page_size, reverse_order):
+        execution.decision_started_event_id = self.add_event(
+            execution, "DecisionTaskStarted",
+            identity=identity,
+            scheduledEventId=execution.decision_scheduled_event_id
+        )
+        execution.decision_started_at = self.clock()
+        execution.decision_token = uuid.uuid4().hex
+        self.decision_tokens[execution.decision_token] = execution
+
+        task = {
+            "taskToken": execution.decision_token,
+            "startedEventId": execution.decision_started_event_id,
+            "previousStartedEventId": execution.previous_started_event_id,
+            "workflowExecution": execution.reference,
+            "workflowType": execution.workflow_type,
+        }
+
+        # pages are cut from the history as it was when the task started
+        events = self.snapshot(execution, reverse_order)
+        return self.decision_page(task, events, 0, page_size)
+
+    def decision_page(self, task, events, offset, page_size):
+        page, token = self.paginate(events, offset, page_size, context=task)
+        result = response(events=page, **task)
+
+        if token:
+            result["nextPageToken"] = token
+
+        return result
+
+    def poll_for_activity_task(self, domain, taskList, identity=""):
+        queue_key = (domain, taskList["name"])
+
+        with self.condition:
+            deadline = self.clock() + self.poll_timeout
+
+            while True:
+                self.process_timeouts()
+                queue = self.activity_tasks.get(queue_key)
+
+                while queue:
+                    activity = queue.popleft()
+
+                    if activity.execution.open and \
+                       activity.scheduled_event_id in activity.execution.activities:
+                        return self.start_activity(activity, identity)
+
+                if not self.wait(deadline):
+                    return response(startedEventId=0)
+
+    def start_activity(self, activity, identity):
+        execution = activity.execution
+        activity.started_event_id = self.add_event(
+            execution, "ActivityTaskStarted",
+            identity=identity,
+            scheduledEventId=activity.scheduled_event_id
+        )
+        activity.started_at = activity.heartbeat_at = self.clock()
+        activity.token = uuid.uuid4().hex
+        self.activity_tokens[activity.token] = activity
+
+        task = response(
+            taskToken=activity.token,
+            activityId=activity.activity_id,
+            startedEventId=activity.started_event_id,
+            workflowExecution=execution.reference,
+            activityType=activity.attributes["activityType"],
+        )
+
+        if "input" in activity.attributes:
+            task["input"] = activity.attributes["input"]
+
+        return task
+
+    # decisions
+
+    def respond_decision_task_completed(self, taskToken, decisions=None, executionContext=None):
+        with self.condition:
+            execution = self.decision_tokens.get(taskToken)
+
+            if execution is None or not execution.open:
+                raise fault("RespondDecisionTaskCompleted", "UnknownResourceFault", "Unknown task token")
+
+            # SWF rejects the whole batch, nothing may be applied yet
+            for decision in decisions or []:
+                self.validate_decision(decision)
+
+            completed_event_id = self.add_event(
+                execution, "DecisionTaskCompleted",
+                scheduledEventId=execution.decision_scheduled_event_id,
+                startedEventId=execution.decision_started_event_id
+            )
+            execution.previous_started_event_id = execution.decision_started_event_id
+            self.decision_tokens.pop(taskToken, None)
+            execution.decision_token = None
+            execution.decision_started_at = None
+
+            for decision in decisions or []:
+                if not execution.open:
+                    break
+
+                self.apply_decision(execution, decision, completed_event_id)
+
+            if execution.open:
+                self.end_decision(execution)
+
+            self.condition.notify_all()
+
+        return response()
+
+    def validate_decision(self, decision):
+        decision_type = decision.get("decisionType")
+
+        if decision_type not in DECISION_ATTRIBUTES:
+            raise fault(
+                "RespondDecisionTaskCompleted", "ValidationException",
+                "Unsupported decision '{0}'".format(decision_type)
+            )
+
+        attributes = decision.get(decision_attributes_key(decision_type), {})
+        missing = [name for name in DECISION_ATTRIBUTES[decision_type] if attributes.get(name) is None]
+
+        if missing:
+            raise fault(
+                "RespondDecisionTaskCompleted", "ValidationException",
+                "Decision '{0}' is missing {1}".format(decision_type, ", ".join(missing))
+            )
+
+        if decision_type == "StartChildWorkflowExecution":
+            validate_workflow_id("RespondDecisionTaskCompleted", attributes["workflowId"])
+
+    def apply_decision(self, execution, decision, completed_event_id):
+        decision_type = decision["decisionType"]
+        attributes = decision.get(decision_attributes_key(decision_type), {})
+        handler = getattr(self, "decide_{0}".format(decision_type))
+        handler(execution, attributes, completed_event_id)
+
+    def decide_ScheduleActivityTask(self, execution, attributes, completed_event_id):
+        activity_type = attributes["activityType"]
+        activity_id = attributes["activityId"]
+        cause = None
+
+        if execution.find_activity(activity_id) is not None:
+            cause = "ACTIVITY_ID_ALREADY_IN_USE"
+        elif self.strict and (execution.domain, activity_type["name"], activity_type["version"]) not in self.activity_types:
+            cause = "ACTIVITY_TYPE_DOES_NOT_EXIST"
+
+        if cause is not None:
+            self.add_event(
+                execution, "ScheduleActivityTaskFailed",
+                activityType=activity_type, activityId=activity_id,
+                cause=cause, decisionTaskCompletedEventId=completed_event_id
+            )
+            return
+
+        scheduled = dict(attributes)
+        scheduled.setdefault("taskList", {"name": execution.tasklist})
+        scheduled["decisionTaskCompletedEventId"] = completed_event_id
+
+        event_id = self.add_event(execution, "ActivityTaskScheduled", **scheduled)
+        activity = Activity(execution, event_id, scheduled, self.clock())
+        execution.activities[event_id] = activity
+
+        queue = self.activity_tasks.setdefault((execution.domain, activity.tasklist), deque())
+        queue.append(activity)
+
+    def decide_RequestCancelActivityTask(self, execution, attributes, completed_event_id):
+        activity_id = attributes["activityId"]
+        activity = execution.find_activity(activity_id)
+
+        if activity is None:
+            self.add_event(
+                execution, "RequestCancelActivityTaskFailed",
+                activityId=activity_id, cause="ACTIVITY_ID_UNKNOWN",
+                decisionTaskCompletedEventId=completed_event_id
+            )
+            return
+
+        activity.cancel_requested_event_id = self.add_event(
+            execution, "ActivityTaskCancelRequested",
+            activityId=activity_id, decisionTaskCompletedEventId=completed_event_id
+        )
+
+        if activity.started_event_id is None:
+            # nobody is working on it yet
+            execution.activities.pop(activity.scheduled_event_id)
+            self.add_event(
+                execution, "ActivityTaskCanceled",
+                scheduledEventId=activity.scheduled_event_id,
+                latestCancelRequestedEventId=activity.cancel_requested_event_id
+            )
+
+    def decide_StartTimer(self, execution, attributes, completed_event_id):
+        timer_id = attributes["timerId"]
+
+        if timer_id in execution.timers:
+            self.add_event(
+                execution, "StartTimerFailed",
+                timerId=timer_id, cause="TIMER_ID_ALREADY_IN_USE",
+                decisionTaskCompletedEventId=completed_event_id
+            )
+            return
+
+        started = dict(attributes, decisionTaskCompletedEventId=completed_event_id)
+        event_id = self.add_event(execution, "TimerStarted", **started)
+        execution.timers[timer_id] = (event_id, self.clock() + float(attributes["startToFireTimeout"]))
+
+    def decide_CancelTimer(self, execution, attributes, completed_event_id):
+        timer_id = attributes["timerId"]
+        timer = execution.timers.pop(timer_id, None)
+
+        if timer is None:
+            self.add_event(
+                execution, "CancelTimerFailed",
+                timerId=timer_id, cause="TIMER_ID_UNKNOWN",
+                decisionTaskCompletedEventId=completed_event_id
+            )
+            return
+
+        self.add_event(
+            execution, "TimerCanceled",
+            timerId=timer_id, startedEventId=timer[0],
+            decisionTaskCompletedEventId=completed_event_id
+        )
+
+    def decide_CompleteWorkflowExecution(self, execution, attributes, completed_event_id):
+        self.close(execution, "WorkflowExecutionCompleted",
+                   decisionTaskCompletedEventId=completed_event_id, **attributes)
+
+    def decide_FailWorkflowExecution(self, execution, attributes, completed_event_id):
+        self.close(execution, "WorkflowExecutionFailed",
+                   decisionTaskCompletedEventId=completed_event_id, **attributes)
+
+    def decide_CancelWorkflowExecution(self, execution, attributes, completed_event_id):
+        self.close(execution, "WorkflowExecutionCanceled",
+                   decisionTaskCompletedEventId=completed_event_id, **attributes)
+
+    def decide_ContinueAsNewWorkflowExecution(self, execution, attributes, completed_event_id):
+        started = dict(execution.attributes)
+        started.pop("input", None)
+        started.pop("continuedExecutionRunId", None)
+
+        for name in ("input", "executionStartToCloseTimeout", "taskStartToCloseTimeout",
+                     "childPolicy", "taskPriority"):
+            if attributes.get(name) is not None:
+                started[name] = attributes[name]
+
+        if attributes.get("taskList"):
+            started["taskList"] = attributes["taskList"]
+
+        if attributes.get("workflowTypeVersion"):
+            started["workflowType"] = dict(
+                execution.workflow_type, version=attributes["workflowTypeVersion"]
+            )
+
+        started["continuedExecutionRunId"] = execution.run_id
+        self.close(
+            execution, "WorkflowExecutionContinuedAsNew",
+            decisionTaskCompletedEventId=completed_event_id,
+            newExecutionRunId="pending",
+            **{key: value for key, value in attributes.items() if key != "input"}
+        )
+        new_execution = self.start(execution.domain, execution.workflow_id, started)
+        # the parent waits for the last run of its child
+        new_execution.parent = execution.parent
+
+        if execution.parent is not None:
+            execution.parent[0].children.append(new_execution)
+        execution.events[-1][attributes_key("WorkflowExecutionContinuedAsNew")]["newExecutionRunId"] = \
+            new_execution.run_id
+
+    def decide_StartChildWorkflowExecution(self, execution, attributes, completed_event_id):
+        workflow_id = attributes["workflowId"]
+        workflow_type = attributes["workflowType"]
+
+        if (execution.domain, workflow_id) in self.open_executions:
+            self.add_event(
+                execution, "StartChildWorkflowExecutionFailed",
+                workflowId=workflow_id, workflowType=workflow_type,
+                cause="WORKFLOW_ALREADY_RUNNING", initiatedEventId=0,
+                decisionTaskCompletedEventId=completed_event_id
+            )
+            return
+
+        initiated = dict(attributes, decisionTaskCompletedEventId=completed_event_id)
+        initiated.setdefault("taskList", {"name": execution.tasklist})
+        initiated.setdefault("childPolicy", "TERMINATE")
+        initiated_event_id = self.add_event(execution, "StartChildWorkflowExecutionInitiated", **initiated)
+
+        started = {
+            "workflowType": workflow_type,
+            "taskList": initiated["taskList"],
+            "childPolicy": initiated["childPolicy"],
+            "executionStartToCloseTimeout": attributes.get("executionStartToCloseTimeout", "NONE"),
+            "taskStartToCloseTimeout": attributes.get("taskStartToCloseTimeout", "NONE"),
+            "taskPriority": attributes.get("taskPriority", "0"),
+            "parentWorkflowExecution": execution.reference,
+            "parentInitiatedEventId": initiated_event_id,
+        }
+
+        for name in ("input", "tagList"):
+            if attributes.get(name) is not None:
+                started[name] = attributes[name]
+
+        child = self.start(execution.domain, workflow_id, started)
+        started_event_id = self.add_event(
+            execution, "ChildWorkflowExecutionStarted",
+            workflowExecution=child.reference, workflowType=workflow_type,
+            initiatedEventId=initiated_event_id
+        )
+        child.parent = (execution, initiated_event_id, started_event_id)
+        execution.children.append(child)
+
+    # activities
+
+    def get_activity(self, operation, task_token):
+        activity = self.activity_tokens.get(task_token)
+
+        if activity is None or activity.scheduled_event_id not in activity.execution.activities:
+            raise fault(operation, "UnknownResourceFault", "Unknown task token")
+
+        return activity
+
+    def close_activity(self, activity, event_type, **attributes):
+        execution = activity.execution
+        execution.activities.pop(activity.scheduled_event_id)
+        self.activity_tokens.pop(activity.token, None)
+        self.add_event(
+            execution, event_type,
+            scheduledEventId=activity.scheduled_event_id,
+            startedEventId=activity.started_event_id,
+            **attributes
+        )
+
+    def respond_activity_task_completed(self, taskToken, result=None):
+        with self.condition:
+            activity = self.get_activity("RespondActivityTaskCompleted", taskToken)
+            attributes = {} if result is None else {"result": result}
+            self.close_activity(activity, "ActivityTaskCompleted", **attributes)
+
+        return response()
+
+    def respond_activity_task_failed(self, taskToken, reason="", details=""):
+        with self.condition:
+            activity = self.get_activity("RespondActivityTaskFailed", taskToken)
+            self.close_activity(activity, "ActivityTaskFailed", reason=reason, details=details)
+
+        return response()
+
+    def respond_activity_task_canceled(self, taskToken, details=""):
+        with self.condition:
+            activity = self.get_activity("RespondActivityTaskCanceled", taskToken)
+            attributes = {"details": details}
+
+            if activity.cancel_requested_event_id is not None:
+                attributes["latestCancelRequestedEventId"] = activity.cancel_requested_event_id
+
+            self.close_activity(activity, "ActivityTaskCanceled", **attributes)
+
+        return response()
+
+    def record_activity_task_heartbeat(self, taskToken, details=None):
+        with self.condition:
+            activity = self.get_activity("RecordActivityTaskHeartbeat", taskToken)
+            activity.heartbeat_at = self.clock()
+
+            if details is not None:
+                activity.heartbeat_details = details
+
+            return response(cancelRequested=activity.cancel_requested_event_id is not None)
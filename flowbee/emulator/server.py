@@ -0,0 +1,133 @@
+"""SWF JSON 1.0 protocol over HTTP for the emulator
+
+Lets boto3 clients in other processes talk to a SWFEmulator, point
+them at it with FLOWBEE_SWF_ENDPOINT_URL (or configure_client):
+
+    FLOWBEE_SWF_ENDPOINT_URL=http://127.0.0.1:8600 flowbee ...
+
+botocore still signs every request, any credentials and region will do.
+"""
+from __future__ import absolute_import
+import re
+import json
+import logging
+import calendar
+import datetime
+import threading
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from botocore.exceptions import ClientError
+from .core import SWFEmulator
+
+log = logging.getLogger(__name__)
+
+TARGET_PREFIX = "SimpleWorkflowService."
+CONTENT_TYPE = "application/x-amz-json-1.0"
+
+OPERATIONS = frozenset([
+    "RegisterDomain",
+    "RegisterWorkflowType",
+    "RegisterActivityType",
+    "StartWorkflowExecution",
+    "TerminateWorkflowExecution",
+    "DescribeWorkflowExecution",
+    "GetWorkflowExecutionHistory",
+    "PollForDecisionTask",
+    "PollForActivityTask",
+    "RespondDecisionTaskCompleted",
+    "RespondActivityTaskCompleted",
+    "RespondActivityTaskFailed",
+    "RespondActivityTaskCanceled",
+    "RecordActivityTaskHeartbeat",
+])
+
+FIRST_CAP = re.compile(r"(.)([A-Z][a-z]+)")
+ALL_CAP = re.compile(r"([a-z0-9])([A-Z])")
+
+
+def method_name(operation):
+    name = FIRST_CAP.sub(r"\1_\2", operation)
+    return ALL_CAP.sub(r"\1_\2", name).lower()
+
+
+def encode(value):
+    """JSON protocol timestamps are epoch seconds"""
+    if isinstance(value, datetime.datetime):
+        return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+
+    raise TypeError("{0!r} is not JSON serializable".format(value))
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        target = self.headers.get("X-Amz-Target", "")
+        operation = target[len(TARGET_PREFIX):]
+
+        if not target.startswith(TARGET_PREFIX) or operation not in OPERATIONS:
+            return self.reply(400, {
+                "__type": "UnknownOperationException",
+                "message": "Unsupported operation '{0}'".format(target),
+            })
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        try:
+            kwargs = json.loads(body.decode("utf-8")) if body else {}
+            method = getattr(self.server.emulator, method_name(operation))
+            result = method(**kwargs)
+        except ClientError as e:
+            error = e.response["Error"]
+            return self.reply(400, {"__type": error["Code"], "message": error["Message"]})
+        except (ValueError, TypeError, KeyError) as e:
+            return self.reply(400, {"__type": "ValidationException", "message": str(e)})
+
+        result = dict(result)
+        result.pop("ResponseMetadata", None)
+        self.reply(200, result)
+
+    def reply(self, status, payload):
+        body = json.dumps(payload, default=encode).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+
+class EmulatorServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """HTTP server answering SWF calls from a SWFEmulator
+
+    Every request is handled on its own thread so long polls don't
+    block each other.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=("127.0.0.1", 8600), emulator=None):
+        BaseHTTPServer.HTTPServer.__init__(self, address, Handler)
+        self.emulator = emulator or SWFEmulator()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{0}:{1}".format(host, port)
+
+    def start(self):
+        """Serve from a daemon thread
+
+        :returns: the thread
+        """
+        thread = threading.Thread(target=self.serve_forever, name="flowbee-emulator")
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
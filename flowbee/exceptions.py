@@ -1,3 +1,8 @@
+def get_message(e):
+    """Message of any exception, Python 3 dropped BaseException.message"""
+    return getattr(e, "message", None) or str(e)
+
+
 class MessageException(Exception):
 
     def __init__(self, message):
@@ -15,6 +20,14 @@ class DeciderException(MessageException):
     pass
 
 
+class PayloadStoreException(MessageException):
+    pass
+
+
+class HistoryException(MessageException):
+    pass
+
+
 class TimerStarted(Exception):
     pass
 
@@ -31,9 +44,24 @@ class ActivityFailedException(Exception):
     pass
 
 
+class ActivityCancelledException(MessageException):
+    pass
+
+
+class ChildWorkflowFailedException(MessageException):
+    pass
+
+
 class RetryLimitExceededException(Exception):
     pass
 
 
 class WorkflowComplete(Exception):
+
+    def __init__(self, result=None):
+        super(WorkflowComplete, self).__init__()
+        self.result = result
+
+
+class WorkflowContinuedAsNew(Exception):
     pass
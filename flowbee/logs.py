@@ -0,0 +1,339 @@
+"""Logging helpers for flowbee internals
+
+Pollers log on every task, so their records must cost nothing unless
+they are emitted:
+
+- `lazy` defers expensive formatting until a handler formats the record
+- `fields` attaches key/value pairs that KeyValueFormatter and
+  JSONFormatter render, e.g.
+  `log.info("Scheduling activity", extra=logs.fields(activity_id=...))`
+- `sample` keeps 1 in N low level records of a chatty logger
+- `start_queue` moves a logger's handlers to a background thread so a
+  slow stream or file never blocks a poller
+
+Queueing and sampling can be configured with FLOWBEE_LOG_QUEUE=0|1 and
+FLOWBEE_LOG_SAMPLE="flowbee.utils=100,flowbee.workers.base=10".
+"""
+from __future__ import absolute_import
+import os
+import json
+import atexit
+import logging
+import logging.handlers
+import threading
+import itertools
+import six
+from six.moves.queue import Queue
+
+log = logging.getLogger(__name__)
+
+LOGGING_ENVIRON = {
+    "queue": "FLOWBEE_LOG_QUEUE",
+    "sample": "FLOWBEE_LOG_SAMPLE",
+}
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+class Lazy(object):
+    """Calls func when the record is formatted, never if it is dropped"""
+
+    __slots__ = ("func", "args", "kwargs")
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.func(*self.args, **self.kwargs))
+
+    __repr__ = __str__
+
+
+def lazy(func, *args, **kwargs):
+    return Lazy(func, *args, **kwargs)
+
+
+def fields(**kwargs):
+    """`extra` for a structured record"""
+    return {"fields": kwargs}
+
+
+def record_fields(record):
+    return getattr(record, "fields", None) or {}
+
+
+def format_value(value):
+    text = six.text_type(value)
+
+    if not text or any(char.isspace() or char in '"=' for char in text):
+        return json.dumps(text)
+
+    return text
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Appends the record's fields as key=value pairs"""
+
+    def format(self, record):
+        message = logging.Formatter.format(self, record)
+        values = record_fields(record)
+
+        if not values:
+            return message
+
+        pairs = " ".join(
+            "{0}={1}".format(key, format_value(value))
+            for key, value in sorted(values.items())
+        )
+        return "{0} {1}".format(message, pairs)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(record_fields(record))
+
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+
+        return json.dumps(data, default=six.text_type, sort_keys=True)
+
+
+class SampleFilter(logging.Filter):
+    """Keep 1 in every records at or below level
+
+    Records above level, warnings and errors by default, always pass.
+    """
+
+    def __init__(self, every, level=logging.INFO):
+        logging.Filter.__init__(self)
+        self.every = max(1, int(every))
+        self.level = level
+        self.counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+
+        # next() on a count is atomic under the GIL
+        return next(self.counter) % self.every == 0
+
+
+def sample(name, every, level=logging.INFO):
+    """Sample the records logged on the logger `name`
+
+    Replaces any sampling set on that logger before.
+
+    :returns: the SampleFilter
+    """
+    logger = logging.getLogger(name)
+
+    for existing in list(logger.filters):
+        if isinstance(existing, SampleFilter):
+            logger.removeFilter(existing)
+
+    sample_filter = SampleFilter(every, level=level)
+    logger.addFilter(sample_filter)
+    return sample_filter
+
+
+try:
+    QueueHandler = logging.handlers.QueueHandler
+    QueueListener = logging.handlers.QueueListener
+except AttributeError:
+    # Python 2
+
+    class QueueHandler(logging.Handler):
+        def __init__(self, queue):
+            logging.Handler.__init__(self)
+            self.queue = queue
+
+        def prepare(self, record):
+            return record
+
+        def emit(self, record):
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except Exception:
+                self.handleError(record)
+
+    class QueueListener(object):
+        _sentinel = None
+
+        def __init__(self, queue, *handlers, **kwargs):
+            self.queue = queue
+            self.handlers = handlers
+            self.respect_handler_level = kwargs.get("respect_handler_level", False)
+            self._thread = None
+
+        def start(self):
+            self._thread = threading.Thread(target=self._monitor, name="flowbee-log-listener")
+            self._thread.daemon = True
+            self._thread.start()
+
+        def handle(self, record):
+            for handler in self.handlers:
+                if not self.respect_handler_level or record.levelno >= handler.level:
+                    handler.handle(record)
+
+        def _monitor(self):
+            while True:
+                record = self.queue.get()
+
+                if record is self._sentinel:
+                    break
+
+                self.handle(record)
+
+        def stop(self):
+            self.queue.put_nowait(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+
+class PlainQueueHandler(QueueHandler):
+    """QueueHandler leaving the formatting to the listener's handlers
+
+    The stock prepare() formats the message with the queue handler's
+    own formatter, that would drop the fields and the target handler's
+    format. Only the arguments are merged, they may change once the
+    caller returns.
+
+    A forked child (Python 2 process pools) inherits the handler but not
+    the listener's thread, nothing would drain the queue: records
+    emitted there go straight to the listener's handlers.
+    """
+
+    def __init__(self, queue, listener=None):
+        QueueHandler.__init__(self, queue)
+        self.listener = listener
+        self.pid = os.getpid()
+
+    def emit(self, record):
+        if os.getpid() == self.pid:
+            QueueHandler.emit(self, record)
+        elif self.listener is not None:
+            self.listener.handle(record)
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            # tracebacks don't survive the queue, render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+
+def start_queue(name="flowbee"):
+    """Emit the records of the logger `name` from a background thread
+
+    The logger's handlers move behind a queue, a QueueHandler takes
+    their place. The queue is drained on exit.
+
+    :returns: the QueueListener
+    """
+    logger = logging.getLogger(name)
+
+    with _listeners_lock:
+        if name in _listeners:
+            return _listeners[name]
+
+        handlers = list(logger.handlers)
+
+        if not handlers:
+            return None
+
+        records = Queue(-1)
+        listener = QueueListener(records, *handlers, respect_handler_level=True)
+
+        for handler in handlers:
+            logger.removeHandler(handler)
+
+        logger.addHandler(PlainQueueHandler(records, listener))
+        listener.start()
+        _listeners[name] = listener
+
+    return listener
+
+
+def stop_queue(name="flowbee"):
+    """Flush the queue of the logger `name` and restore its handlers"""
+    with _listeners_lock:
+        listener = _listeners.pop(name, None)
+
+        if listener is None:
+            return
+
+        logger = logging.getLogger(name)
+
+        for handler in list(logger.handlers):
+            if isinstance(handler, QueueHandler):
+                logger.removeHandler(handler)
+
+        listener.stop()
+
+        for handler in listener.handlers:
+            logger.addHandler(handler)
+
+
+def stop_queues():
+    for name in list(_listeners):
+        stop_queue(name)
+
+
+atexit.register(stop_queues)
+
+
+def parse_sampling(value):
+    """"name=every,name=every" -> {name: every}"""
+    rates = {}
+
+    for item in (value or "").split(","):
+        item = item.strip()
+
+        if not item:
+            continue
+
+        name, _, every = item.rpartition("=")
+
+        if not name:
+            raise ValueError("Expected 'logger=every' in FLOWBEE_LOG_SAMPLE, got '{0}'".format(item))
+
+        rates[name] = int(every)
+
+    return rates
+
+
+def configure_logging(name="flowbee", queue=None, sampling=None):
+    """Apply queueing and sampling once the handlers are configured
+
+    :param queue: emit from a background thread (default:
+                  FLOWBEE_LOG_QUEUE, on)
+    :param sampling: {logger name: every} (default: FLOWBEE_LOG_SAMPLE)
+    """
+    if queue is None:
+        queue = os.getenv(LOGGING_ENVIRON["queue"], "1") not in ("0", "false", "no")
+
+    if sampling is None:
+        sampling = parse_sampling(os.getenv(LOGGING_ENVIRON["sample"]))
+
+    for logger_name, every in sampling.items():
+        sample(logger_name, every)
+
+    if queue:
+        start_queue(name)
@@ -0,0 +1,339 @@
+"""Counters and histograms for pollers, deciders and activities
+
+Metrics are aggregated in memory by a Registry and handed to its sinks
+as they are recorded. Two exporters ship with flowbee:
+
+- PrometheusServer serves the registry in the Prometheus text format
+- StatsDSink sends every sample over UDP, tags in the DogStatsD format
+
+Both are configured from the environment by the CLI:
+
+    FLOWBEE_METRICS_PORT=9464 FLOWBEE_STATSD=127.0.0.1:8125 flowbee ...
+
+Any object with `increment(name, value, tags)` and
+`observe(name, value, tags)` methods can be added with `add_sink`.
+"""
+from __future__ import absolute_import
+import os
+import time
+import errno
+import socket
+import logging
+import threading
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+
+log = logging.getLogger(__name__)
+
+# seconds, from a cached replay to a full 60s long poll
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# bytes, SWF payloads are capped at 32KB
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 32768, 131072, 1048576)
+
+METRICS_ENVIRON = {
+    "prometheus_port": "FLOWBEE_METRICS_PORT",
+    "statsd": "FLOWBEE_STATSD",
+}
+
+# the CLI starts several processes, each takes the next free port
+PORT_ATTEMPTS = 64
+
+
+def tag_key(tags):
+    return tuple(sorted((key, str(value)) for key, value in tags.items()))
+
+
+class Histogram(object):
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class Timer(object):
+    """Context manager observing the seconds spent in its block"""
+
+    def __init__(self, registry, name, tags):
+        self.registry = registry
+        self.name = name
+        self.tags = tags
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.observe(self.name, time.time() - self.started, **self.tags)
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.sinks = []
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+
+    def increment(self, name, value=1, **tags):
+        key = (name, tag_key(tags))
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+        for sink in self.sinks:
+            sink.increment(name, value, tags)
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **tags):
+        key = (name, tag_key(tags))
+
+        with self.lock:
+            histogram = self.histograms.get(key)
+
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+
+            histogram.observe(value)
+
+        for sink in self.sinks:
+            sink.observe(name, value, tags)
+
+    def timer(self, name, **tags):
+        return Timer(self, name, tags)
+
+    def get_counter(self, name, **tags):
+        return self.counters.get((name, tag_key(tags)), 0)
+
+    def get_histogram(self, name, **tags):
+        return self.histograms.get((name, tag_key(tags)))
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self):
+        """The registry in the Prometheus text exposition format"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, (list(histogram.cumulative()), histogram.sum, histogram.count))
+                for key, histogram in self.histograms.items()
+            )
+
+        lines = []
+        declared = set()
+
+        for (name, tags), value in counters:
+            if name not in declared:
+                declared.add(name)
+                lines.append("# TYPE {0} counter".format(name))
+
+            lines.append("{0}{1} {2}".format(name, labels(tags), value))
+
+        for (name, tags), (buckets, total, count) in histograms:
+            if name not in declared:
+                declared.add(name)
+                lines.append("# TYPE {0} histogram".format(name))
+
+            for bound, cumulative in buckets:
+                lines.append("{0}_bucket{1} {2}".format(name, labels(tags, le=bound), cumulative))
+
+            lines.append("{0}_bucket{1} {2}".format(name, labels(tags, le="+Inf"), count))
+            lines.append("{0}_sum{1} {2}".format(name, labels(tags), total))
+            lines.append("{0}_count{1} {2}".format(name, labels(tags), count))
+
+        return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def labels(tags, le=None):
+    pairs = list(tags)
+
+    if le is not None:
+        pairs.append(("le", str(le)))
+
+    if not pairs:
+        return ""
+
+    return "{" + ",".join('{0}="{1}"'.format(key, escape(value)) for key, value in pairs) + "}"
+
+
+class StatsDSink(object):
+    """Send samples to StatsD over UDP
+
+    Counters go out as `c`, `*_seconds` histograms as `ms` timings and
+    other histograms as `h`. Tags use the DogStatsD `|#key:value`
+    extension, pass tags=False for a plain StatsD server. Sending never
+    raises, a lost datagram is a lost sample.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8125, prefix="", tags=True):
+        self.address = (host, int(port))
+        self.prefix = prefix
+        self.tags = tags
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def format(self, name, value, kind, tags):
+        line = "{0}{1}:{2}|{3}".format(self.prefix, name, value, kind)
+
+        if self.tags and tags:
+            line += "|#" + ",".join(
+                "{0}:{1}".format(key, value) for key, value in sorted(tags.items())
+            )
+
+        return line
+
+    def send(self, line):
+        try:
+            self.socket.sendto(line.encode("utf-8"), self.address)
+        except (socket.error, OSError) as e:
+            log.debug("Unable to send metric to %s: %s", self.address, e)
+
+    def increment(self, name, value, tags):
+        self.send(self.format(name, value, "c", tags))
+
+    def observe(self, name, value, tags):
+        if name.endswith("_seconds"):
+            self.send(self.format(name, int(round(value * 1000)), "ms", tags))
+        else:
+            self.send(self.format(name, value, "h", tags))
+
+    def close(self):
+        self.socket.close()
+
+
+class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+
+class PrometheusServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Serve a Registry on /metrics from a daemon thread"""
+    daemon_threads = True
+
+    def __init__(self, registry, address=("0.0.0.0", 9464)):
+        BaseHTTPServer.HTTPServer.__init__(self, address, MetricsHandler)
+        self.registry = registry
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="flowbee-metrics")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+_registry = Registry()
+
+
+def get_registry():
+    return _registry
+
+
+def increment(name, value=1, **tags):
+    _registry.increment(name, value, **tags)
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **tags):
+    _registry.observe(name, value, buckets=buckets, **tags)
+
+
+def timer(name, **tags):
+    return _registry.timer(name, **tags)
+
+
+def start_prometheus(port, host="0.0.0.0", attempts=PORT_ATTEMPTS):
+    """Serve the registry on the first free port from port on
+
+    :returns: the running PrometheusServer
+    """
+    for offset in range(attempts):
+        try:
+            server = PrometheusServer(_registry, (host, port + offset))
+        except socket.error as e:
+            if e.errno != errno.EADDRINUSE:
+                raise
+            continue
+
+        log.info("Serving metrics on port %s", server.port)
+        return server.start()
+
+    raise RuntimeError("No free metrics port in {0}-{1}".format(port, port + attempts - 1))
+
+
+def configure_metrics(prometheus_port=None, statsd=None):
+    """Start the exporters, by default from FLOWBEE_METRICS_PORT and
+    FLOWBEE_STATSD
+
+    :param prometheus_port: first port to serve /metrics on
+    :param statsd: "host:port" of a StatsD server
+    :returns: the started exporters
+    """
+    if prometheus_port is None:
+        prometheus_port = os.getenv(METRICS_ENVIRON["prometheus_port"])
+
+    if statsd is None:
+        statsd = os.getenv(METRICS_ENVIRON["statsd"])
+
+    exporters = []
+
+    if prometheus_port:
+        exporters.append(start_prometheus(int(prometheus_port)))
+
+    if statsd:
+        host, _, port = statsd.rpartition(":")
+        sink = StatsDSink(host or "127.0.0.1", int(port))
+        _registry.add_sink(sink)
+        exporters.append(sink)
+
+    return exporters
@@ -2,3 +2,4 @@ from collections import namedtuple
 
 
 TaskMeta = namedtuple("TaskMeta", ["task_token", "run_id", "workflow_id", "domain", "tasklist"])
+StartResult = namedtuple("StartResult", ["input", "workflow_id", "run_id", "error"])
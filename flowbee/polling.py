@@ -0,0 +1,195 @@
+"""Backoff on SWF errors and adaptive long poll concurrency
+
+A poll that fails returns straight away, without a backoff the poll
+loops would spin on a throttled or misconfigured account. Errors are
+told apart by their code:
+
+- throttled: the account is over its API rate, back off from a second
+  up to a minute with full jitter so processes don't retry in step
+- fatal: credentials, permissions or a missing domain, nothing will
+  change soon, wait about a minute between attempts and say so loudly
+- transient: network and server errors, retry quickly with backoff
+
+PollerScaler sizes the number of concurrent long polls from the share
+of recent polls that came back empty.
+"""
+from __future__ import absolute_import
+import time
+import random
+import logging
+import threading
+from botocore.exceptions import (ClientError, BotoCoreError)
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+THROTTLED = "throttled"
+FATAL = "fatal"
+TRANSIENT = "transient"
+
+THROTTLING_CODES = frozenset([
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "LimitExceededException",
+    "ProvisionedThroughputExceededException",
+    "SlowDown",
+])
+
+FATAL_CODES = frozenset([
+    "AccessDenied",
+    "AccessDeniedException",
+    "UnrecognizedClientException",
+    "InvalidClientTokenId",
+    "InvalidSignatureException",
+    "SignatureDoesNotMatch",
+    "MissingAuthenticationToken",
+    "MissingAuthenticationTokenException",
+    "ExpiredToken",
+    "ExpiredTokenException",
+    "OperationNotPermittedFault",
+    "UnknownResourceFault",
+    "ValidationException",
+])
+
+# (base, cap) in seconds of the backoff for each kind of error
+DELAYS = {
+    THROTTLED: (1.0, 60.0),
+    FATAL: (60.0, 60.0),
+    TRANSIENT: (0.1, 30.0),
+}
+
+
+def classify(error):
+    """throttled|fatal|transient"""
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+
+        if code in THROTTLING_CODES:
+            return THROTTLED
+
+        if code in FATAL_CODES:
+            return FATAL
+
+    return TRANSIENT
+
+
+def is_retryable(error):
+    """Errors the poll loops back off on instead of raising"""
+    return isinstance(error, (ClientError, BotoCoreError))
+
+
+class Backoff(object):
+    """Exponential backoff with full jitter, shared by a process' pollers
+
+    The delay grows with the number of consecutive failures, any
+    success resets it. Every failed poll sleeps in the polling thread.
+    """
+
+    def __init__(self, delays=None, sleep=time.sleep, random=random.random):
+        self.delays = dict(DELAYS, **(delays or {}))
+        self.sleep = sleep
+        self.random = random
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def delay(self, kind):
+        base, cap = self.delays[kind]
+
+        with self.lock:
+            attempt = self.failures
+            self.failures += 1
+
+        ceiling = min(cap, base * (2 ** min(attempt, 32)))
+
+        if kind == FATAL:
+            # spread the processes out without shortening the wait much
+            return ceiling * (0.5 + self.random() / 2)
+
+        return ceiling * self.random()
+
+    def failed(self, error, operation=""):
+        """Wait before the next attempt
+
+        :returns: the seconds waited
+        """
+        kind = classify(error)
+        delay = self.delay(kind)
+        metrics.increment("flowbee_backoff_total", operation=operation, kind=kind)
+
+        if kind == FATAL:
+            log.error("SWF rejected %s, retrying in %.0fs: %s", operation, delay, error)
+        else:
+            log.warning("SWF %s %s, retrying in %.2fs: %s", operation, kind, delay, error)
+
+        self.sleep(delay)
+        return delay
+
+    def succeeded(self):
+        if self.failures:
+            with self.lock:
+                self.failures = 0
+
+
+class PollerScaler(object):
+    """Number of pollers allowed to long poll at the same time
+
+    Pollers are numbered from 0, a poller whose index is not below
+    `active` waits for its turn. Every `window` polls the empty ratio
+    is checked: one more poller when at most `scale_up` of them came
+    back empty, one less when at least `scale_down` did. Starts with
+    every poller active so a backlog is picked up right away.
+    """
+
+    def __init__(self, maximum, minimum=1, window=10, scale_up=0.2, scale_down=0.8):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.window = window
+        self.scale_up = scale_up
+        self.scale_down = scale_down
+        self.active = self.maximum
+        self.polls = 0
+        self.empty = 0
+        self.condition = threading.Condition()
+
+    def is_active(self, index):
+        return index < self.active
+
+    def wait_turn(self, index):
+        if index < self.active:
+            return
+
+        with self.condition:
+            while index >= self.active:
+                self.condition.wait()
+
+    def record(self, received):
+        """Count a poll, received is True when it returned a task"""
+        with self.condition:
+            self.polls += 1
+
+            if not received:
+                self.empty += 1
+
+            if self.polls < self.window:
+                return
+
+            ratio = float(self.empty) / self.polls
+            self.polls = self.empty = 0
+
+            if ratio <= self.scale_up and self.active < self.maximum:
+                self.resize(self.active + 1)
+            elif ratio >= self.scale_down and self.active > self.minimum:
+                self.resize(self.active - 1)
+
+    def resize(self, active):
+        log.debug("Long polling with %s of %s pollers", active, self.maximum)
+        metrics.increment(
+            "flowbee_poller_scaling_total", direction="up" if active > self.active else "down"
+        )
+        self.active = active
+        self.condition.notify_all()
@@ -0,0 +1,262 @@
+"""Client side rate limiting of SWF requests
+
+SWF throttles an account once it goes over its API rates and every
+process then fails at the same time. utils.request takes a token from
+the limiter of the operation's family before calling SWF:
+
+- poll: long polls and history pages
+- respond: task responses and heartbeats
+- start: starting, signaling and terminating executions
+- register: domain and type registration
+
+Rates are requests per second, optionally followed by a burst size,
+and are read from the environment unless configure_rate_limits is
+called:
+
+    FLOWBEE_RATE_POLL=20 FLOWBEE_RATE_RESPOND=50:100 flowbee ...
+
+Limiters are shared by the threads of a process. With FLOWBEE_RATE_FILE
+set, the buckets live in that file instead, locked with fcntl, and every
+process pointing at it shares them: the rates then hold for all of them
+together. `flowbee.cli.main` sets one up for the processes it starts.
+"""
+from __future__ import absolute_import
+import os
+import time
+import struct
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover, Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+FAMILIES = ("poll", "respond", "start", "register")
+
+OPERATIONS = {
+    "poll_for_activity_task": "poll",
+    "poll_for_decision_task": "poll",
+    "get_workflow_execution_history": "poll",
+    "respond_activity_task_completed": "respond",
+    "respond_activity_task_failed": "respond",
+    "respond_activity_task_canceled": "respond",
+    "respond_decision_task_completed": "respond",
+    "record_activity_task_heartbeat": "respond",
+    "start_workflow_execution": "start",
+    "signal_workflow_execution": "start",
+    "request_cancel_workflow_execution": "start",
+    "terminate_workflow_execution": "start",
+    "register_domain": "register",
+    "register_workflow_type": "register",
+    "register_activity_type": "register",
+}
+
+RATE_ENVIRON = {
+    "poll": "FLOWBEE_RATE_POLL",
+    "respond": "FLOWBEE_RATE_RESPOND",
+    "start": "FLOWBEE_RATE_START",
+    "register": "FLOWBEE_RATE_REGISTER",
+    "path": "FLOWBEE_RATE_FILE",
+}
+
+# (tokens, updated) of a family's bucket in the shared file
+RECORD = struct.Struct("<dd")
+
+_lock = threading.Lock()
+_overrides = {}
+_limiters = {}
+
+
+class RateLimiter(object):
+    """Token bucket shared by the threads of a process
+
+    Holds up to `burst` tokens refilled at `rate` tokens per second,
+    every request takes one and waits for it when the bucket is empty.
+
+    :param rate: requests per second
+    :param burst: requests allowed at once after an idle period
+                  (default: one second worth of requests)
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive, got {0}".format(rate))
+
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, self.rate))
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Take tokens, going into debt when there are not enough
+
+        :returns: the seconds to wait before using them
+        """
+        with self.lock:
+            self.tokens, self.updated, delay = self.take(tokens, self.tokens, self.updated)
+            return delay
+
+    def take(self, tokens, available, updated):
+        """Refill a bucket last updated at `updated` and take tokens
+
+        :returns: (available, updated, delay) after taking them
+        """
+        now = self.clock()
+        available = min(self.burst, available + max(0.0, now - updated) * self.rate) - tokens
+
+        if available >= 0:
+            return available, now, 0.0
+
+        return available, now, -available / self.rate
+
+    def acquire(self, tokens=1):
+        """Wait until tokens are available
+
+        :returns: the seconds waited
+        """
+        delay = self.reserve(tokens)
+
+        if delay > 0:
+            self.sleep(delay)
+
+        return delay
+
+
+class SharedRateLimiter(RateLimiter):
+    """Token bucket stored in a file shared by several processes
+
+    Each family has a fixed size record in the file, locked with
+    fcntl.lockf while a process takes its tokens. A missing record
+    starts as a full bucket.
+
+    :param path: the shared file, created when missing
+    :param slot: index of the bucket's record in the file
+    """
+
+    def __init__(self, path, slot, rate, burst=None, clock=time.time, sleep=time.sleep):
+        super(SharedRateLimiter, self).__init__(rate, burst=burst, clock=clock, sleep=sleep)
+        self.path = path
+        self.offset = slot * RECORD.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def reserve(self, tokens=1):
+        # lockf locks belong to the process, the threads queue up first
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, RECORD.size, self.offset)
+
+            try:
+                os.lseek(self.fd, self.offset, os.SEEK_SET)
+                data = os.read(self.fd, RECORD.size)
+
+                if len(data) == RECORD.size:
+                    available, updated = RECORD.unpack(data)
+                else:
+                    available, updated = self.burst, self.clock()
+
+                available, updated, delay = self.take(tokens, available, updated)
+
+                os.lseek(self.fd, self.offset, os.SEEK_SET)
+                os.write(self.fd, RECORD.pack(available, updated))
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, RECORD.size, self.offset)
+
+        return delay
+
+    def close(self):
+        os.close(self.fd)
+
+
+def parse_rate(value):
+    """"rate" or "rate:burst" to (rate, burst)"""
+    if isinstance(value, (int, float)):
+        return float(value), None
+
+    rate, _, burst = str(value).partition(":")
+    return float(rate), float(burst) if burst else None
+
+
+def configure_rate_limits(**kwargs):
+    """Configure the limiters used by utils.request
+
+    Any value left as None falls back to the matching FLOWBEE_RATE_*
+    environment variable, a family without a rate is not limited.
+    Reconfiguring discards the limiters built so far.
+
+    :param poll: rate of the poll family, requests per second or a
+                 "rate:burst" string, as are respond, start and register
+    :param path: file to share the buckets through with other processes
+    :returns: None
+    """
+    unknown = set(kwargs) - set(RATE_ENVIRON)
+
+    if unknown:
+        raise TypeError("Unknown rate limits: {0}".format(", ".join(sorted(unknown))))
+
+    with _lock:
+        _overrides.update(
+            (key, value) for key, value in kwargs.items() if value is not None
+        )
+        clear_limiters()
+
+
+def get_rate_settings():
+    settings = dict((key, os.getenv(name) or None) for key, name in RATE_ENVIRON.items())
+    settings.update(_overrides)
+    return settings
+
+
+def build_limiters(settings):
+    path = settings["path"]
+
+    if path and fcntl is None:
+        log.warning("File locks are not available, rate limits apply to each process")
+        path = None
+
+    limiters = {}
+
+    for slot, family in enumerate(FAMILIES):
+        if not settings[family]:
+            continue
+
+        rate, burst = parse_rate(settings[family])
+
+        if path:
+            limiters[family] = SharedRateLimiter(path, slot, rate, burst=burst)
+        else:
+            limiters[family] = RateLimiter(rate, burst=burst)
+
+    return limiters
+
+
+def clear_limiters():
+    pid, limiters = _limiters.pop("current", (None, {}))
+
+    if pid == os.getpid():
+        for limiter in limiters.values():
+            if isinstance(limiter, SharedRateLimiter):
+                limiter.close()
+
+
+def get_limiter(operation):
+    """Limiter of an SWF operation's family, None when not limited
+
+    Limiters are built once per process, a forked child builds its own
+    and opens the shared file again.
+    """
+    pid = os.getpid()
+    current = _limiters.get("current")
+
+    if current is None or current[0] != pid:
+        with _lock:
+            current = _limiters.get("current")
+
+            if current is None or current[0] != pid:
+                current = _limiters["current"] = (pid, build_limiters(get_rate_settings()))
+
+    return current[1].get(OPERATIONS.get(operation))
@@ -0,0 +1,165 @@
+"""Payload serializers
+
+Payloads are JSON unless a workflow or an activity asks for another
+serializer. json, ujson and orjson all produce JSON and read each
+other's output. msgpack payloads start with b"\\xc1", a byte msgpack
+never uses and that can't start UTF-8 JSON, so decoding always picks
+the right backend by itself.
+
+Fast backends are only used when importable. Types they can't handle
+go through encoders.JSONEncoder.default, so datetime, Decimal, UUID or
+numpy values encode the same whichever backend is used.
+"""
+from __future__ import absolute_import
+import json
+import logging
+from . import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+log = logging.getLogger(__name__)
+
+MSGPACK_MARKER = b"\xc1"
+
+_encoder = encoders.JSONEncoder()
+
+
+def encode_default(obj):
+    """Fallback for types the fast backends don't know"""
+    return _encoder.default(obj)
+
+
+def json_dumps(value):
+    return json.dumps(value, cls=encoders.JSONEncoder).encode("utf-8")
+
+
+def json_loads(data):
+    return json.loads(data.decode("utf-8"))
+
+
+class Serializer(object):
+
+    def __init__(self, name, dumps, loads):
+        """Payload serializer
+
+        :param name: name used by @workflow(serializer=...) and
+                     @activity(serializer=...)
+        :param dumps: function(value) -> bytes
+        :param loads: function(bytes) -> value
+        """
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return "<Serializer '{0}'>".format(self.name)
+
+
+SERIALIZERS = {}
+
+
+def register_serializer(serializer):
+    SERIALIZERS[serializer.name] = serializer
+
+
+register_serializer(Serializer("json", json_dumps, json_loads))
+
+if ujson is not None:
+    def ujson_dumps(value):
+        try:
+            return ujson.dumps(value).encode("utf-8")
+        except (TypeError, OverflowError):
+            # ujson has no default hook on every version
+            return json_dumps(value)
+
+    register_serializer(Serializer("ujson", ujson_dumps, ujson.loads))
+
+if orjson is not None:
+    # datetimes go through JSONEncoder, orjson formats them differently
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY
+
+    def orjson_dumps(value):
+        try:
+            return orjson.dumps(value, default=encode_default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # non string keys, integers over 64 bits
+            return json_dumps(value)
+
+    register_serializer(Serializer("orjson", orjson_dumps, orjson.loads))
+
+if msgpack is not None:
+    def msgpack_dumps(value):
+        return MSGPACK_MARKER + msgpack.packb(value, default=encode_default, use_bin_type=True)
+
+    def msgpack_loads(data):
+        return msgpack.unpackb(data[1:], raw=False)
+
+    register_serializer(Serializer("msgpack", msgpack_dumps, msgpack_loads))
+
+# fastest JSON backend installed, every JSON backend decodes JSON payloads
+JSON = SERIALIZERS.get("orjson") or SERIALIZERS.get("ujson") or SERIALIZERS["json"]
+
+_default = {"serializer": None}
+
+
+def configure_serializer(name=None):
+    """Set the serializer of workflows and activities that don't pick one
+
+    :param name: registered serializer name (default: the fastest JSON
+                 backend installed)
+    """
+    if name is not None:
+        get_serializer(name)
+
+    _default["serializer"] = name
+
+
+def get_serializer(name=None):
+    if name is None:
+        name = _default["serializer"]
+
+    if name is None:
+        return JSON
+
+    try:
+        return SERIALIZERS[name]
+    except KeyError:
+        raise ValueError(
+            "Unknown serializer '{0}', available: {1}".format(name, sorted(SERIALIZERS))
+        )
+
+
+def dumps(value, serializer=None):
+    """Serialize value to bytes
+
+    :param serializer: serializer name (default: see configure_serializer)
+    """
+    return get_serializer(serializer).dumps(value)
+
+
+def loads(data):
+    """Deserialize bytes written by any registered serializer"""
+    if data[:1] == MSGPACK_MARKER:
+        if msgpack is None:
+            raise ValueError("Payload was serialized with msgpack, which is not installed")
+
+        return SERIALIZERS["msgpack"].loads(data)
+
+    try:
+        return JSON.loads(data)
+    except ValueError:
+        # NaN and Infinity written by the stdlib encoder
+        return json_loads(data)
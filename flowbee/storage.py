@@ -0,0 +1,248 @@
+"""Blob store for payloads too large to pass through SWF
+
+SWF caps input, result and control fields at 32k characters and every
+decision task downloads the full history again, so large payloads are
+written to a blob store and replaced by a short content addressed
+reference:
+
+    flowbee:blob:sha256:<hex digest of the encoded payload>
+
+References can't be mistaken for encoded payloads, base64 never
+contains ':'. Offloading is off until a store is configured, either
+with configure_store or through the environment:
+
+    FLOWBEE_PAYLOAD_STORE=file:///var/lib/flowbee/payloads
+    FLOWBEE_PAYLOAD_STORE=s3://bucket/prefix
+    FLOWBEE_PAYLOAD_S3_ENDPOINT=http://localhost:9000  (S3 compatible stand-in)
+    FLOWBEE_PAYLOAD_THRESHOLD=16384
+"""
+from __future__ import absolute_import
+import os
+import errno
+import hashlib
+import logging
+import tempfile
+import threading
+import boto3
+from botocore.exceptions import ClientError
+from . import exceptions
+
+log = logging.getLogger(__name__)
+
+REFERENCE_PREFIX = "flowbee:blob:sha256:"
+DEFAULT_THRESHOLD = 16384
+
+STORE_ENVIRON = "FLOWBEE_PAYLOAD_STORE"
+S3_ENDPOINT_ENVIRON = "FLOWBEE_PAYLOAD_S3_ENDPOINT"
+THRESHOLD_ENVIRON = "FLOWBEE_PAYLOAD_THRESHOLD"
+
+_store_lock = threading.Lock()
+_settings = {}
+
+
+class BlobStore(object):
+    """Content addressed storage for encoded payloads
+
+    Keys are hex digests of the data, so writing a key twice always
+    writes the same bytes and stores never need to overwrite.
+    """
+
+    def put(self, key, data):
+        raise NotImplementedError()
+
+    def get(self, key):
+        raise NotImplementedError()
+
+    def exists(self, key):
+        raise NotImplementedError()
+
+
+class FileSystemStore(BlobStore):
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        # fan out so no directory ends up with millions of entries
+        return os.path.join(self.root, key[:2], key)
+
+    def put(self, key, data):
+        path = self.path(key)
+
+        if os.path.exists(path):
+            return
+
+        directory = os.path.dirname(path)
+
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        # write then rename, readers never see a partial payload
+        fd, temporary = tempfile.mkstemp(dir=directory)
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.rename(temporary, path)
+        except Exception:
+            os.unlink(temporary)
+            raise
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+        raise exceptions.PayloadStoreException(
+            "Payload '{0}' not found in '{1}'".format(key, self.root)
+        )
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+
+class S3Store(BlobStore):
+
+    def __init__(self, bucket, prefix="", client=None, endpoint_url=None):
+        """S3 or S3 compatible store
+
+        :param bucket: bucket holding the payloads
+        :param prefix: key prefix of the payloads
+        :param client: boto3 S3 client (default: a new client)
+        :param endpoint_url: endpoint of an S3 compatible service
+        """
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+        if client is None:
+            client = boto3.session.Session().client("s3", endpoint_url=endpoint_url)
+
+        self.client = client
+
+    def key(self, key):
+        if self.prefix:
+            return "{0}/{1}".format(self.prefix, key)
+
+        return key
+
+    def put(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=self.key(key), Body=data)
+
+    def get(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key(key))
+        except ClientError as e:
+            raise exceptions.PayloadStoreException(
+                "Unable to get payload '{0}' from '{1}': {2}".format(
+                    key, self.bucket, exceptions.get_message(e))
+            )
+
+        return response["Body"].read()
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(key))
+        except ClientError:
+            return False
+
+        return True
+
+
+def store_from_url(url, s3_endpoint=None):
+    """Build a store from file:///path, s3://bucket/prefix or a plain path"""
+    if url.startswith("s3://"):
+        bucket, _, prefix = url[len("s3://"):].partition("/")
+        return S3Store(bucket, prefix=prefix, endpoint_url=s3_endpoint)
+
+    if url.startswith("file://"):
+        url = url[len("file://"):]
+
+    return FileSystemStore(url)
+
+
+def configure_store(store=None, threshold=None):
+    """Configure the payload store of this process
+
+    :param store: BlobStore, or url understood by store_from_url,
+                  None falls back to FLOWBEE_PAYLOAD_STORE
+    :param threshold: encoded payloads longer than this many characters
+                      are offloaded (default FLOWBEE_PAYLOAD_THRESHOLD
+                      or 16384)
+    """
+    with _store_lock:
+        _settings.clear()
+
+        if store is not None:
+            if not isinstance(store, BlobStore):
+                store = store_from_url(store)
+            _settings["store"] = store
+
+        if threshold is not None:
+            _settings["threshold"] = threshold
+
+
+def get_store():
+    """The configured BlobStore, or None when offloading is off"""
+    try:
+        return _settings["store"]
+    except KeyError:
+        pass
+
+    with _store_lock:
+        if "store" not in _settings:
+            url = os.getenv(STORE_ENVIRON)
+            _settings["store"] = None
+
+            if url:
+                _settings["store"] = store_from_url(url, os.getenv(S3_ENDPOINT_ENVIRON))
+
+        return _settings["store"]
+
+
+def get_threshold():
+    try:
+        return _settings["threshold"]
+    except KeyError:
+        return int(os.getenv(THRESHOLD_ENVIRON) or DEFAULT_THRESHOLD)
+
+
+def is_reference(value):
+    return value is not None and value.startswith(REFERENCE_PREFIX)
+
+
+def offload(value):
+    """Replace an encoded payload over the threshold with a reference"""
+    store = get_store()
+
+    if store is None or value is None or len(value) <= get_threshold():
+        return value
+
+    data = value.encode("ascii")
+    key = hashlib.sha256(data).hexdigest()
+
+    log.debug("Offloading %s characters payload to '%s'", len(value), key)
+    store.put(key, data)
+
+    return REFERENCE_PREFIX + key
+
+
+def resolve(value):
+    """Encoded payload a reference points to, other values are returned as is"""
+    if not is_reference(value):
+        return value
+
+    store = get_store()
+    key = value[len(REFERENCE_PREFIX):]
+
+    if store is None:
+        raise exceptions.PayloadStoreException(
+            "Payload '{0}' was offloaded but no payload store is configured".format(key)
+        )
+
+    return store.get(key).decode("ascii")
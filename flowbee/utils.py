@@ -1,13 +1,23 @@
 from __future__ import absolute_import
+import os
 import pprint
 import logging
 import importlib
+import threading
+import time
 from itertools import repeat
 import boto3
 from botocore.client import Config
-from botocore.exceptions import ClientError
+from botocore.exceptions import (ClientError, BotoCoreError)
 
+from . import exceptions
+from . import logs
+from . import metrics
+from . import ratelimit
 from .models import TaskMeta
+from .decisions import (  # noqa
+    Decisions, activity_decision, timer_decision, continue_as_new_decision, child_workflow_decision
+)
 
 
 log = logging.getLogger(__name__)
@@ -38,40 +48,208 @@ def import_action(from_name, import_name=None):
         raise
 
 
+# read_timeout must stay above the 60s SWF long poll
+CLIENT_DEFAULTS = {
+    "max_pool_connections": 10,
+    "connect_timeout": 50,
+    "read_timeout": 70,
+    "retry_mode": None,
+    "max_attempts": None,
+    "endpoint_url": None,
+}
+
+CLIENT_ENVIRON = {
+    "max_pool_connections": ("FLOWBEE_SWF_POOL_SIZE", int),
+    "connect_timeout": ("FLOWBEE_SWF_CONNECT_TIMEOUT", int),
+    "read_timeout": ("FLOWBEE_SWF_READ_TIMEOUT", int),
+    "retry_mode": ("FLOWBEE_SWF_RETRY_MODE", str),
+    "max_attempts": ("FLOWBEE_SWF_MAX_ATTEMPTS", int),
+    "endpoint_url": ("FLOWBEE_SWF_ENDPOINT_URL", str),
+}
+
+_client_lock = threading.Lock()
+_client_overrides = {}
+_clients = {}
+_injected = {}
+
+
+def configure_client(**kwargs):
+    """Configure the shared SWF client
+
+    Any value left as None falls back to the matching FLOWBEE_SWF_*
+    environment variable and then to CLIENT_DEFAULTS. Reconfiguring
+    discards the clients built so far, so call this before polling.
+
+    :param max_pool_connections: size of the HTTP connection pool shared
+                                 by every thread using the client
+    :param connect_timeout: seconds to wait for a connection
+    :param read_timeout: seconds to wait for a response, must be longer
+                         than the 60s SWF long poll
+    :param retry_mode: botocore retry mode, legacy|standard|adaptive
+    :param max_attempts: botocore max retry attempts
+    :param endpoint_url: SWF endpoint, e.g. a local flowbee.emulator
+    :returns: None
+    """
+    unknown = set(kwargs) - set(CLIENT_DEFAULTS)
+
+    if unknown:
+        raise TypeError("Unknown client settings: {0}".format(", ".join(sorted(unknown))))
+
+    with _client_lock:
+        _client_overrides.update(
+            (key, value) for key, value in kwargs.items() if value is not None
+        )
+        _clients.clear()
+
+
+def get_client_settings():
+    settings = dict(CLIENT_DEFAULTS)
+
+    for key, (name, cast) in CLIENT_ENVIRON.items():
+        value = os.getenv(name)
+        if value:
+            settings[key] = cast(value)
+
+    settings.update(_client_overrides)
+    return settings
+
+
+def build_client_config(settings):
+    kwargs = {
+        "connect_timeout": settings["connect_timeout"],
+        "read_timeout": settings["read_timeout"],
+        "max_pool_connections": settings["max_pool_connections"],
+    }
+
+    retries = {}
+
+    if settings["retry_mode"]:
+        retries["mode"] = settings["retry_mode"]
+
+    if settings["max_attempts"] is not None:
+        retries["max_attempts"] = settings["max_attempts"]
+
+    if not retries:
+        return Config(**kwargs)
+
+    try:
+        return Config(retries=retries, **kwargs)
+    except TypeError:
+        log.warning(
+            "Installed botocore does not support retry configuration, "
+            "ignoring %s", retries
+        )
+        return Config(**kwargs)
+
+
 def get_client():
-    boto_config = Config(connect_timeout=50, read_timeout=70)
-    swf = boto3.client('swf', config=boto_config)
-    return swf
+    """Return the process wide SWF client
+
+    boto3 clients are thread safe, building them is not cheap: each one
+    loads the botocore service model and opens its own connection pool.
+    Every flowbee component shares a single client per process so HTTP
+    keep-alive connections are reused across polls and responses.
+
+    Clients are keyed by pid so a forked child never reuses the
+    connection pool of its parent. A client injected with set_client
+    takes precedence.
+    """
+    try:
+        return _injected["client"]
+    except KeyError:
+        pass
+
+    pid = os.getpid()
+
+    try:
+        return _clients[pid]
+    except KeyError:
+        pass
+
+    with _client_lock:
+        if pid not in _clients:
+            _clients.clear()
+            settings = get_client_settings()
+            config = build_client_config(settings)
+            # sessions are not thread safe, the client they build is
+            session = boto3.session.Session()
+            _clients[pid] = session.client(
+                'swf', config=config, endpoint_url=settings["endpoint_url"]
+            )
+            log.debug("Created shared SWF client for pid %s", pid)
+
+        return _clients[pid]
+
+
+def set_client(client):
+    """Replace the SWF client returned by get_client
+
+    Anything implementing the boto3 SWF client methods flowbee calls
+    fits, e.g. a flowbee.emulator.SWFEmulator. Pass None to go back to
+    the boto3 client.
+    """
+    with _client_lock:
+        if client is None:
+            _injected.clear()
+        else:
+            _injected["client"] = client
+
+
+def error_code(e):
+    if not isinstance(e, ClientError):
+        # connection errors and the like never reached SWF
+        return e.__class__.__name__
+
+    return e.response.get("Error", {}).get("Code", "Unknown")
+
+
+def request(client, operation, **params):
+    """Call an SWF operation, recording its latency and errors
+
+    Waits for the rate limiter of the operation's family first, see
+    flowbee.ratelimit.
+
+    :param operation: name of the client method, e.g. "poll_for_activity_task"
+    """
+    limiter = ratelimit.get_limiter(operation)
+
+    if limiter is not None:
+        waited = limiter.acquire()
+
+        if waited:
+            metrics.observe("flowbee_rate_limit_wait_seconds", waited, operation=operation)
+
+    started = time.time()
+
+    try:
+        return getattr(client, operation)(**params)
+    except (ClientError, BotoCoreError) as e:
+        metrics.increment("flowbee_swf_errors_total", operation=operation, code=error_code(e))
+        raise
+    finally:
+        metrics.observe("flowbee_swf_request_seconds", time.time() - started, operation=operation)
 
 
 def get_workflow_data(workflow_class):
+    # imported here, flowbee.activities imports this module
+    from .activities.utils import (activity_table, entrypoint_table)
+
     domain = workflow_class.domain
     tasklist = workflow_class.tasklist
-    workflow_type_versions = []
-    activities = []
     # workflow_class.name is set with @workflow() from activities.utils
     workflow_type_name = "{0}.{1}".format(
         workflow_class.name, workflow_class.activities.name
     )
 
     # get the entrypoint versions for our workflow types
-    for name, method in workflow_class.__dict__.iteritems():
-        if not hasattr(method, "is_entrypoint"):
-            continue
-
-        workflow_type_versions.append(method.version)
-
-    for name, method in workflow_class.activities.__class__.__dict__.iteritems():
-        if not hasattr(method, "is_activity"):
-            continue
-
-        activities.append((method.swf_name, method.swf_version))
+    workflow_type_versions = sorted(entrypoint_table(workflow_class))
+    activities = sorted(activity_table(workflow_class.activities.__class__))
 
     # namedtuple might be better here
     return {
         "domain": domain,
         "tasklist": tasklist,
-        "workflows": zip(repeat(workflow_type_name), workflow_type_versions),
+        "workflows": list(zip(repeat(workflow_type_name), workflow_type_versions)),
         "activities": activities
     }
 
@@ -97,7 +275,8 @@ def create_resources(workflow_class):
 def create_domain(client, domain, description="", retention_period=1):
     log.debug("Creating SWF Domain: '%s'", domain)
     try:
-        client.register_domain(
+        request(
+            client, "register_domain",
             name=domain,
             description=description,
             workflowExecutionRetentionPeriodInDays=str(retention_period)
@@ -114,7 +293,8 @@ def create_workflow(client, domain, workflow, version, tasklist, description="",
     )
 
     try:
-        client.register_workflow_type(
+        request(
+            client, "register_workflow_type",
             domain=domain,
             name=workflow,
             version=version,
@@ -135,7 +315,8 @@ def create_activity(client, domain, activity, version, tasklist, description="")
         activity, version, domain, tasklist
     )
     try:
-        client.register_activity_type(
+        request(
+            client, "register_activity_type",
             domain=domain,
             name=activity,
             version=version,
@@ -149,22 +330,9 @@ def create_activity(client, domain, activity, version, tasklist, description="")
 
 
 def schedule_later(client, task_token, seconds, timer_id, payload=None):
-
-    decision = {
-        "timerId": timer_id,
-        "startToFireTimeout": str(seconds)
-    }
-
-    if payload is not None:
-        decision["control"] = payload
-
-    client.respond_decision_task_completed(
-        taskToken=task_token,
-        decisions=[{
-            "decisionType": "StartTimer",
-            "startTimerDecisionAttributes": decision
-        }]
-    )
+    decisions = Decisions()
+    decisions.start_timer(seconds, timer_id, payload=payload)
+    decisions.flush(client, task_token)
 
 
 def schedule_activity(
@@ -172,28 +340,21 @@ def schedule_activity(
         tasklist, payload="", close_timeout="NONE", start_timeout="10",
         timeout="10", heartbeat_timeout="NONE", priority=0, attempt=0):
 
-    client.respond_decision_task_completed(
-        taskToken=task_token,
-        decisions=[{
-            "decisionType": "ScheduleActivityTask",
-            "scheduleActivityTaskDecisionAttributes": {
-                "activityId": "{0}-{1}".format(activity_id, attempt),
-                "input": payload,
-                "taskPriority": str(priority),
-                "scheduleToCloseTimeout": timeout,  # maximum duration for this task
-                "scheduleToStartTimeout": start_timeout,  # maximum duration the task can wait to be assigned to a worker
-                "startToCloseTimeout": close_timeout,  # maximum duration a worker may take to process this task
-                "heartbeatTimeout": heartbeat_timeout,  # maximum time before which a worker processing a task of this type must report progress
-                "activityType": {
-                    "name": name,
-                    "version": version
-                },
-                "taskList": {
-                    "name": tasklist
-                },
-            }
-        }]
+    decisions = Decisions()
+    decisions.schedule_activity(
+        name=name,
+        version=version,
+        activity_id=activity_id,
+        tasklist=tasklist,
+        payload=payload,
+        close_timeout=close_timeout,
+        start_timeout=start_timeout,
+        timeout=timeout,
+        heartbeat_timeout=heartbeat_timeout,
+        priority=priority,
+        attempt=attempt
     )
+    decisions.flush(client, task_token)
 
 
 def schedule_activity_later(client, task_token, payload, timer_id):
@@ -209,79 +370,127 @@ def schedule_activity_later(client, task_token, payload, timer_id):
 
 
 def cancel_workflow(client, task_token, reason=""):
-    client.respond_decision_task_completed(
-        taskToken=task_token,
-        decisions=[{
-            "decisionType": "CancelWorkflowExecution",
-            "cancelWorkflowExecutionDecisionAttributes": {
-                "details": reason
-            }
-        }]
-    )
+    decisions = Decisions()
+    decisions.cancel_workflow(reason=reason)
+    decisions.flush(client, task_token)
 
 
 def complete_activity(client, task_token, result=None):
-    client.respond_activity_task_completed(
+    request(
+        client, "respond_activity_task_completed",
         taskToken=task_token,
         result=result
     )
 
 
 def fail_activity(client, task_token, reason, details=""):
-    client.respond_activity_task_failed(
+    request(
+        client, "respond_activity_task_failed",
         taskToken=task_token,
         reason=reason,
         details=details
     )
 
 
-def fail_workflow(client, task_token, reason, details=""):
-    client.respond_decision_task_completed(
+def cancel_activity(client, task_token, details=""):
+    request(
+        client, "respond_activity_task_canceled",
         taskToken=task_token,
-        decisions=[{
-            "decisionType": "FailWorkflowExecution",
-            "failWorkflowExecutionDecisionAttributes": {
-                "reason": reason,
-                "details": details
-            }
-        }]
+        details=details
     )
 
 
+def record_activity_heartbeat(client, task_token, details=None):
+    """Report that an activity is still alive
+
+    :returns: True when cancellation of the activity has been requested
+    """
+    params = {"taskToken": task_token}
+
+    if details is not None:
+        # SWF rejects details longer than 2048 characters
+        params["details"] = details[:2048]
+
+    response = request(client, "record_activity_task_heartbeat", **params)
+    return response.get("cancelRequested", False)
+
+
+def fail_workflow(client, task_token, reason, details=""):
+    decisions = Decisions()
+    decisions.fail_workflow(reason, details=details)
+    decisions.flush(client, task_token)
+
+
 def complete_workflow(client, task_token, result="success"):
-    client.respond_decision_task_completed(
-        taskToken=task_token,
-        decisions=[{
-            "decisionType": "CompleteWorkflowExecution",
-            "completeWorkflowExecutionDecisionAttributes": {
-                "result": result
-            }
-        }]
-    )
+    decisions = Decisions()
+    decisions.complete_workflow(result=result)
+    decisions.flush(client, task_token)
+
+
+def continue_as_new(client, task_token, input=None, **options):
+    """Answer a decision task by starting a new run of the execution
+
+    :param input: encoded input of the new run
+    :param options: see decisions.continue_as_new_decision
+    """
+    decisions = Decisions()
+    decisions.continue_as_new(input=input, **options)
+    decisions.flush(client, task_token)
+
+
+def count_poll(task_type, tasklist, result):
+    """Count a poll by result, task|empty|error"""
+    metrics.increment("flowbee_polls_total", type=task_type, tasklist=tasklist, result=result)
 
 
-def poll_for_decision_task(client, domain, identity, tasklist, next_page_token=None):
+def poll_for_decision_task(client, domain, identity, tasklist, next_page_token=None, reverse_order=False,
+                           backoff=None, maximum_page_size=None):
+    """Long poll for a decision task or fetch one of its pages
+
+    :param backoff: polling.Backoff to wait on before returning after
+                    an error, without it errors return straight away
+    :param maximum_page_size: events per page, up to 1000 (default: SWF's)
+    :returns: the task or None if there was none or the poll failed
+    """
     params = {
         "domain": domain,
         "taskList": {"name": tasklist},
         "identity": identity,
-        "reverseOrder": False
+        "reverseOrder": reverse_order
     }
 
     if next_page_token:
         params["nextPageToken"] = next_page_token
 
+    if maximum_page_size:
+        params["maximumPageSize"] = maximum_page_size
+
     try:
-        task = client.poll_for_decision_task(**params)
-    except ClientError as e:
-        log.error(e.message)
+        task = request(client, "poll_for_decision_task", **params)
+    except (ClientError, BotoCoreError) as e:
+        log.error(exceptions.get_message(e))
+        count_poll("decision", tasklist, "error")
+
+        if backoff is not None:
+            backoff.failed(e, "poll_for_decision_task")
+
         return None
 
-    log.debug("Received new decision task: \n%s", pprint.pformat(task))
+    if backoff is not None:
+        backoff.succeeded()
+
+    log.debug(
+        "Received new decision task: \n%s", logs.lazy(pprint.pformat, task),
+        extra=logs.fields(events=len(task.get("events", ())), started_event_id=task.get("startedEventId"))
+    )
     if "taskToken" not in task:
         log.debug("Poll timed out, no new task.")
+        count_poll("decision", tasklist, "empty")
         return None
 
+    if next_page_token is None:
+        count_poll("decision", tasklist, "task")
+
     if "events" not in task:
         log.info("No events found in new task")
         return None
@@ -289,7 +498,50 @@ def poll_for_decision_task(client, domain, identity, tasklist, next_page_token=N
     return task
 
 
-def poll_for_activity_task(client, domain, identity, tasklist):
+def get_workflow_execution_history(client, domain, workflow_id, run_id, next_page_token=None,
+                                   reverse_order=False, backoff=None, maximum_page_size=None):
+    """Fetch a page of the history of a workflow execution
+
+    :param backoff: polling.Backoff to wait on before returning after
+                    an error, without it errors return straight away
+    :param maximum_page_size: events per page, up to 1000 (default: SWF's)
+    :returns: the page or None if the request failed
+    """
+    params = {
+        "domain": domain,
+        "execution": {"workflowId": workflow_id, "runId": run_id},
+        "reverseOrder": reverse_order
+    }
+
+    if next_page_token:
+        params["nextPageToken"] = next_page_token
+
+    if maximum_page_size:
+        params["maximumPageSize"] = maximum_page_size
+
+    try:
+        page = request(client, "get_workflow_execution_history", **params)
+    except (ClientError, BotoCoreError) as e:
+        log.error("Failed to fetch history of '%s': %s", workflow_id, exceptions.get_message(e))
+
+        if backoff is not None:
+            backoff.failed(e, "get_workflow_execution_history")
+
+        return None
+
+    if backoff is not None:
+        backoff.succeeded()
+
+    return page
+
+
+def poll_for_activity_task(client, domain, identity, tasklist, backoff=None):
+    """Long poll for an activity task
+
+    :param backoff: polling.Backoff to wait on before returning after
+                    an error, without it errors return straight away
+    :returns: the task or None if there was none or the poll failed
+    """
     params = {
         "domain": domain,
         "taskList": {"name": tasklist},
@@ -297,18 +549,28 @@ def poll_for_activity_task(client, domain, identity, tasklist):
     }
 
     try:
-        task = client.poll_for_activity_task(**params)
-    except ClientError as e:
-        print("WORKER FAILURE")
-        log.error(e.message)
+        task = request(client, "poll_for_activity_task", **params)
+    except (ClientError, BotoCoreError) as e:
+        log.error("Failed to poll for activity task: %s", exceptions.get_message(e))
+        count_poll("activity", tasklist, "error")
+
+        if backoff is not None:
+            backoff.failed(e, "poll_for_activity_task")
+
         return None
 
-    log.debug("Received new activity task: \n%s", pprint.pformat(task))
+    if backoff is not None:
+        backoff.succeeded()
+
+    log.debug("Received new activity task: \n%s", logs.lazy(pprint.pformat, task))
 
     if "taskToken" not in task:
         log.debug("Poll timed out, no new task.")
+        count_poll("activity", tasklist, "empty")
         return None
 
+    count_poll("activity", tasklist, "task")
+
     return task
 
 
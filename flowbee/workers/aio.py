@@ -0,0 +1,156 @@
+"""asyncio Worker runtime
+
+Requires Python 3.7+. `async def` activities run on the event loop so
+thousands of them can be in flight in a single process, synchronous
+activities and the blocking boto3 calls run on a thread pool.
+"""
+import asyncio
+import functools
+import logging
+from concurrent import futures
+from .base import Worker
+from . import heartbeat as heartbeats
+from .. import compat
+from .. import exceptions
+
+log = logging.getLogger(__name__)
+
+
+class AsyncWorker(Worker):
+
+    def __init__(self, workflow, concurrency=1000, pollers=None, threads=None,
+                 executor="thread", processes=None, adaptive_pollers=True):
+        """asyncio activity worker
+
+        :param workflow: the workflow instance whose activities to run
+        :param concurrency: maximum number of activities in flight (default 1000)
+        :param pollers: number of concurrent long polls (default min(concurrency, 4))
+        :param threads: size of the thread pool running blocking SWF calls
+                        and synchronous activities
+                        (default pollers + min(concurrency, 32))
+        :param executor: where synchronous activities without an explicit
+                         @activity(executor=...) run, "thread" or "process"
+        :param processes: size of the process pool (default: number of cores)
+        :param adaptive_pollers: run between 1 and `pollers` long polls
+                                 depending on how many come back empty
+        """
+        super(AsyncWorker, self).__init__(
+            workflow,
+            concurrency=concurrency,
+            pollers=pollers,
+            executor=executor,
+            processes=processes,
+            adaptive_pollers=adaptive_pollers
+        )
+        self.threads = threads or self.pollers + min(self.concurrency, 32)
+        self.thread_pool = None
+        self.handlers = set()
+
+    def poll(self):
+        self.start_process_pool()
+
+        try:
+            asyncio.run(self.run())
+        finally:
+            self.stop_process_pool()
+
+    async def run(self):
+        self.thread_pool = futures.ThreadPoolExecutor(max_workers=self.threads)
+        capacity = asyncio.Semaphore(self.concurrency)
+        self.scaler = self.build_scaler()
+
+        log.info(
+            "Running up to %s activities with %s pollers on asyncio",
+            self.concurrency, self.pollers
+        )
+
+        try:
+            await asyncio.gather(*[
+                self.run_poller(capacity, index) for index in range(self.pollers)
+            ])
+        finally:
+            # let the activities in flight report back before the
+            # thread pool goes away
+            if self.handlers:
+                await asyncio.gather(*self.handlers, return_exceptions=True)
+
+            self.thread_pool.shutdown(wait=False)
+
+    async def call(self, func, *args, **kwargs):
+        """Run a blocking call on the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.thread_pool, functools.partial(func, *args, **kwargs)
+        )
+
+    async def run_poller(self, capacity, index=0):
+        while True:
+            while self.scaler is not None and not self.scaler.is_active(index):
+                await asyncio.sleep(1)
+
+            await capacity.acquire()
+
+            try:
+                task = await self.call(
+                    self.poll_for_task,
+                    domain=self.workflow.domain,
+                    identity=self.workflow.name,
+                    tasklist=self.workflow.tasklist
+                )
+            except Exception as e:
+                log.exception(e)
+                task = None
+
+            if self.scaler is not None:
+                self.scaler.record(task is not None)
+
+            if task is None:
+                capacity.release()
+                continue
+
+            handler = asyncio.ensure_future(self.handle_task_async(task))
+            self.handlers.add(handler)
+            handler.add_done_callback(functools.partial(self.task_done, capacity))
+
+    def task_done(self, capacity, handler):
+        capacity.release()
+        self.handlers.discard(handler)
+
+        if not handler.cancelled() and handler.exception() is not None:
+            log.error("Failed to handle activity task: %s", handler.exception())
+
+    async def handle_task_async(self, task):
+        prepared = await self.call(self.prepare_task, task)
+
+        if prepared is None:
+            return
+
+        meta, activity, action = prepared
+        args = activity.payload["args"]
+        kwargs = activity.payload["kwargs"]
+        heartbeat = self.start_heartbeat(meta, action)
+
+        try:
+            if self.get_executor(action) == "process":
+                result = await asyncio.wrap_future(self.submit_to_process(activity))
+            elif getattr(action, "is_coroutine", False):
+                with heartbeats.activate(heartbeat):
+                    result = await action(*args, **kwargs)
+            else:
+                result = await self.call(heartbeats.run, heartbeat, action, *args, **kwargs)
+
+                if compat.iscoroutine(result):
+                    with heartbeats.activate(heartbeat):
+                        result = await result
+        except exceptions.ActivityCancelledException as e:
+            await self.call(self.cancel_task, meta, e, activity)
+            return
+        except Exception as e:
+            await self.call(self.fail_task, meta, e, activity)
+            return
+        finally:
+            if heartbeat is not None:
+                # joins the heartbeat thread, at most one SWF call away
+                await self.call(heartbeat.stop)
+
+        await self.call(self.complete_task, meta, activity, result)
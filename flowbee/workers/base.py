@@ -1,20 +1,99 @@
 from __future__ import absolute_import
+import time
+import zlib
+import binascii
 import logging
+import multiprocessing
+import threading
+from concurrent import futures
+import six
+from botocore.exceptions import BotoCoreError
 from . import events
+from . import heartbeat as heartbeats
+from .utils import (find_activity, run_in_process, workflow_path)
+from ..activities.utils import (payload_serializer, activity_table)
 from .. import utils
+from .. import compat
 from .. import exceptions
+from .. import metrics
+from .. import polling
 
 log = logging.getLogger(__name__)
 
+# raised while fetching an offloaded input and decoding it
+DECODE_ERRORS = (
+    exceptions.PayloadStoreException, BotoCoreError, ValueError, TypeError, binascii.Error, zlib.error
+)
+
 
 class Worker(object):
 
-    def __init__(self, workflow):
+    def __init__(self, workflow, concurrency=1, pollers=None, executor="thread", processes=None,
+                 adaptive_pollers=True):
+        """Activity worker
+
+        :param workflow: the workflow instance whose activities to run
+        :param concurrency: number of activities executed at the same
+                            time on a bounded thread pool (default 1,
+                            activities run inline in the polling thread)
+        :param pollers: number of threads long polling for activity
+                        tasks when concurrency > 1 (default min(concurrency, 4))
+        :param executor: where activities without an explicit
+                         @activity(executor=...) run, "thread" or "process"
+        :param processes: size of the process pool (default: number of cores)
+        :param adaptive_pollers: run between 1 and `pollers` long polls
+                                 depending on how many come back empty
+        """
         self.workflow = workflow
         self.meta = None
         self.client = utils.get_client()
+        self.concurrency = max(1, concurrency)
+        self.pollers = pollers or min(self.concurrency, 4)
+        self.executor = executor
+        self.processes = processes or multiprocessing.cpu_count()
+        self.process_pool = None
+        self.adaptive_pollers = adaptive_pollers
+        self.backoff = polling.Backoff()
+        self.scaler = None
+
+    def uses_processes(self):
+        if self.executor == "process":
+            return True
+
+        return any(
+            getattr(method, "swf_executor", None) == "process"
+            for method in six.itervalues(activity_table(self.workflow.activities.__class__))
+        )
+
+    def start_process_pool(self):
+        """Start the pool for process activities, once per worker
+
+        The pool lives as long as the worker so its children only pay
+        for importing the workflow once.
+        """
+        if self.process_pool is None and self.uses_processes():
+            log.info("Running process activities on %s processes", self.processes)
+            self.process_pool = compat.process_pool_executor(max_workers=self.processes)
+
+        return self.process_pool
+
+    def stop_process_pool(self):
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=True)
+            self.process_pool = None
 
     def poll(self):
+        self.start_process_pool()
+
+        try:
+            if self.concurrency > 1:
+                return self.poll_concurrently()
+
+            self.poll_inline()
+        finally:
+            self.stop_process_pool()
+
+    def poll_inline(self):
         while True:
             task = self.poll_for_task(
                 domain=self.workflow.domain,
@@ -25,59 +104,242 @@ class Worker(object):
             if task is None:
                 continue
 
-            meta = utils.get_task_meta(task, self.workflow.domain, self.workflow.tasklist)
-            client = self.client
+            self.handle_task(task)
 
-            log.debug("Received new task %s", task)
+    def poll_concurrently(self):
+        """Feed a bounded thread pool from several pollers
 
-            try:
-                activity = events.Activity(meta, task)
-            except exceptions.EventException as e:
-                log.error(e.message)
-                utils.fail_activity(client=client, task_token=meta.task_token, reason=e.message)
-                continue
+        A poller only asks SWF for a task once there is a free slot in
+        the pool, so tasks are never accepted before they can start.
+        The executing thread responds to SWF itself.
+        """
+        executor = futures.ThreadPoolExecutor(max_workers=self.concurrency)
+        capacity = threading.BoundedSemaphore(self.concurrency)
+        self.scaler = self.build_scaler()
+        threads = []
 
-            try:
-                action = self.find_activity_in_workflow(activity)
-            except NameError as e:
-                log.error(e)
-                utils.fail_activity(client=client, task_token=meta.task_token, reason=e.message)
+        log.info(
+            "Running up to %s activities with %s pollers",
+            self.concurrency, self.pollers
+        )
+
+        for index in range(self.pollers):
+            thread = threading.Thread(
+                target=self.run_poller,
+                args=(executor, capacity, index),
+                name="flowbee-poller-{0}".format(index)
+            )
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                # join with a timeout so KeyboardInterrupt is delivered
+                for thread in threads:
+                    thread.join(1)
+        finally:
+            executor.shutdown(wait=False)
+
+    def build_scaler(self):
+        if not self.adaptive_pollers or self.pollers < 2:
+            return None
+
+        return polling.PollerScaler(self.pollers)
+
+    def run_poller(self, executor, capacity, index=0):
+        def release(future):
+            capacity.release()
+
+            if future.exception() is not None:
+                log.error("Failed to handle activity task: %s", future.exception())
+
+        while True:
+            if self.scaler is not None:
+                self.scaler.wait_turn(index)
+
+            capacity.acquire()
 
             try:
-                result = action(*activity.payload["args"], **activity.payload["kwargs"])
+                task = self.poll_for_task(
+                    domain=self.workflow.domain,
+                    identity=self.workflow.name,
+                    tasklist=self.workflow.tasklist
+                )
             except Exception as e:
                 log.exception(e)
-                utils.fail_activity(client=client, task_token=meta.task_token, reason=e.message)
+                task = None
+
+            if self.scaler is not None:
+                self.scaler.record(task is not None)
+
+            if task is None:
+                capacity.release()
                 continue
 
-            z_result = activity.serialize(result)
+            future = executor.submit(self.handle_task, task)
+            future.add_done_callback(release)
 
-            try:
-                utils.complete_activity(
-                    client=client,
-                    task_token=meta.task_token,
-                    result=z_result
+    def handle_task(self, task):
+        prepared = self.prepare_task(task)
+
+        if prepared is None:
+            return
+
+        meta, activity, action = prepared
+        heartbeat = self.start_heartbeat(meta, action)
+
+        try:
+            if self.get_executor(action) == "process":
+                result = self.submit_to_process(activity).result()
+            else:
+                result = heartbeats.run(
+                    heartbeat, action,
+                    *activity.payload["args"], **activity.payload["kwargs"]
                 )
-            except Exception as e:
-                log.error("Unable to notify SWF of activity completion: %s", e.message)
 
-    def find_activity_in_workflow(self, activity):
-        activities = self.workflow.activities
+            if compat.iscoroutine(result):
+                # async def activity outside of the asyncio runtime
+                result = heartbeats.run(heartbeat, compat.run_coroutine, result)
+        except exceptions.ActivityCancelledException as e:
+            self.cancel_task(meta, e, activity)
+            return
+        except Exception as e:
+            self.fail_task(meta, e, activity)
+            return
+        finally:
+            if heartbeat is not None:
+                heartbeat.stop()
 
-        for name, method in activities.__class__.__dict__.iteritems():
-            if not hasattr(method, "is_activity"):
-                continue
+        self.complete_task(meta, activity, result)
+
+    def start_heartbeat(self, meta, action):
+        """Start heartbeating for activities with a heartbeat_timeout
+
+        :returns: the running Heartbeat or None
+        """
+        timeout = getattr(action, "swf_heartbeat_timeout", None)
+
+        if timeout is None:
+            return None
+
+        return heartbeats.Heartbeat(self.client, meta.task_token, timeout).start()
+
+    def get_executor(self, action):
+        return getattr(action, "swf_executor", None) or self.executor
+
+    def submit_to_process(self, activity):
+        """Run activity on the process pool
 
-            if method.swf_name == activity.name and \
-               method.swf_version == activity.version:
-                return getattr(activities, name)
+        :returns: a concurrent.futures.Future of the activity's result
+        """
+        if self.process_pool is None:
+            # handle_task called without poll(), start the pool on demand
+            self.process_pool = compat.process_pool_executor(max_workers=self.processes)
 
-        qualname = "{0}.{1}".format(activities.__module__, activities.__class__.__name__)
-        raise NameError(
-            "Unable to find method for '{0}@{1}' on {3}".format(
-                activity.name, activity.version, qualname)
+        return self.process_pool.submit(
+            run_in_process,
+            workflow_path(self.workflow),
+            activity.name,
+            activity.version,
+            activity.payload["args"],
+            activity.payload["kwargs"]
         )
 
+    def prepare_task(self, task):
+        """Find the activity to run for task
+
+        :returns: (meta, activity, action) or None if the task has been
+                  failed because it could not be prepared
+        """
+        meta = utils.get_task_meta(task, self.workflow.domain, self.workflow.tasklist)
+        client = self.client
+
+        log.debug("Received new task %s", task)
+
+        try:
+            activity = events.Activity(meta, task)
+        except exceptions.EventException as e:
+            log.error(e.message)
+            utils.fail_activity(client=client, task_token=meta.task_token, reason=e.message)
+            return None
+        except DECODE_ERRORS as e:
+            # an offloaded input that can't be fetched or a corrupt
+            # payload, the task would otherwise sit until it times out
+            log.error("Unable to decode the input of task '%s': %s", meta.task_token, exceptions.get_message(e))
+            utils.fail_activity(
+                client=client,
+                task_token=meta.task_token,
+                reason="Unable to decode activity input",
+                details=exceptions.get_message(e)
+            )
+            return None
+
+        try:
+            action = self.find_activity_in_workflow(activity)
+        except NameError as e:
+            log.error(e)
+            utils.fail_activity(client=client, task_token=meta.task_token, reason=exceptions.get_message(e))
+            return None
+
+        activity.serializer = payload_serializer(action, self.workflow)
+        activity.started = time.time()
+        self.observe_payload(activity, "input", task.get("input"))
+
+        return meta, activity, action
+
+    def observe_activity(self, activity, outcome):
+        """Record how long activity ran, outcome is completed|failed|cancelled"""
+        if activity is None:
+            return
+
+        metrics.observe(
+            "flowbee_activity_seconds", time.time() - activity.started,
+            workflow=self.workflow.name, activity=activity.name,
+            version=activity.version, outcome=outcome
+        )
+
+    def observe_payload(self, activity, direction, payload):
+        metrics.observe(
+            "flowbee_payload_bytes", len(payload or ""), buckets=metrics.SIZE_BUCKETS,
+            activity=activity.name, version=activity.version, direction=direction
+        )
+
+    def fail_task(self, meta, e, activity=None):
+        self.observe_activity(activity, "failed")
+        log.exception(e)
+        utils.fail_activity(client=self.client, task_token=meta.task_token, reason=exceptions.get_message(e))
+
+    def cancel_task(self, meta, e, activity=None):
+        self.observe_activity(activity, "cancelled")
+        log.info("Activity cancelled: %s", exceptions.get_message(e))
+
+        try:
+            utils.cancel_activity(
+                client=self.client,
+                task_token=meta.task_token,
+                details=exceptions.get_message(e)
+            )
+        except Exception as e:
+            log.error("Unable to notify SWF of activity cancellation: %s", exceptions.get_message(e))
+
+    def complete_task(self, meta, activity, result):
+        z_result = activity.serialize(result)
+        self.observe_activity(activity, "completed")
+        self.observe_payload(activity, "result", z_result)
+
+        try:
+            utils.complete_activity(
+                client=self.client,
+                task_token=meta.task_token,
+                result=z_result
+            )
+        except Exception as e:
+            log.error("Unable to notify SWF of activity completion: %s", exceptions.get_message(e))
+
+    def find_activity_in_workflow(self, activity):
+        return find_activity(self.workflow.activities, activity.name, activity.version)
+
     def poll_for_task(self, domain, identity, tasklist):
         client = self.client
 
@@ -87,10 +349,8 @@ class Worker(object):
             client=client,
             domain=domain,
             identity=identity,
-            tasklist=tasklist
+            tasklist=tasklist,
+            backoff=self.backoff
         )
 
-        if task is None:
-            return task
-
         return task
@@ -14,6 +14,10 @@ class WorkerEvent(object):
         self.meta = meta
         self.event = event
         self.payload = None
+        # name of the serializer for the result, see flowbee.serializers
+        self.serializer = None
+        # time the worker started handling the task
+        self.started = None
 
         self.prepare_event()
 
@@ -24,7 +28,7 @@ class WorkerEvent(object):
         return compression.decompress_b64_json(data)
 
     def serialize(self, data):
-        return compression.compress_b64_json(data)
+        return compression.compress_b64_json(data, serializer=self.serializer)
 
 
 class Activity(WorkerEvent):
@@ -43,7 +47,7 @@ class Activity(WorkerEvent):
             self.name = self.event["activityType"]["name"]
             self.version = self.event["activityType"]["version"]
         except KeyError as e:
-            message = "Unable to find '{0}' in task {1}".format(e.message, task)
+            message = "Unable to find '{0}' in task {1}".format(e.args[0], self.event)
             log.error(message)
             raise exceptions.EventException(message)
 
@@ -0,0 +1,133 @@
+"""Background heartbeats for running activities
+
+Activities declared with @activity(heartbeat_timeout=...) get a
+Heartbeat thread for as long as they run. It reports them alive to SWF
+well within their heartbeat timeout, so a crashed worker is detected
+in seconds, and picks up cancellation requests for the activity.
+"""
+from __future__ import absolute_import
+import logging
+import threading
+from contextlib import contextmanager
+from botocore.exceptions import (ClientError, BotoCoreError)
+from .. import utils
+from .. import exceptions
+
+log = logging.getLogger(__name__)
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+
+class Heartbeat(object):
+
+    def __init__(self, client, task_token, timeout):
+        """Heartbeat of a single activity task
+
+        :param client: SWF client
+        :param task_token: token of the activity task
+        :param timeout: heartbeat timeout of the activity in seconds,
+                        heartbeats are sent three times per timeout
+        """
+        self.client = client
+        self.task_token = task_token
+        self.interval = max(1.0, float(timeout) / 3)
+        self.details = None
+        self.cancel_requested = False
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="flowbee-heartbeat")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.beat()
+
+    def beat(self):
+        try:
+            cancel_requested = utils.record_activity_heartbeat(
+                self.client, self.task_token, details=self.details
+            )
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+
+            if code == "UnknownResourceFault":
+                # the task timed out or was closed, nobody is waiting
+                # for the result anymore
+                log.warning("Activity task is gone, stopping: %s", exceptions.get_message(e))
+                self.cancel_requested = True
+                self.stopped.set()
+            else:
+                log.error("Unable to record heartbeat: %s", exceptions.get_message(e))
+
+            return
+        except BotoCoreError as e:
+            # connection errors never reached SWF, the next beat may
+            log.error("Unable to record heartbeat: %s", exceptions.get_message(e))
+            return
+
+        if cancel_requested and not self.cancel_requested:
+            log.info("Cancellation requested for activity task")
+            self.cancel_requested = True
+
+    def report(self, details=None):
+        """Record progress, sent with the next heartbeat
+
+        :raises ActivityCancelledException: once cancellation has been requested
+        """
+        if details is not None:
+            self.details = str(details)
+
+        if self.cancel_requested:
+            raise exceptions.ActivityCancelledException("Cancellation requested")
+
+
+# the heartbeat of the activity running in the current thread or,
+# on Python 3, the current asyncio task
+if contextvars is not None:
+    _current = contextvars.ContextVar("flowbee_heartbeat", default=None)
+
+    def current():
+        return _current.get()
+
+    @contextmanager
+    def activate(heartbeat):
+        token = _current.set(heartbeat)
+
+        try:
+            yield heartbeat
+        finally:
+            _current.reset(token)
+else:
+    _local = threading.local()
+
+    def current():
+        return getattr(_local, "heartbeat", None)
+
+    @contextmanager
+    def activate(heartbeat):
+        previous = current()
+        _local.heartbeat = heartbeat
+
+        try:
+            yield heartbeat
+        finally:
+            _local.heartbeat = previous
+
+
+def run(heartbeat, func, *args, **kwargs):
+    """Call func with heartbeat as the current heartbeat"""
+    with activate(heartbeat):
+        return func(*args, **kwargs)
@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+import logging
+from .. import utils
+from .. import compat
+from ..activities.utils import activity_table
+
+log = logging.getLogger(__name__)
+
+# workflow classes imported by the current process, see run_in_process
+_workflows = {}
+
+
+def find_activity(activities, name, version):
+    """Find the @activity method registered as name@version
+
+    :returns: the bound activity method
+    :raises NameError: when activities has no such activity
+    """
+    cls = activities.__class__
+
+    try:
+        method = activity_table(cls)[(name, version)]
+    except KeyError:
+        qualname = "{0}.{1}".format(activities.__module__, cls.__name__)
+        raise NameError(
+            "Unable to find method for '{0}@{1}' on {2}".format(
+                name, version, qualname)
+        )
+
+    return method.__get__(activities, cls)
+
+
+def workflow_path(workflow):
+    return "{0}.{1}".format(workflow.__class__.__module__, workflow.__class__.__name__)
+
+
+def run_in_process(path, name, version, args, kwargs):
+    """Run an activity inside a process pool child
+
+    Only the activity's arguments and result cross the process
+    boundary, the child imports the workflow by its qualified name
+    once and the parent keeps polling and responding to SWF.
+    """
+    workflow = _workflows.get(path)
+
+    if workflow is None:
+        workflow = utils.import_class(path)
+        _workflows[path] = workflow
+
+    action = find_activity(workflow.activities, name, version)
+    result = action(*args, **kwargs)
+
+    if compat.iscoroutine(result):
+        result = compat.run_coroutine(result)
+
+    return result
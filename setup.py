@@ -34,7 +34,7 @@ setup(
     long_description=readme + '\n\n' + history,
     author='Adam Venturella <aventurella@blitzagency.com>',
     author_email='aventurella@blitzagency.com',
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
     package_dir={'flowbee': 'flowbee'},
     include_package_data=True,
     install_requires=install_requires,
@@ -53,6 +53,8 @@ setup(
         'Natural Language :: English',
         'Programming Language :: Python :: 2',
         'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7'
+        'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.7'
     ]
 )
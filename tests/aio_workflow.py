@@ -0,0 +1,40 @@
+"""Workflow with async activities for test_aio, Python 3.7+ only"""
+import asyncio
+import os
+from flowbee.activities import (Activities, Workflow)
+from flowbee.activities.utils import (activity, workflow)
+
+
+class AsyncActivities(Activities):
+    running = 0
+    peak = 0
+
+    @activity(version="0.0.1")
+    async def add(self, a, b):
+        await asyncio.sleep(0)
+        return a + b
+
+    @activity(version="0.0.1")
+    def multiply(self, a, b):
+        return a * b
+
+    @activity(version="0.0.1", executor="process")
+    def pid(self):
+        return os.getpid()
+
+    @activity(version="0.0.1")
+    async def slow(self):
+        cls = self.__class__
+        cls.running += 1
+        cls.peak = max(cls.peak, cls.running)
+        await asyncio.sleep(0.05)
+        cls.running -= 1
+
+    @activity(version="0.0.1")
+    async def broken(self):
+        raise ValueError("broken")
+
+
+@workflow(domain="flowbee-test", tasklist="flowbee-test-tasks")
+class AsyncWorkflow(Workflow):
+    activities = AsyncActivities()
@@ -0,0 +1,153 @@
+"""Raw SWF history events for tests"""
+from flowbee.models import TaskMeta
+from flowbee import compression
+
+
+META = TaskMeta(
+    task_token="token", run_id="run", workflow_id="workflow",
+    domain="flowbee-test", tasklist="flowbee-test-tasks"
+)
+
+
+def scheduled(event_id, activity_id):
+    return {
+        "eventId": event_id,
+        "eventType": "ActivityTaskScheduled",
+        "activityTaskScheduledEventAttributes": {
+            "activityId": activity_id,
+            "input": "H4sIADxu91YC/6tWSixKL1ayUohWyilNrlSK1VFQyi6HilUrpeXng+lEIKmUpKQDIqwUDGtrawHg8m1aOQAAAA==",
+            "activityType": {"name": "stage1", "version": "0.0.1"},
+            "taskList": {"name": "flowbee-test-tasks"},
+            "taskPriority": "0",
+        }
+    }
+
+
+def timer_started(event_id, timer_id):
+    return {
+        "eventId": event_id,
+        "eventType": "TimerStarted",
+        "timerStartedEventAttributes": {
+            "timerId": timer_id,
+            "startToFireTimeout": "5",
+        }
+    }
+
+
+def timer_fired(event_id, timer_id, started_event_id):
+    return {
+        "eventId": event_id,
+        "eventType": "TimerFired",
+        "timerFiredEventAttributes": {
+            "timerId": timer_id,
+            "startedEventId": started_event_id,
+        }
+    }
+
+
+def timed_out(event_id, scheduled_event_id):
+    return {
+        "eventId": event_id,
+        "eventType": "ActivityTaskTimedOut",
+        "activityTaskTimedOutEventAttributes": {
+            "scheduledEventId": scheduled_event_id,
+            "timeoutType": "SCHEDULE_TO_CLOSE",
+        }
+    }
+
+
+def workflow_started(event_id=1, input=None, version="0.0.1"):
+    attributes = {
+        "workflowType": {"name": "MyWorkflow.MyActivities", "version": version},
+        "taskList": {"name": "flowbee-test-tasks"},
+    }
+
+    if input is not None:
+        attributes["input"] = compression.compress_b64_json(input)
+
+    return {
+        "eventId": event_id,
+        "eventType": "WorkflowExecutionStarted",
+        "workflowExecutionStartedEventAttributes": attributes
+    }
+
+
+def decision(event_id, event_type="DecisionTaskStarted"):
+    return {"eventId": event_id, "eventType": event_type}
+
+
+def decision_pages(events, page_size=100, previous_started_event_id=0):
+    """Split events into the newest first pages of a decision task"""
+    events = list(reversed(events))
+    pages = []
+
+    for offset in range(0, len(events), page_size):
+        pages.append({
+            "taskToken": "token",
+            "startedEventId": events[0]["eventId"],
+            "previousStartedEventId": previous_started_event_id,
+            "workflowExecution": {"workflowId": "workflow", "runId": "run"},
+            "workflowType": {"name": "MyWorkflow.MyActivities", "version": "0.0.1"},
+            "events": events[offset:offset + page_size],
+        })
+
+    for index, page in enumerate(pages[:-1]):
+        page["nextPageToken"] = "page-{0}".format(index + 1)
+
+    return pages
+
+
+def started(event_id, scheduled_event_id):
+    return {
+        "eventId": event_id,
+        "eventType": "ActivityTaskStarted",
+        "activityTaskStartedEventAttributes": {
+            "scheduledEventId": scheduled_event_id,
+        }
+    }
+
+
+def completed(event_id, scheduled_event_id, result=None):
+    return {
+        "eventId": event_id,
+        "eventType": "ActivityTaskCompleted",
+        "activityTaskCompletedEventAttributes": {
+            "scheduledEventId": scheduled_event_id,
+            "startedEventId": event_id - 1,
+            "result": compression.compress_b64_json(result),
+        }
+    }
+
+
+def failed(event_id, scheduled_event_id):
+    return {
+        "eventId": event_id,
+        "eventType": "ActivityTaskFailed",
+        "activityTaskFailedEventAttributes": {
+            "scheduledEventId": scheduled_event_id,
+            "startedEventId": event_id - 1,
+            "reason": "Exception",
+        }
+    }
+
+
+def cancel_requested(event_id, activity_id):
+    return {
+        "eventId": event_id,
+        "eventType": "ActivityTaskCancelRequested",
+        "activityTaskCancelRequestedEventAttributes": {
+            "activityId": activity_id,
+        }
+    }
+
+
+def canceled(event_id, scheduled_event_id, details="Cancellation requested"):
+    return {
+        "eventId": event_id,
+        "eventType": "ActivityTaskCanceled",
+        "activityTaskCanceledEventAttributes": {
+            "scheduledEventId": scheduled_event_id,
+            "startedEventId": event_id - 1,
+            "details": details,
+        }
+    }
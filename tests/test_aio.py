@@ -0,0 +1,73 @@
+import os
+import threading
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from flowbee import compression
+from tests.test_worker import (Stop, activity_task)
+
+try:
+    from flowbee.workers.aio import AsyncWorker
+    from tests.aio_workflow import (AsyncActivities, AsyncWorkflow)
+except (ImportError, SyntaxError):
+    # the asyncio runtime requires Python 3.7+
+    AsyncWorker = None
+
+
+@unittest.skipIf(AsyncWorker is None, "asyncio runtime requires Python 3.7+")
+class TestAsyncWorker(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("flowbee.utils.get_client")
+        self.addCleanup(patcher.stop)
+        self.client = patcher.start().return_value
+
+    def run_tasks(self, worker, tasks):
+        lock = threading.Lock()
+
+        def poll_for_task(**kwargs):
+            with lock:
+                if not tasks:
+                    raise Stop()
+                return tasks.pop()
+
+        worker.poll_for_task = poll_for_task
+
+        with self.assertRaises(Stop):
+            worker.poll()
+
+    def completed_results(self):
+        return sorted(
+            compression.decompress_b64_json(call[1]["result"])
+            for call in self.client.respond_activity_task_completed.call_args_list
+        )
+
+    def test_runs_async_and_sync_activities(self):
+        worker = AsyncWorker(AsyncWorkflow(), concurrency=4, pollers=1)
+        self.run_tasks(worker, [activity_task("add", 1, 2), activity_task("multiply", 2, 5)])
+
+        self.assertEqual(self.completed_results(), [3, 10])
+
+    def test_process_activity_runs_in_child(self):
+        worker = AsyncWorker(AsyncWorkflow(), concurrency=4, pollers=1, processes=1)
+        self.run_tasks(worker, [activity_task("pid")])
+
+        self.assertNotEqual(self.completed_results(), [os.getpid()])
+        self.assertEqual(self.client.respond_activity_task_completed.call_count, 1)
+
+    def test_failed_activity_fails_task(self):
+        worker = AsyncWorker(AsyncWorkflow(), concurrency=4, pollers=1)
+        self.run_tasks(worker, [activity_task("broken")])
+
+        self.assertTrue(self.client.respond_activity_task_failed.called)
+        self.assertFalse(self.client.respond_activity_task_completed.called)
+
+    def test_runs_activities_on_the_loop_concurrently(self):
+        worker = AsyncWorker(AsyncWorkflow(), concurrency=5, pollers=2)
+        self.run_tasks(worker, [activity_task("slow") for _ in range(20)])
+
+        self.assertEqual(self.client.respond_activity_task_completed.call_count, 20)
+        self.assertLessEqual(AsyncActivities.peak, 5)
+        self.assertGreater(AsyncActivities.peak, 1)
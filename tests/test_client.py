@@ -0,0 +1,31 @@
+import os
+import unittest
+from flowbee import utils
+
+
+class TestClient(unittest.TestCase):
+
+    def tearDown(self):
+        utils._client_overrides.clear()
+        utils._clients.clear()
+        os.environ.pop("FLOWBEE_SWF_POOL_SIZE", None)
+
+    def test_client_is_shared(self):
+        self.assertIs(utils.get_client(), utils.get_client())
+
+    def test_configure_client_rebuilds(self):
+        client = utils.get_client()
+        utils.configure_client(max_pool_connections=25)
+        self.assertIsNot(client, utils.get_client())
+        self.assertEqual(utils.get_client_settings()["max_pool_connections"], 25)
+
+    def test_environment_settings(self):
+        os.environ["FLOWBEE_SWF_POOL_SIZE"] = "40"
+        self.assertEqual(utils.get_client_settings()["max_pool_connections"], 40)
+
+        utils.configure_client(max_pool_connections=5)
+        self.assertEqual(utils.get_client_settings()["max_pool_connections"], 5)
+
+    def test_unknown_setting(self):
+        with self.assertRaises(TypeError):
+            utils.configure_client(pool=1)
@@ -0,0 +1,53 @@
+import unittest
+from flowbee import compression
+
+# gzip payload written before codecs were tagged
+LEGACY = "H4sIADxu91YC/6tWSixKL1ayUohWyilNrlSK1VFQyi6HilUrpeXng+lEIKmUpKQDIqwUDGtrawHg8m1aOQAAAA=="
+
+
+class TestCompression(unittest.TestCase):
+
+    def tearDown(self):
+        compression.configure_compression()
+
+    def test_decodes_legacy_gzip(self):
+        payload = compression.decompress_b64_json(LEGACY)
+        self.assertEqual(sorted(payload), ["args", "kwargs"])
+
+    def test_small_payloads_are_not_compressed(self):
+        value = compression.compress_b64_json({"a": 1})
+
+        self.assertEqual(value[0], compression.CODECS["none"].tag)
+        self.assertEqual(compression.decompress_b64_json(value), {"a": 1})
+
+    def test_large_payloads_are_compressed(self):
+        payload = {"data": ["value"] * 1000}
+        value = compression.compress_b64_json(payload)
+
+        self.assertIn(value[0], ("z", "s"))
+        self.assertLess(len(value), len(compression.to_json(payload)))
+        self.assertEqual(compression.decompress_b64_json(value), payload)
+
+    def test_every_codec_round_trips(self):
+        payload = {"data": list(range(500))}
+
+        for name, codec in compression.CODECS.items():
+            compression.configure_compression(codec=name, min_size=0)
+            value = compression.compress_b64_json(payload)
+
+            self.assertEqual(value[0], codec.tag)
+            self.assertEqual(compression.decompress_b64_json(value), payload)
+
+    def test_level(self):
+        data = "flowbee " * 1000
+        fast = compression.compress_b64(data, codec="zlib")
+        compression.configure_compression(level=1)
+
+        self.assertNotEqual(compression.compress_b64(data, codec="zlib"), fast)
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            compression.configure_compression(codec="snappy")
+
+        with self.assertRaises(ValueError):
+            compression.decompress_b64("?abc")
@@ -0,0 +1,232 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from botocore.exceptions import ClientError
+from flowbee import polling
+from flowbee.exceptions import EventException
+from flowbee.deciders import Decider
+from flowbee.deciders.history import CachedHistory
+from flowbee.cli.test import MyWorkflow
+from tests.events import (workflow_started, decision, timer_started, timer_fired, decision_pages)
+
+try:
+    import asyncio
+    from concurrent import futures
+    from flowbee.deciders.aio import AsyncDecider
+except (ImportError, SyntaxError):
+    # the asyncio runtime requires Python 3.7+
+    AsyncDecider = None
+
+
+class TestDecider(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("flowbee.utils.get_client")
+        self.addCleanup(patcher.stop)
+        get_client = patcher.start()
+
+        workflow = MyWorkflow()
+        workflow.activities.client = get_client.return_value
+        self.decider = Decider(workflow)
+
+    def run_task(self, events, page_size=100, previous_started_event_id=0):
+        pages = decision_pages(events, page_size, previous_started_event_id)
+        client = self.decider.client
+        client.poll_for_decision_task.side_effect = pages[1:]
+        client.reset_mock()
+
+        self.decider.handle_task(pages[0])
+        return client
+
+    def decisions(self, client):
+        return [
+            each["decisionType"]
+            for call in client.respond_decision_task_completed.call_args_list
+            for each in call[1]["decisions"]
+        ]
+
+    def test_first_decision_starts_timer(self):
+        client = self.run_task([
+            workflow_started(1, input={"data": 1}),
+            decision(2, "DecisionTaskScheduled"),
+            decision(3),
+        ])
+
+        self.assertEqual(self.decisions(client), ["StartTimer"])
+
+    def test_cached_history_fetches_new_pages_only(self):
+        first = [
+            workflow_started(1, input={"data": 1}),
+            decision(2, "DecisionTaskScheduled"),
+            decision(3),
+        ]
+        second = first + [
+            decision(4, "DecisionTaskCompleted"),
+            timer_started(5, "timer"),
+            timer_fired(6, "timer", 5),
+            decision(7, "DecisionTaskScheduled"),
+            decision(8),
+        ]
+
+        self.run_task(first, page_size=2)
+        client = self.run_task(second, page_size=2, previous_started_event_id=3)
+
+        # pages are [8, 7], [6, 5], [4, 3] - the third reaches the cache
+        self.assertEqual(client.poll_for_decision_task.call_count, 2)
+        self.assertEqual(self.decisions(client), ["ScheduleActivityTask"])
+
+        history = self.decider.history_cache.get(("workflow", "run"))
+        self.assertEqual(history.last_event_id, 8)
+        self.assertEqual(
+            [evt.type for evt in history.events],
+            ["WorkflowExecutionStarted", "TimerStarted", "TimerFired"]
+        )
+
+    def test_cold_cache_fetches_full_history(self):
+        events = [
+            workflow_started(1, input={"data": 1}),
+            decision(2, "DecisionTaskScheduled"),
+            decision(3),
+            decision(4, "DecisionTaskCompleted"),
+            timer_started(5, "timer"),
+            timer_fired(6, "timer", 5),
+            decision(7, "DecisionTaskScheduled"),
+            decision(8),
+        ]
+
+        client = self.run_task(events, page_size=2, previous_started_event_id=3)
+
+        self.assertEqual(client.poll_for_decision_task.call_count, 3)
+        self.assertEqual(self.decisions(client), ["ScheduleActivityTask"])
+
+    def test_long_history_streams_oldest_first(self):
+        events = [
+            workflow_started(1, input={"data": 1}),
+            decision(2, "DecisionTaskScheduled"),
+            decision(3),
+            decision(4, "DecisionTaskCompleted"),
+            timer_started(5, "timer"),
+            timer_fired(6, "timer", 5),
+            decision(7, "DecisionTaskScheduled"),
+            decision(8),
+        ]
+        self.decider.max_pages = 2
+        self.decider.page_size = 3
+        self.decider.client.get_workflow_execution_history.side_effect = [
+            {"events": events[0:3], "nextPageToken": "page-1"},
+            {"events": events[3:6], "nextPageToken": "page-2"},
+            {"events": events[6:8] + [timer_started(9, "timer")]},
+        ]
+
+        client = self.run_task(events, page_size=3, previous_started_event_id=3)
+
+        self.assertEqual(client.poll_for_decision_task.call_count, 1)
+        self.assertEqual(client.poll_for_decision_task.call_args[1]["maximumPageSize"], 3)
+        self.assertEqual(client.get_workflow_execution_history.call_count, 3)
+        self.assertEqual(self.decisions(client), ["ScheduleActivityTask"])
+
+        history = self.decider.history_cache.get(("workflow", "run"))
+        self.assertEqual(history.last_event_id, 8)
+        self.assertEqual(
+            [evt.type for evt in history.events],
+            ["WorkflowExecutionStarted", "TimerStarted", "TimerFired"]
+        )
+
+    def test_failed_page_abandons_task(self):
+        events = [
+            workflow_started(1, input={"data": 1}),
+            decision(2, "DecisionTaskScheduled"),
+            decision(3),
+        ]
+        self.decider.backoff = polling.Backoff(sleep=lambda delay: None)
+        pages = decision_pages(events, page_size=2)
+        client = self.decider.client
+        client.poll_for_decision_task.side_effect = ClientError(
+            {"Error": {"Code": "InternalFailure", "Message": "failure"}}, "PollForDecisionTask"
+        )
+
+        self.decider.handle_task(pages[0])
+
+        self.assertFalse(client.respond_decision_task_completed.called)
+        # nothing from the task made it into the cached history
+        self.assertEqual(self.decider.history_cache.get(("workflow", "run")).last_event_id, 0)
+
+
+@unittest.skipIf(AsyncDecider is None, "asyncio runtime requires Python 3.7+")
+class TestAsyncDecider(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("flowbee.utils.get_client")
+        self.addCleanup(patcher.stop)
+        get_client = patcher.start()
+
+        workflow = MyWorkflow()
+        workflow.activities.client = get_client.return_value
+        self.decider = AsyncDecider(workflow, max_pages=2, page_size=3)
+
+    def test_pages_are_prepared_one_at_a_time(self):
+        events = [
+            workflow_started(1, input={"data": 1}),
+            decision(2, "DecisionTaskScheduled"),
+            decision(3),
+            decision(4, "DecisionTaskCompleted"),
+            timer_started(5, "timer"),
+            timer_fired(6, "timer", 5),
+            decision(7, "DecisionTaskScheduled"),
+            decision(8),
+        ]
+        pages = decision_pages(events, 3, 3)
+        client = self.decider.client
+        client.poll_for_decision_task.side_effect = pages[1:]
+        client.get_workflow_execution_history.side_effect = [
+            {"events": events[0:3], "nextPageToken": "page-1"},
+            {"events": events[3:6], "nextPageToken": "page-2"},
+            {"events": events[6:8]},
+        ]
+        history = CachedHistory()
+        self.decider.get_history = lambda meta, task: history
+        fetched = []
+        extend = history.extend
+
+        def record(meta, events, last_event_id=None):
+            if events:
+                fetched.append(client.get_workflow_execution_history.call_count)
+
+            return extend(meta, events, last_event_id)
+
+        history.extend = record
+
+        self.decider.thread_pool = futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.decider.thread_pool.shutdown)
+
+        asyncio.run(self.decider.handle_task_async(pages[0]))
+
+        # every page is prepared before the next one is fetched, the
+        # last one only holds decision events
+        self.assertEqual(fetched, [1, 2])
+        self.assertEqual(client.get_workflow_execution_history.call_count, 3)
+        self.assertEqual(history.last_event_id, 8)
+        self.assertEqual(
+            [each["decisionType"] for each in client.respond_decision_task_completed.call_args[1]["decisions"]],
+            ["ScheduleActivityTask"]
+        )
+
+    def test_failed_preparation_fails_workflow(self):
+        events = [
+            workflow_started(1, input={"data": 1}),
+            decision(2, "DecisionTaskScheduled"),
+            decision(3),
+        ]
+        history = CachedHistory()
+        history.extend = mock.Mock(side_effect=EventException("bad event"))
+        self.decider.get_history = lambda meta, task: history
+        self.decider.thread_pool = futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.decider.thread_pool.shutdown)
+
+        asyncio.run(self.decider.handle_task_async(decision_pages(events, 100)[0]))
+
+        decisions = self.decider.client.respond_decision_task_completed.call_args[1]["decisions"]
+        self.assertEqual(decisions[0]["decisionType"], "FailWorkflowExecution")
+        self.assertEqual(decisions[0]["failWorkflowExecutionDecisionAttributes"]["reason"], "EventException")
@@ -0,0 +1,71 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from flowbee import utils
+from flowbee import exceptions
+from flowbee.decisions import Decisions
+
+
+class TestDecisions(unittest.TestCase):
+
+    def types(self, decisions):
+        return [item["decisionType"] for item in decisions]
+
+    def test_flush_sends_one_response(self):
+        client = mock.Mock()
+        decisions = Decisions()
+        decisions.start_timer(5, "timer")
+        decisions.schedule_activity("stage1", "0.0.1", "activity", "tasks")
+        decisions.complete_workflow()
+        decisions.flush(client, "token")
+
+        client.respond_decision_task_completed.assert_called_once_with(
+            taskToken="token", decisions=decisions.items
+        )
+        self.assertEqual(
+            self.types(decisions),
+            ["StartTimer", "ScheduleActivityTask", "CompleteWorkflowExecution"]
+        )
+
+    def test_flush_only_once(self):
+        decisions = Decisions()
+        decisions.flush(mock.Mock(), "token")
+
+        with self.assertRaises(exceptions.DeciderException):
+            decisions.flush(mock.Mock(), "token")
+
+    def test_close_decision_is_last(self):
+        decisions = Decisions()
+        decisions.complete_workflow()
+
+        with self.assertRaises(exceptions.DeciderException):
+            decisions.start_timer(5, "timer")
+
+    def test_fail_discards_pending_decisions(self):
+        decisions = Decisions()
+        decisions.start_timer(5, "timer")
+        decisions.fail_workflow("Exception", details="boom")
+
+        self.assertEqual(self.types(decisions), ["FailWorkflowExecution"])
+
+    def test_helpers_respond_directly(self):
+        client = mock.Mock()
+        utils.complete_workflow(client, "token", result="done")
+
+        decisions = client.respond_decision_task_completed.call_args[1]["decisions"]
+        self.assertEqual(decisions[0]["completeWorkflowExecutionDecisionAttributes"]["result"], "done")
+
+    def test_continue_as_new_closes(self):
+        decisions = Decisions()
+        decisions.continue_as_new(input="state", version="0.0.2", execution_start_to_close_timeout=60)
+
+        self.assertTrue(decisions.closed)
+        self.assertEqual(
+            decisions.items[0]["continueAsNewWorkflowExecutionDecisionAttributes"],
+            {"input": "state", "workflowTypeVersion": "0.0.2", "executionStartToCloseTimeout": "60"}
+        )
+
+        with self.assertRaises(exceptions.DeciderException):
+            decisions.start_timer(5, "timer")
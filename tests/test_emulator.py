@@ -0,0 +1,392 @@
+import random
+import unittest
+import boto3
+from botocore.exceptions import ClientError
+from flowbee import utils
+from flowbee import compression
+from flowbee.activities import (Activities, Workflow)
+from flowbee.activities.utils import (activity, entrypoint, workflow)
+from flowbee.deciders import Decider
+from flowbee.emulator import (SWFEmulator, EmulatorServer)
+from flowbee.workers import Worker
+
+
+class EmulatedActivities(Activities):
+    @activity(version="0.0.1")
+    def double(self, value):
+        return value * 2
+
+    @activity(version="0.0.1")
+    def add(self, a, b):
+        return a + b
+
+
+@workflow(domain="flowbee-emulator", tasklist="flowbee-emulator-tasks")
+class EmulatedWorkflow(Workflow):
+    activities = EmulatedActivities()
+
+    @entrypoint(version="0.0.1")
+    def start(self, input=None):
+        futures = [self.activities.double.start(value) for value in input]
+        doubled = self.activities.wait_all(futures)
+        self.activities.sleep(1)
+        return self.activities.add(*doubled)
+
+
+@workflow(domain="flowbee-emulator", tasklist="flowbee-emulator-tasks", max_history_events=20)
+class CountingWorkflow(Workflow):
+    activities = EmulatedActivities()
+
+    @entrypoint(version="0.0.1")
+    def start(self, input=None):
+        total, remaining = input["total"], input["remaining"]
+
+        while remaining:
+            self.checkpoint({"total": total, "remaining": remaining})
+            total = self.activities.add(total, 1)
+            remaining -= 1
+
+        return total
+
+
+@workflow(domain="flowbee-emulator", tasklist="flowbee-emulator-children")
+class DoublingWorkflow(Workflow):
+    activities = EmulatedActivities()
+
+    @entrypoint(version="0.0.1")
+    def start(self, input=None):
+        if input < 0:
+            raise ValueError("negative input")
+
+        return self.activities.double(input)
+
+
+@workflow(domain="flowbee-emulator", tasklist="flowbee-emulator-tasks")
+class FanOutWorkflow(Workflow):
+    activities = EmulatedActivities()
+
+    @entrypoint(version="0.0.1")
+    def start(self, input=None):
+        return sum(self.activities.map_child_workflows(DoublingWorkflow, input, concurrency=2))
+
+
+@workflow(domain="flowbee-emulator", tasklist="flowbee-emulator-results")
+class ResultWorkflow(Workflow):
+    activities = EmulatedActivities()
+
+    @entrypoint(version="0.0.1")
+    def start(self, input=None):
+        if input == "object":
+            return object()
+
+        # floats barely compress, this encodes well past 32k characters
+        generator = random.Random(0)
+        return [generator.random() for _ in range(input)]
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def history(emulator, workflow_id, run_id):
+    return emulator.get_workflow_execution_history(
+        domain="flowbee-emulator",
+        execution={"workflowId": workflow_id, "runId": run_id}
+    )["events"]
+
+
+class TestEmulator(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.emulator = SWFEmulator(poll_timeout=0, clock=self.clock)
+        utils.set_client(self.emulator)
+        self.addCleanup(utils.set_client, None)
+
+    def run_execution(self, decider, worker, steps=50):
+        domain = EmulatedWorkflow.domain
+        tasklist = EmulatedWorkflow.tasklist
+
+        for _ in range(steps):
+            task = decider.poll_for_task(domain, "decider", tasklist)
+
+            if task is not None:
+                decider.handle_task(task)
+
+            task = worker.poll_for_task(domain, "worker", tasklist)
+
+            if task is not None:
+                worker.handle_task(task)
+
+            # fire the workflow's timer
+            self.clock.now += 1
+
+            if not self.emulator.open_executions:
+                return
+
+        self.fail("Execution did not close")
+
+    def test_get_client_returns_emulator(self):
+        self.assertIs(utils.get_client(), self.emulator)
+
+    def test_execution_runs_to_completion(self):
+        utils.create_resources(EmulatedWorkflow)
+        workflow_id, run_id = EmulatedWorkflow.start_execution(input=[1, 2])
+
+        decider = Decider(EmulatedWorkflow())
+        # the decider flags the activities it replays, workers in the
+        # same process need their own instance
+        workflow = EmulatedWorkflow()
+        workflow.activities = EmulatedActivities()
+        worker = Worker(workflow)
+        self.run_execution(decider, worker)
+
+        events = history(self.emulator, workflow_id, run_id)
+        types = [event["eventType"] for event in events]
+        results = [
+            compression.decompress_b64_json(event["activityTaskCompletedEventAttributes"]["result"])
+            for event in events if event["eventType"] == "ActivityTaskCompleted"
+        ]
+
+        self.assertEqual([event["eventId"] for event in events], list(range(1, len(events) + 1)))
+        self.assertEqual(types[-1], "WorkflowExecutionCompleted")
+        self.assertIn("TimerFired", types)
+        self.assertEqual(sorted(results), [2, 4, 6])
+
+    def test_checkpoint_continues_as_new(self):
+        utils.create_resources(CountingWorkflow)
+        workflow_id, _ = CountingWorkflow.start_execution(input={"total": 0, "remaining": 10})
+
+        decider = Decider(CountingWorkflow())
+        workflow = CountingWorkflow()
+        workflow.activities = EmulatedActivities()
+        self.run_execution(decider, Worker(workflow))
+
+        runs = [
+            history(self.emulator, workflow_id, run_id)
+            for _, execution_id, run_id in self.emulator.executions
+            if execution_id == workflow_id
+        ]
+        closes = [events[-1]["eventType"] for events in runs]
+        results = [
+            compression.decompress_b64_json(event["activityTaskCompletedEventAttributes"]["result"])
+            for events in runs for event in events if event["eventType"] == "ActivityTaskCompleted"
+        ]
+
+        self.assertGreater(len(runs), 2)
+        self.assertEqual(closes.count("WorkflowExecutionCompleted"), 1)
+        self.assertEqual(closes.count("WorkflowExecutionContinuedAsNew"), len(runs) - 1)
+        self.assertTrue(all(len(events) < 30 for events in runs))
+        self.assertEqual(sorted(results), list(range(1, 11)))
+
+    def run_children(self, inputs):
+        utils.create_resources(FanOutWorkflow)
+        utils.create_resources(DoublingWorkflow)
+        workflow_id, run_id = FanOutWorkflow.start_execution(input=inputs)
+
+        parent = Decider(FanOutWorkflow())
+        child = Decider(DoublingWorkflow())
+        workflow = DoublingWorkflow()
+        workflow.activities = EmulatedActivities()
+        worker = Worker(workflow)
+
+        for _ in range(100):
+            for decider in (parent, child):
+                task = decider.poll_for_task(decider.workflow.domain, "decider", decider.workflow.tasklist)
+
+                if task is not None:
+                    decider.handle_task(task)
+
+            task = worker.poll_for_task(workflow.domain, "worker", workflow.tasklist)
+
+            if task is not None:
+                worker.handle_task(task)
+
+            if not self.emulator.open_executions:
+                return history(self.emulator, workflow_id, run_id)
+
+        self.fail("Execution did not close")
+
+    def test_child_workflows_fan_out(self):
+        events = self.run_children([1, 2, 3, 4, 5])
+        running = peak = 0
+
+        for event in events:
+            if event["eventType"] == "ChildWorkflowExecutionStarted":
+                running += 1
+                peak = max(peak, running)
+            elif event["eventType"] == "ChildWorkflowExecutionCompleted":
+                running -= 1
+
+        attributes = events[-1]["workflowExecutionCompletedEventAttributes"]
+        self.assertEqual(compression.decompress_b64_json(attributes["result"]), 30)
+        self.assertEqual(peak, 2)
+
+    def test_child_workflow_failure_fails_parent(self):
+        events = self.run_children([1, -1, 2])
+        attributes = events[-1]["workflowExecutionFailedEventAttributes"]
+
+        self.assertEqual(attributes["reason"], "ChildWorkflowFailedException")
+        self.assertIn("ChildWorkflowExecutionFailed", attributes["details"])
+
+    def close_result_workflow(self, input):
+        workflow_id, run_id = ResultWorkflow.start_execution(input=input)
+        decider = Decider(ResultWorkflow())
+        decider.handle_task(decider.poll_for_task("flowbee-emulator", "decider", "flowbee-emulator-results"))
+
+        return history(self.emulator, workflow_id, run_id)[-1]
+
+    def test_unencodable_result_fails_workflow(self):
+        event = self.close_result_workflow("object")
+
+        self.assertEqual(event["eventType"], "WorkflowExecutionFailed")
+        self.assertEqual(event["workflowExecutionFailedEventAttributes"]["reason"], "TypeError")
+
+    def test_oversized_result_fails_workflow(self):
+        event = self.close_result_workflow(5000)
+
+        self.assertEqual(event["eventType"], "WorkflowExecutionFailed")
+        self.assertIn("32768", event["workflowExecutionFailedEventAttributes"]["details"])
+
+    def test_start_executions_streams_inputs(self):
+        consumed = []
+
+        def inputs():
+            for value in range(25):
+                consumed.append(value)
+                yield [value]
+
+        results = EmulatedWorkflow.start_executions(inputs(), concurrency=4)
+        first = next(results)
+
+        # inputs are read as the pool frees up, not all at once
+        self.assertLess(len(consumed), 25)
+
+        results = [first] + list(results)
+        self.assertEqual(sorted(result.input[0] for result in results), list(range(25)))
+        self.assertTrue(all(result.error is None for result in results))
+        self.assertEqual(len(set(result.run_id for result in results)), 25)
+
+    def test_start_executions_reports_errors(self):
+        results = list(EmulatedWorkflow.start_executions([[1], [2]], version="9.9.9"))
+
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(result.run_id is None for result in results))
+        self.assertTrue(all("9.9.9" in str(result.error) for result in results))
+
+        with self.assertRaises(ValueError):
+            next(EmulatedWorkflow.start_executions([[1]], workflow_id="single"))
+
+    def test_duplicate_registration(self):
+        self.emulator.register_domain(name="flowbee-emulator", workflowExecutionRetentionPeriodInDays="1")
+
+        with self.assertRaises(ClientError) as context:
+            self.emulator.register_domain(name="flowbee-emulator", workflowExecutionRetentionPeriodInDays="1")
+
+        self.assertEqual(context.exception.response["Error"]["Code"], "DomainAlreadyExistsFault")
+
+    def test_already_started(self):
+        EmulatedWorkflow.start_execution(input=[1], workflow_id="single")
+
+        with self.assertRaises(ClientError) as context:
+            EmulatedWorkflow.start_execution(input=[1], workflow_id="single")
+
+        self.assertEqual(
+            context.exception.response["Error"]["Code"], "WorkflowExecutionAlreadyStartedFault"
+        )
+
+    def test_decision_task_pages(self):
+        EmulatedWorkflow.start_execution(input=[1])
+        page = self.emulator.poll_for_decision_task(
+            domain="flowbee-emulator", taskList={"name": "flowbee-emulator-tasks"},
+            maximumPageSize=2, reverseOrder=True
+        )
+        event_ids = [event["eventId"] for event in page["events"]]
+
+        while "nextPageToken" in page:
+            page = self.emulator.poll_for_decision_task(
+                domain="flowbee-emulator", taskList={"name": "flowbee-emulator-tasks"},
+                maximumPageSize=2, nextPageToken=page["nextPageToken"]
+            )
+            event_ids.extend(event["eventId"] for event in page["events"])
+
+        self.assertEqual(event_ids, [3, 2, 1])
+
+    def test_activity_schedule_to_start_timeout(self):
+        EmulatedWorkflow.start_execution(input=[1])
+        decider = Decider(EmulatedWorkflow())
+        decider.handle_task(decider.poll_for_task("flowbee-emulator", "decider", "flowbee-emulator-tasks"))
+
+        # activity_decision schedules with scheduleToStartTimeout=10
+        self.clock.now += 11
+        task = decider.poll_for_task("flowbee-emulator", "decider", "flowbee-emulator-tasks")
+        types = [event["eventType"] for event in task["events"]]
+
+        self.assertIn("ActivityTaskTimedOut", types)
+
+    def test_invalid_decision_rejects_the_batch(self):
+        workflow_id, run_id = EmulatedWorkflow.start_execution(input=[1])
+        task = self.emulator.poll_for_decision_task(
+            domain="flowbee-emulator", taskList={"name": "flowbee-emulator-tasks"}
+        )
+        timer = {
+            "decisionType": "StartTimer",
+            "startTimerDecisionAttributes": {"timerId": "timer", "startToFireTimeout": "5"}
+        }
+
+        with self.assertRaises(ClientError) as context:
+            self.emulator.respond_decision_task_completed(
+                taskToken=task["taskToken"], decisions=[timer, {"decisionType": "StartTimer"}]
+            )
+
+        self.assertEqual(context.exception.response["Error"]["Code"], "ValidationException")
+        types = [event["eventType"] for event in history(self.emulator, workflow_id, run_id)]
+        self.assertEqual(types[-1], "DecisionTaskStarted")
+
+        # the task is still open and can be answered
+        self.emulator.respond_decision_task_completed(taskToken=task["taskToken"], decisions=[timer])
+        types = [event["eventType"] for event in history(self.emulator, workflow_id, run_id)]
+        self.assertEqual(types[-2:], ["DecisionTaskCompleted", "TimerStarted"])
+
+    def test_unknown_task_token(self):
+        with self.assertRaises(ClientError) as context:
+            self.emulator.respond_activity_task_completed(taskToken="missing", result="")
+
+        self.assertEqual(context.exception.response["Error"]["Code"], "UnknownResourceFault")
+
+
+class TestEmulatorServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = EmulatorServer(("127.0.0.1", 0), emulator=SWFEmulator(poll_timeout=0))
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def client(self):
+        return boto3.session.Session(
+            aws_access_key_id="flowbee", aws_secret_access_key="flowbee", region_name="us-east-1"
+        ).client("swf", endpoint_url=self.server.url)
+
+    def test_boto3_client(self):
+        client = self.client()
+        client.register_domain(name="flowbee-emulator", workflowExecutionRetentionPeriodInDays="1")
+        client.start_workflow_execution(
+            domain="flowbee-emulator", workflowId="remote",
+            workflowType={"name": "remote", "version": "0.0.1"},
+            taskList={"name": "remote"}
+        )
+        task = client.poll_for_decision_task(domain="flowbee-emulator", taskList={"name": "remote"})
+
+        self.assertEqual(
+            [event["eventType"] for event in task["events"]],
+            ["WorkflowExecutionStarted", "DecisionTaskScheduled", "DecisionTaskStarted"]
+        )
+
+        with self.assertRaises(ClientError) as context:
+            client.register_domain(name="flowbee-emulator", workflowExecutionRetentionPeriodInDays="1")
+
+        self.assertEqual(context.exception.response["Error"]["Code"], "DomainAlreadyExistsFault")
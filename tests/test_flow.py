@@ -1,3 +1,4 @@
+from __future__ import print_function
 import unittest
 import logging
 from flowbee.workers import Worker
@@ -17,7 +18,7 @@ class TestFlow(unittest.TestCase):
         runner.create_resources()
 
     def test_flow(self):
-        for each in xrange(2):
+        for each in range(2):
             MyWorkflow.start_execution(
                 input={"meta": {}, "data": {"a": "b", "b": 1}},
                 version="0.0.1",
@@ -25,7 +26,7 @@ class TestFlow(unittest.TestCase):
                 task_start_to_close_timeout="10"
             )
 
-        for each in xrange(0):
+        for each in range(0):
             MyWorkflow.start_execution(
                 input={"meta": {}, "data": {"a": "b", "b": 1}},
                 version="0.0.2",
@@ -41,7 +42,7 @@ class TestFlow(unittest.TestCase):
 
         def decider():
             def signal_handler(signal, frame):
-                print 'CHILD SIGINT [decider]'
+                print('CHILD SIGINT [decider]')
                 sys.exit(0)
 
             signal.signal(signal.SIGINT, signal_handler)
@@ -51,7 +52,7 @@ class TestFlow(unittest.TestCase):
 
         def worker():
             def signal_handler(signal, frame):
-                print 'CHILD SIGINT [worker]'
+                print('CHILD SIGINT [worker]')
                 sys.exit(0)
 
             signal.signal(signal.SIGINT, signal_handler)
@@ -62,7 +63,7 @@ class TestFlow(unittest.TestCase):
         processes = []
 
         def signal_handler(signal, frame):
-            print 'MASTER SIGINT'
+            print('MASTER SIGINT')
             sys.exit(0)
 
         signal.signal(signal.SIGINT, signal_handler)
@@ -0,0 +1,217 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from flowbee.models import TaskMeta
+from flowbee.activities import (Activities, Workflow)
+from flowbee.activities.futures import child_workflow_id
+from flowbee.activities.utils import (activity, entrypoint, workflow)
+from flowbee.deciders import Decider
+from flowbee.exceptions import ActivityCancelledException
+from tests.events import (
+    workflow_started, decision, scheduled, started, completed, failed, decision_pages,
+    cancel_requested, canceled
+)
+
+
+class ParallelActivities(Activities):
+    @activity(version="0.0.1")
+    def double(self, value):
+        return value * 2
+
+    @activity(version="0.0.1", retries=1)
+    def triple(self, value):
+        return value * 3
+
+
+@workflow(domain="flowbee-test", tasklist="flowbee-test-tasks")
+class ParallelWorkflow(Workflow):
+    activities = ParallelActivities()
+
+    @entrypoint(version="0.0.1")
+    def start(self, input=None):
+        futures = [
+            self.activities.double.start(input),
+            self.activities.triple.start(input),
+        ]
+        return self.activities.wait_all(futures)
+
+
+@workflow(domain="flowbee-test", tasklist="flowbee-test-tasks")
+class CancellingWorkflow(Workflow):
+    activities = ParallelActivities()
+
+    @entrypoint(version="0.0.1")
+    def start(self, input=None):
+        future = self.activities.double.start(input)
+
+        if input > 1:
+            self.activities.cancel(future)
+
+        try:
+            return self.activities.wait_all(future)
+        except ActivityCancelledException:
+            return "cancelled"
+
+
+PREFIX = "com.flowbee-test.ParallelWorkflow.workflow.run"
+CANCEL_PREFIX = "com.flowbee-test.CancellingWorkflow.workflow.run"
+
+
+class TestFutures(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("flowbee.utils.get_client")
+        self.addCleanup(patcher.stop)
+        self.client = patcher.start().return_value
+
+        workflow = ParallelWorkflow()
+        workflow.activities.client = self.client
+        self.decider = Decider(workflow, history_cache_size=0)
+
+    def run_task(self, events):
+        self.client.reset_mock()
+        self.decider.handle_task(decision_pages(events)[0])
+        return self.client.respond_decision_task_completed.call_args_list
+
+    def test_schedules_all_activities_in_one_decision(self):
+        calls = self.run_task([workflow_started(1, input=2), decision(2)])
+
+        self.assertEqual(len(calls), 1)
+        decisions = calls[0][1]["decisions"]
+        self.assertEqual(
+            [each["scheduleActivityTaskDecisionAttributes"]["activityId"] for each in decisions],
+            [PREFIX + ".double@0.0.1#0-0", PREFIX + ".triple@0.0.1#1-0"]
+        )
+
+    def test_partial_completion_answers_without_decisions(self):
+        calls = self.run_task([
+            workflow_started(1, input=2),
+            scheduled(2, PREFIX + ".double@0.0.1#0-0"),
+            scheduled(3, PREFIX + ".triple@0.0.1#1-0"),
+            started(4, 2),
+            completed(5, 2, result=4),
+            decision(6),
+        ])
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][1]["decisions"], [])
+
+    def test_failure_is_retried(self):
+        calls = self.run_task([
+            workflow_started(1, input=2),
+            scheduled(2, PREFIX + ".double@0.0.1#0-0"),
+            scheduled(3, PREFIX + ".triple@0.0.1#1-0"),
+            started(4, 3),
+            failed(5, 3),
+            decision(6),
+        ])
+
+        decisions = calls[0][1]["decisions"]
+        self.assertEqual(len(decisions), 1)
+        self.assertEqual(
+            decisions[0]["scheduleActivityTaskDecisionAttributes"]["activityId"],
+            PREFIX + ".triple@0.0.1#1-1"
+        )
+
+    def test_completes_when_all_futures_are_done(self):
+        self.run_task([
+            workflow_started(1, input=2),
+            scheduled(2, PREFIX + ".double@0.0.1#0-0"),
+            scheduled(3, PREFIX + ".triple@0.0.1#1-0"),
+            started(4, 2),
+            completed(5, 2, result=4),
+            started(6, 3),
+            completed(7, 3, result=6),
+            decision(8),
+        ])
+
+        decisions = self.client.respond_decision_task_completed.call_args[1]["decisions"]
+        self.assertEqual(decisions[0]["decisionType"], "CompleteWorkflowExecution")
+
+    def test_start_runs_inline_outside_the_decider(self):
+        activities = ParallelActivities()
+        future = activities.double.start(4)
+
+        self.assertTrue(future.done())
+        self.assertEqual(future.result(), 8)
+        self.assertEqual(activities.wait_all(future), [8])
+
+
+class TestCancel(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("flowbee.utils.get_client")
+        self.addCleanup(patcher.stop)
+        self.client = patcher.start().return_value
+
+        workflow = CancellingWorkflow()
+        workflow.activities.client = self.client
+        self.decider = Decider(workflow, history_cache_size=0)
+
+    def run_task(self, events):
+        self.client.reset_mock()
+        self.decider.handle_task(decision_pages(events)[0])
+        return self.client.respond_decision_task_completed.call_args[1]["decisions"]
+
+    def test_requests_cancellation_of_running_activity(self):
+        decisions = self.run_task([
+            workflow_started(1, input=2),
+            scheduled(2, CANCEL_PREFIX + ".double@0.0.1#0-0"),
+            started(3, 2),
+            decision(4),
+        ])
+
+        self.assertEqual(decisions, [{
+            "decisionType": "RequestCancelActivityTask",
+            "requestCancelActivityTaskDecisionAttributes": {
+                "activityId": CANCEL_PREFIX + ".double@0.0.1#0-0"
+            }
+        }])
+
+    def test_requests_cancellation_once(self):
+        decisions = self.run_task([
+            workflow_started(1, input=2),
+            scheduled(2, CANCEL_PREFIX + ".double@0.0.1#0-0"),
+            started(3, 2),
+            cancel_requested(4, CANCEL_PREFIX + ".double@0.0.1#0-0"),
+            decision(5),
+        ])
+
+        self.assertEqual(decisions, [])
+
+    def test_cancelled_activity_fails_future(self):
+        decisions = self.run_task([
+            workflow_started(1, input=2),
+            scheduled(2, CANCEL_PREFIX + ".double@0.0.1#0-0"),
+            started(3, 2),
+            cancel_requested(4, CANCEL_PREFIX + ".double@0.0.1#0-0"),
+            canceled(5, 2),
+            decision(6),
+        ])
+
+        self.assertEqual(decisions[0]["decisionType"], "CompleteWorkflowExecution")
+
+    def test_cancel_before_start_drops_the_activity(self):
+        decisions = self.run_task([workflow_started(1, input=2), decision(2)])
+
+        self.assertEqual(decisions[0]["decisionType"], "CompleteWorkflowExecution")
+
+
+class TestChildWorkflowId(unittest.TestCase):
+
+    def test_ids_are_valid_for_swf(self):
+        meta = TaskMeta("token", "22jbI+1/Tm4Q=", "parent", "domain", "tasks")
+        workflow_id = child_workflow_id(meta, "Child", 3)
+
+        self.assertTrue(workflow_id.startswith("parent."))
+        self.assertTrue(workflow_id.endswith(".Child#3"))
+        self.assertFalse(set(":/|") & set(workflow_id))
+
+    def test_long_parent_ids_are_hashed(self):
+        meta = TaskMeta("token", "run", "p" * 256, "domain", "tasks")
+        workflow_id = child_workflow_id(meta, "Child", 0)
+
+        self.assertLessEqual(len(workflow_id), 256)
+        self.assertNotEqual(workflow_id, child_workflow_id(meta._replace(run_id="other"), "Child", 0))
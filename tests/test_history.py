@@ -0,0 +1,93 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from flowbee.deciders.history import CachedHistory
+from flowbee.deciders.utils import prepare_event
+from tests.events import (META, scheduled, timer_started, timer_fired, timed_out)
+
+
+def index(raw):
+    history = CachedHistory()
+    history.extend(META, raw)
+    return history.index
+
+
+class TestHistoryIndex(unittest.TestCase):
+
+    def test_activity_attempts(self):
+        history = index([
+            scheduled(1, "wf.stage1@0.0.1-0"),
+            scheduled(2, "wf.stage1@0.0.1-1"),
+            scheduled(3, "wf.stage1@0.0.10-0"),
+        ])
+
+        self.assertEqual(history.count_activity_attempts("wf.stage1@0.0.1"), 2)
+        self.assertEqual(history.count_activity_attempts("wf.stage1@0.0.10"), 1)
+        self.assertEqual(history.count_activity_attempts("wf.stage2@0.0.1"), 0)
+
+    def test_timer_started_uses_started_event_id(self):
+        history = index([
+            timer_started(1, "timer"),
+            timer_started(2, "timer"),
+        ])
+
+        self.assertEqual(history.get_timer_started("timer", 1).event_id, 1)
+        self.assertEqual(history.get_timer_started("timer").event_id, 2)
+
+    def test_prepare_failure_event(self):
+        raw = [
+            scheduled(1, "wf.stage1@0.0.1-0"),
+            timed_out(2, 1),
+            scheduled(3, "wf.stage1@0.0.1-1"),
+        ]
+        event = prepare_event(META, raw[1], index(raw))
+
+        self.assertEqual(event.activity_id, "wf.stage1@0.0.1")
+        self.assertEqual(event.num_retries, 2)
+
+    def test_prepare_timer_fired(self):
+        raw = [timer_started(1, "timer"), timer_fired(2, "timer", 1)]
+        event = prepare_event(META, raw[1], index(raw[:1]))
+
+        self.assertEqual(event.timer_id, "timer")
+        self.assertIsNone(event.payload)
+
+    def test_payload_is_decoded_lazily(self):
+        raw = scheduled(1, "wf.stage1@0.0.1-0")
+
+        with mock.patch("flowbee.compression.decompress_b64_json") as decode:
+            decode.return_value = {"args": [], "kwargs": {}}
+            event = prepare_event(META, raw, index([]))
+            self.assertFalse(decode.called)
+
+            self.assertEqual(event.payload, {"args": [], "kwargs": {}})
+            self.assertEqual(event.payload, {"args": [], "kwargs": {}})
+            self.assertEqual(decode.call_count, 1)
+
+    def test_prepared_events_drop_raw_events(self):
+        raw = [
+            scheduled(1, "wf.stage1@0.0.1-0"),
+            timed_out(2, 1),
+            timer_started(3, "timer"),
+            timer_fired(4, "timer", 3),
+        ]
+        history = CachedHistory()
+        events = history.extend(META, raw)
+
+        for event in events:
+            self.assertFalse(hasattr(event, "__dict__"))
+            self.assertFalse(any(value is item for item in raw for value in slot_values(event)))
+
+        # only the events referred back to are indexed
+        self.assertEqual(sorted(history.index.events), [1, 3])
+
+
+def slot_values(event):
+    return [
+        getattr(event, name)
+        for cls in type(event).__mro__
+        for name in getattr(cls, "__slots__", ())
+        if hasattr(event, name)
+    ]
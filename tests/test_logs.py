@@ -0,0 +1,102 @@
+import json
+import logging
+import unittest
+from flowbee import logs
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("flowbee.test_logs")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.handler = Records()
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def test_lazy_skips_disabled_levels(self):
+        calls = []
+
+        def expensive():
+            calls.append(1)
+            return "formatted"
+
+        self.logger.debug("value %s", logs.lazy(expensive))
+        self.assertEqual(calls, [])
+
+        self.logger.info("value %s", logs.lazy(expensive))
+        self.assertEqual(self.handler.records[0].getMessage(), "value formatted")
+
+    def test_key_value_formatter(self):
+        self.logger.info("Scheduling", extra=logs.fields(activity_id="a-1", reason="two words"))
+        text = logs.KeyValueFormatter("%(message)s").format(self.handler.records[0])
+
+        self.assertEqual(text, 'Scheduling activity_id=a-1 reason="two words"')
+
+    def test_json_formatter(self):
+        self.logger.info("Scheduling %s", "stage1", extra=logs.fields(size=10))
+        data = json.loads(logs.JSONFormatter().format(self.handler.records[0]))
+
+        self.assertEqual(data["message"], "Scheduling stage1")
+        self.assertEqual(data["size"], 10)
+        self.assertEqual(data["level"], "INFO")
+
+    def test_sampling_keeps_warnings(self):
+        sample_filter = logs.sample("flowbee.test_logs", 10)
+        self.addCleanup(self.logger.removeFilter, sample_filter)
+
+        for _ in range(100):
+            self.logger.info("chatty")
+
+        self.logger.warning("important")
+
+        messages = [record.getMessage() for record in self.handler.records]
+        self.assertEqual(messages.count("chatty"), 10)
+        self.assertEqual(messages[-1], "important")
+
+    def test_queue_moves_handlers(self):
+        listener = logs.start_queue("flowbee.test_logs")
+        self.assertIsNotNone(listener)
+        self.assertNotIn(self.handler, self.logger.handlers)
+
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            self.logger.exception("failed %s", "task")
+
+        logs.stop_queue("flowbee.test_logs")
+
+        self.assertIn(self.handler, self.logger.handlers)
+        record = self.handler.records[0]
+        self.assertEqual(record.getMessage(), "failed task")
+        self.assertIn("ValueError", record.exc_text)
+
+    def test_forked_children_bypass_the_queue(self):
+        logs.start_queue("flowbee.test_logs")
+        self.addCleanup(logs.stop_queue, "flowbee.test_logs")
+        queue_handler = self.logger.handlers[0]
+        # as seen from a child forked after the listener started
+        queue_handler.pid = -1
+
+        self.logger.info("from %s", "child")
+
+        self.assertEqual(queue_handler.queue.qsize(), 0)
+        self.assertEqual(self.handler.records[0].getMessage(), "from child")
+
+    def test_parse_sampling(self):
+        self.assertEqual(
+            logs.parse_sampling("flowbee.utils=100, flowbee.workers.base=10"),
+            {"flowbee.utils": 100, "flowbee.workers.base": 10}
+        )
+
+        with self.assertRaises(ValueError):
+            logs.parse_sampling("100")
@@ -0,0 +1,115 @@
+import socket
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from six.moves.urllib.request import urlopen
+from botocore.exceptions import ClientError
+from flowbee import metrics
+from flowbee import utils
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counters_by_tags(self):
+        self.registry.increment("polls", type="activity", result="empty")
+        self.registry.increment("polls", type="activity", result="empty")
+        self.registry.increment("polls", result="task", type="activity")
+
+        self.assertEqual(self.registry.get_counter("polls", type="activity", result="empty"), 2)
+        self.assertEqual(self.registry.get_counter("polls", result="task", type="activity"), 1)
+
+    def test_render_histogram(self):
+        self.registry.observe("latency_seconds", 0.2, buckets=(0.1, 1), operation="poll")
+        self.registry.observe("latency_seconds", 5, buckets=(0.1, 1), operation="poll")
+        text = self.registry.render()
+
+        self.assertIn("# TYPE latency_seconds histogram", text)
+        self.assertIn('latency_seconds_bucket{operation="poll",le="0.1"} 0', text)
+        self.assertIn('latency_seconds_bucket{operation="poll",le="1"} 1', text)
+        self.assertIn('latency_seconds_bucket{operation="poll",le="+Inf"} 2', text)
+        self.assertIn('latency_seconds_count{operation="poll"} 2', text)
+
+    def test_sinks_receive_samples(self):
+        sink = mock.Mock()
+        self.registry.add_sink(sink)
+
+        with self.registry.timer("work_seconds", activity="add"):
+            pass
+
+        name, value, tags = sink.observe.call_args[0]
+        self.assertEqual((name, tags), ("work_seconds", {"activity": "add"}))
+
+
+class TestExporters(unittest.TestCase):
+
+    def test_statsd_format(self):
+        sink = metrics.StatsDSink(prefix="flowbee.")
+        self.addCleanup(sink.close)
+
+        self.assertEqual(
+            sink.format("polls_total", 1, "c", {"type": "activity"}),
+            "flowbee.polls_total:1|c|#type:activity"
+        )
+
+    def test_statsd_sends_datagrams(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(5)
+        self.addCleanup(receiver.close)
+
+        sink = metrics.StatsDSink(port=receiver.getsockname()[1])
+        self.addCleanup(sink.close)
+        sink.observe("request_seconds", 0.25, {"operation": "poll"})
+
+        self.assertEqual(receiver.recv(1024), b"request_seconds:250|ms|#operation:poll")
+
+    def test_prometheus_endpoint(self):
+        registry = metrics.Registry()
+        registry.increment("flowbee_polls_total", result="task")
+        server = metrics.PrometheusServer(registry, ("127.0.0.1", 0)).start()
+        self.addCleanup(server.stop)
+
+        body = urlopen("http://127.0.0.1:{0}/metrics".format(server.port)).read().decode("utf-8")
+        self.assertIn('flowbee_polls_total{result="task"} 1', body)
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        registry = metrics.get_registry()
+        registry.clear()
+        self.addCleanup(registry.clear)
+        self.registry = registry
+        self.client = mock.Mock()
+
+    def test_empty_poll(self):
+        self.client.poll_for_activity_task.return_value = {}
+        utils.poll_for_activity_task(self.client, "domain", "identity", "tasks")
+
+        self.assertEqual(
+            self.registry.get_counter("flowbee_polls_total", type="activity", tasklist="tasks", result="empty"), 1
+        )
+        self.assertEqual(
+            self.registry.get_histogram(
+                "flowbee_swf_request_seconds", operation="poll_for_activity_task").count, 1
+        )
+
+    def test_swf_errors(self):
+        self.client.poll_for_decision_task.side_effect = ClientError(
+            {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+            "PollForDecisionTask"
+        )
+        utils.poll_for_decision_task(self.client, "domain", "identity", "tasks")
+
+        self.assertEqual(
+            self.registry.get_counter(
+                "flowbee_swf_errors_total", operation="poll_for_decision_task", code="ThrottlingException"), 1
+        )
+        self.assertEqual(
+            self.registry.get_counter("flowbee_polls_total", type="decision", tasklist="tasks", result="error"), 1
+        )
@@ -0,0 +1,100 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from botocore.exceptions import (ClientError, EndpointConnectionError)
+from flowbee import polling
+from flowbee import utils
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "PollForActivityTask")
+
+
+class TestBackoff(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        self.backoff = polling.Backoff(sleep=self.sleeps.append, random=lambda: 1.0)
+
+    def test_classify(self):
+        self.assertEqual(polling.classify(client_error("ThrottlingException")), polling.THROTTLED)
+        self.assertEqual(polling.classify(client_error("UnrecognizedClientException")), polling.FATAL)
+        self.assertEqual(polling.classify(client_error("InternalFailure")), polling.TRANSIENT)
+        self.assertEqual(
+            polling.classify(EndpointConnectionError(endpoint_url="https://swf")), polling.TRANSIENT
+        )
+
+    def test_throttling_grows_exponentially_up_to_cap(self):
+        for _ in range(8):
+            self.backoff.failed(client_error("ThrottlingException"))
+
+        self.assertEqual(self.sleeps, [1, 2, 4, 8, 16, 32, 60, 60])
+
+    def test_success_resets(self):
+        self.backoff.failed(client_error("ThrottlingException"))
+        self.backoff.failed(client_error("ThrottlingException"))
+        self.backoff.succeeded()
+        self.backoff.failed(client_error("ThrottlingException"))
+
+        self.assertEqual(self.sleeps, [1, 2, 1])
+
+    def test_fatal_waits_long(self):
+        backoff = polling.Backoff(sleep=self.sleeps.append, random=lambda: 0.0)
+        backoff.failed(client_error("AccessDeniedException"))
+
+        self.assertEqual(self.sleeps, [30])
+
+    def test_jitter(self):
+        backoff = polling.Backoff(sleep=self.sleeps.append, random=lambda: 0.25)
+        backoff.failed(client_error("ThrottlingException"))
+        backoff.failed(client_error("ThrottlingException"))
+
+        self.assertEqual(self.sleeps, [0.25, 0.5])
+
+    def test_poll_backs_off(self):
+        client = mock.Mock()
+        client.poll_for_activity_task.side_effect = client_error("ThrottlingException")
+
+        task = utils.poll_for_activity_task(client, "domain", "identity", "tasks", backoff=self.backoff)
+
+        self.assertIsNone(task)
+        self.assertEqual(self.sleeps, [1])
+
+
+class TestPollerScaler(unittest.TestCase):
+
+    def test_scales_down_when_idle(self):
+        scaler = polling.PollerScaler(4, window=5)
+
+        for _ in range(15):
+            scaler.record(False)
+
+        self.assertEqual(scaler.active, 1)
+        self.assertTrue(scaler.is_active(0))
+        self.assertFalse(scaler.is_active(1))
+
+        for _ in range(100):
+            scaler.record(False)
+
+        self.assertEqual(scaler.active, 1)
+
+    def test_scales_up_when_busy(self):
+        scaler = polling.PollerScaler(4, window=5)
+        scaler.active = 1
+
+        for _ in range(10):
+            scaler.record(True)
+
+        self.assertEqual(scaler.active, 3)
+
+    def test_mixed_load_holds(self):
+        scaler = polling.PollerScaler(4, window=4)
+        scaler.active = 2
+
+        for _ in range(5):
+            scaler.record(True)
+            scaler.record(False)
+
+        self.assertEqual(scaler.active, 2)
@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from flowbee import metrics
+from flowbee import ratelimit
+from flowbee import utils
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+
+    def limiter(self, rate, burst=None):
+        return ratelimit.RateLimiter(rate, burst=burst, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_burst_then_rate(self):
+        limiter = self.limiter(10, burst=5)
+        delays = [limiter.acquire() for _ in range(7)]
+
+        self.assertEqual(delays[:5], [0.0] * 5)
+        self.assertAlmostEqual(delays[5], 0.1)
+        self.assertAlmostEqual(delays[6], 0.1)
+        self.assertAlmostEqual(self.clock.now, 0.2)
+
+    def test_refills_up_to_burst(self):
+        limiter = self.limiter(2)
+        limiter.acquire()
+        limiter.acquire()
+        self.clock.now += 60
+
+        self.assertEqual([limiter.reserve() for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(limiter.reserve(), 0.5)
+
+    def test_reservations_queue_up(self):
+        limiter = self.limiter(4, burst=1)
+        limiter.reserve()
+
+        self.assertEqual([limiter.reserve() for _ in range(3)], [0.25, 0.5, 0.75])
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            self.limiter(0)
+
+
+@unittest.skipIf(ratelimit.fcntl is None, "fcntl is not available")
+class TestSharedRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "flowbee.ratelimit")
+
+    def limiter(self, slot=0):
+        limiter = ratelimit.SharedRateLimiter(
+            self.path, slot, 10, burst=2, clock=self.clock, sleep=self.clock.sleep
+        )
+        self.addCleanup(limiter.close)
+        return limiter
+
+    def test_processes_share_the_bucket(self):
+        first, second = self.limiter(), self.limiter()
+
+        self.assertEqual(first.reserve(), 0.0)
+        self.assertEqual(second.reserve(), 0.0)
+        self.assertAlmostEqual(first.reserve(), 0.1)
+        self.assertAlmostEqual(second.reserve(), 0.2)
+
+    def test_families_have_their_own_bucket(self):
+        poll, respond = self.limiter(0), self.limiter(1)
+        poll.reserve()
+        poll.reserve()
+
+        self.assertEqual(respond.reserve(), 0.0)
+        self.assertAlmostEqual(poll.reserve(), 0.1)
+
+
+class TestRateLimits(unittest.TestCase):
+
+    def tearDown(self):
+        ratelimit._overrides.clear()
+        ratelimit.clear_limiters()
+
+        for name in ratelimit.RATE_ENVIRON.values():
+            os.environ.pop(name, None)
+
+    def test_limiters_by_family(self):
+        os.environ["FLOWBEE_RATE_POLL"] = "5"
+        ratelimit.configure_rate_limits(respond="20:40")
+
+        poll = ratelimit.get_limiter("poll_for_decision_task")
+        respond = ratelimit.get_limiter("respond_decision_task_completed")
+
+        self.assertIs(poll, ratelimit.get_limiter("get_workflow_execution_history"))
+        self.assertEqual((poll.rate, poll.burst), (5.0, 5.0))
+        self.assertEqual((respond.rate, respond.burst), (20.0, 40.0))
+        self.assertIsNone(ratelimit.get_limiter("start_workflow_execution"))
+        self.assertIsNone(ratelimit.get_limiter("list_domains"))
+
+    def test_unknown_family(self):
+        with self.assertRaises(TypeError):
+            ratelimit.configure_rate_limits(list=1)
+
+    def test_request_waits_for_tokens(self):
+        registry = metrics.get_registry()
+        registry.clear()
+        self.addCleanup(registry.clear)
+        ratelimit.configure_rate_limits(start="1000:1")
+        limiter = ratelimit.get_limiter("start_workflow_execution")
+        clock = Clock()
+        limiter.clock, limiter.sleep, limiter.updated = clock, clock.sleep, clock.now
+        client = mock.Mock()
+
+        for _ in range(3):
+            utils.request(client, "start_workflow_execution", domain="domain")
+
+        self.assertEqual(client.start_workflow_execution.call_count, 3)
+        self.assertEqual(
+            registry.get_histogram(
+                "flowbee_rate_limit_wait_seconds", operation="start_workflow_execution").count, 2
+        )
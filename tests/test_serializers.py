@@ -0,0 +1,79 @@
+import datetime
+import decimal
+import unittest
+import uuid
+from flowbee import compression
+from flowbee import serializers
+from flowbee.activities import (Activities, Workflow)
+from flowbee.activities.utils import (activity, workflow, payload_serializer)
+
+
+class SerializerActivities(Activities):
+    @activity(version="0.0.1")
+    def default(self):
+        pass
+
+    @activity(version="0.0.1", serializer="json")
+    def explicit(self):
+        pass
+
+
+@workflow(domain="flowbee-test", tasklist="flowbee-test-tasks", serializer="json")
+class SerializerWorkflow(Workflow):
+    activities = SerializerActivities()
+
+
+PAYLOAD = {
+    "date": datetime.datetime(2016, 3, 26, 22, 20, 7, 17000),
+    "amount": decimal.Decimal("1.5"),
+    "id": uuid.UUID("044e31df-1fe3-4aa6-8a0a-f588c95205ed"),
+    "values": [1, 2.5, "three", None, True],
+}
+
+EXPECTED = {
+    "date": "2016-03-26T22:20:07.017",
+    "amount": 1.5,
+    "id": "044e31df-1fe3-4aa6-8a0a-f588c95205ed",
+    "values": [1, 2.5, "three", None, True],
+}
+
+
+class TestSerializers(unittest.TestCase):
+
+    def tearDown(self):
+        serializers.configure_serializer()
+
+    def test_backends_encode_custom_types_alike(self):
+        for name in serializers.SERIALIZERS:
+            data = serializers.dumps(PAYLOAD, name)
+            self.assertEqual(serializers.loads(data), EXPECTED, name)
+
+    def test_json_backends_read_each_other(self):
+        data = serializers.dumps(PAYLOAD, "json")
+        self.assertEqual(serializers.JSON.loads(data), EXPECTED)
+
+    def test_stdlib_json_special_values(self):
+        data = serializers.dumps({"value": float("inf")}, "json")
+        self.assertEqual(serializers.loads(data), {"value": float("inf")})
+
+    @unittest.skipIf(serializers.msgpack is None, "msgpack is not installed")
+    def test_msgpack_payloads_are_marked(self):
+        serializers.configure_serializer("msgpack")
+        value = compression.compress_b64_json(PAYLOAD)
+
+        self.assertEqual(compression.decompress_b64(value)[:1], serializers.MSGPACK_MARKER)
+        self.assertEqual(compression.decompress_b64_json(value), EXPECTED)
+
+    def test_activity_overrides_workflow(self):
+        workflow = SerializerWorkflow()
+
+        self.assertEqual(payload_serializer(SerializerActivities.default, workflow), "json")
+        self.assertEqual(payload_serializer(SerializerActivities.explicit, None), "json")
+        self.assertIsNone(payload_serializer(SerializerActivities.default, None))
+
+    def test_unknown_serializer(self):
+        with self.assertRaises(ValueError):
+            activity(version="0.0.1", serializer="pickle")
+
+        with self.assertRaises(ValueError):
+            serializers.configure_serializer("pickle")
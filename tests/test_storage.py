@@ -0,0 +1,79 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from flowbee import compression
+from flowbee import exceptions
+from flowbee import storage
+
+
+class TestStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.addCleanup(storage.configure_store)
+
+    def tearDown(self):
+        os.environ.pop("FLOWBEE_PAYLOAD_STORE", None)
+
+    def test_small_payloads_stay_inline(self):
+        storage.configure_store(self.root, threshold=1024)
+        value = compression.compress_b64_json({"a": 1})
+
+        self.assertFalse(storage.is_reference(value))
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_large_payloads_are_offloaded(self):
+        storage.configure_store("file://" + self.root, threshold=16)
+        payload = {"data": list(range(1000))}
+        value = compression.compress_b64_json(payload)
+
+        self.assertTrue(value.startswith(storage.REFERENCE_PREFIX))
+        self.assertEqual(len(value), len(storage.REFERENCE_PREFIX) + 64)
+        self.assertEqual(compression.decompress_b64_json(value), payload)
+
+        # content addressed, the same payload is stored once
+        self.assertEqual(compression.compress_b64_json(payload), value)
+        self.assertEqual(len(os.listdir(self.root)), 1)
+
+    def test_offloading_is_off_by_default(self):
+        storage.configure_store(threshold=16)
+        value = compression.compress_b64_json({"data": list(range(1000))})
+
+        self.assertFalse(storage.is_reference(value))
+
+    def test_store_from_environment(self):
+        os.environ["FLOWBEE_PAYLOAD_STORE"] = self.root
+        storage.configure_store()
+
+        self.assertIsInstance(storage.get_store(), storage.FileSystemStore)
+        self.assertEqual(storage.get_store().root, self.root)
+
+    def test_missing_store(self):
+        storage.configure_store()
+
+        with self.assertRaises(exceptions.PayloadStoreException):
+            storage.resolve(storage.REFERENCE_PREFIX + "0" * 64)
+
+    def test_missing_payload(self):
+        storage.configure_store(self.root)
+
+        with self.assertRaises(exceptions.PayloadStoreException):
+            storage.resolve(storage.REFERENCE_PREFIX + "0" * 64)
+
+    def test_s3_store(self):
+        client = mock.Mock()
+        client.get_object.return_value = {"Body": io.BytesIO(b"payload")}
+        store = storage.S3Store("bucket", prefix="flowbee/", client=client)
+
+        store.put("abc", b"payload")
+        client.put_object.assert_called_with(Bucket="bucket", Key="flowbee/abc", Body=b"payload")
+
+        self.assertEqual(store.get("abc"), b"payload")
+        client.get_object.assert_called_with(Bucket="bucket", Key="flowbee/abc")
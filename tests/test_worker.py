@@ -0,0 +1,280 @@
+import os
+import threading
+import time
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from concurrent import futures
+from botocore.exceptions import EndpointConnectionError
+from flowbee import compression
+from flowbee import storage
+from flowbee.activities import (Activities, Workflow)
+from flowbee.activities.utils import (activity, entrypoint, workflow, schedule_options)
+from flowbee.exceptions import ActivityCancelledException
+from flowbee import utils
+from flowbee.workers import Worker
+from flowbee.workers.heartbeat import Heartbeat
+
+
+class Stop(BaseException):
+    pass
+
+
+class WorkerActivities(Activities):
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    @activity(version="0.0.1")
+    def add(self, a, b):
+        return a + b
+
+    @activity(version="0.0.1", executor="process")
+    def pid(self):
+        return os.getpid()
+
+    @activity(version="0.0.1")
+    def parent_pid(self):
+        return os.getpid()
+
+    @activity(version="0.0.1", timeout=600, heartbeat_timeout=3)
+    def wait_for_cancel(self):
+        while not self.cancel_requested:
+            time.sleep(0.01)
+
+        self.heartbeat("stopping")
+
+    @activity(version="0.0.1")
+    def slow(self):
+        cls = self.__class__
+
+        with cls.lock:
+            cls.running += 1
+            cls.peak = max(cls.peak, cls.running)
+
+        time.sleep(0.05)
+
+        with cls.lock:
+            cls.running -= 1
+
+
+@workflow(domain="flowbee-test", tasklist="flowbee-test-tasks")
+class WorkerWorkflow(Workflow):
+    activities = WorkerActivities()
+
+
+class ExtendedActivities(WorkerActivities):
+    @activity(version="0.0.2")
+    def multiply(self, a, b):
+        return a * b
+
+
+class BaseWorkflow(Workflow):
+    @entrypoint(version="0.0.1")
+    def start(self, input=None):
+        return input
+
+
+@workflow(domain="flowbee-test", tasklist="flowbee-test-tasks")
+class ExtendedWorkflow(BaseWorkflow):
+    activities = ExtendedActivities()
+
+    @entrypoint(version="0.0.2")
+    def start_v2(self, input=None):
+        return input
+
+
+def activity_task(name, *args):
+    return {
+        "taskToken": "token-{0}".format(name),
+        "activityId": "activity",
+        "activityType": {"name": name, "version": "0.0.1"},
+        "input": compression.compress_b64_json({"args": args, "kwargs": {}}),
+        "workflowExecution": {"workflowId": "workflow", "runId": "run"},
+    }
+
+
+class TestWorker(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("flowbee.utils.get_client")
+        self.addCleanup(patcher.stop)
+        self.client = patcher.start().return_value
+
+    def test_handle_task_completes_activity(self):
+        worker = Worker(WorkerWorkflow())
+        worker.handle_task(activity_task("add", 1, 2))
+
+        result = self.client.respond_activity_task_completed.call_args[1]["result"]
+        self.assertEqual(compression.decompress_b64_json(result), 3)
+
+    def test_unknown_activity_fails_task(self):
+        worker = Worker(WorkerWorkflow())
+        worker.handle_task(activity_task("missing"))
+
+        self.assertTrue(self.client.respond_activity_task_failed.called)
+        self.assertFalse(self.client.respond_activity_task_completed.called)
+
+    def test_offloaded_input_without_store_fails_task(self):
+        storage.configure_store()
+        task = activity_task("add", 1, 2)
+        task["input"] = storage.REFERENCE_PREFIX + "0" * 64
+
+        worker = Worker(WorkerWorkflow())
+        worker.handle_task(task)
+
+        failed = self.client.respond_activity_task_failed.call_args[1]
+        self.assertEqual(failed["reason"], "Unable to decode activity input")
+        self.assertIn("no payload store is configured", failed["details"])
+        self.assertFalse(self.client.respond_activity_task_completed.called)
+
+    def completed_result(self):
+        result = self.client.respond_activity_task_completed.call_args[1]["result"]
+        return compression.decompress_b64_json(result)
+
+    def test_process_activity_runs_in_child(self):
+        worker = Worker(WorkerWorkflow(), processes=1)
+        self.addCleanup(worker.stop_process_pool)
+        worker.handle_task(activity_task("pid"))
+
+        self.assertNotEqual(self.completed_result(), os.getpid())
+        self.assertIsNotNone(worker.process_pool)
+
+    def test_worker_default_executor(self):
+        worker = Worker(WorkerWorkflow(), executor="process", processes=1)
+        self.addCleanup(worker.stop_process_pool)
+        worker.handle_task(activity_task("parent_pid"))
+
+        self.assertNotEqual(self.completed_result(), os.getpid())
+        self.assertTrue(worker.uses_processes())
+
+    def test_inherited_process_activity_uses_processes(self):
+        self.assertTrue(Worker(ExtendedWorkflow()).uses_processes())
+
+    def test_thread_activity_runs_in_parent(self):
+        worker = Worker(WorkerWorkflow())
+        worker.handle_task(activity_task("parent_pid"))
+
+        self.assertEqual(self.completed_result(), os.getpid())
+        self.assertIsNone(worker.process_pool)
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            activity(version="0.0.1", executor="gpu")
+
+    def test_cancelled_activity_stops(self):
+        self.client.record_activity_task_heartbeat.return_value = {"cancelRequested": True}
+        worker = Worker(WorkerWorkflow())
+        worker.handle_task(activity_task("wait_for_cancel"))
+
+        self.assertTrue(self.client.respond_activity_task_canceled.called)
+        self.assertFalse(self.client.respond_activity_task_completed.called)
+
+    def test_heartbeat_reports_progress(self):
+        self.client.record_activity_task_heartbeat.return_value = {"cancelRequested": False}
+        heartbeat = Heartbeat(self.client, "token", 30)
+        heartbeat.report({"done": 10})
+        heartbeat.beat()
+
+        self.client.record_activity_task_heartbeat.assert_called_with(
+            taskToken="token", details="{'done': 10}"
+        )
+        self.assertEqual(heartbeat.interval, 10)
+
+        self.client.record_activity_task_heartbeat.return_value = {"cancelRequested": True}
+        heartbeat.beat()
+
+        with self.assertRaises(ActivityCancelledException):
+            heartbeat.report()
+
+    def test_heartbeat_survives_connection_errors(self):
+        self.client.record_activity_task_heartbeat.side_effect = [
+            EndpointConnectionError(endpoint_url="https://swf"), {"cancelRequested": True}
+        ]
+        heartbeat = Heartbeat(self.client, "token", 30)
+        heartbeat.beat()
+
+        self.assertFalse(heartbeat.stopped.is_set())
+
+        heartbeat.beat()
+        self.assertTrue(heartbeat.cancel_requested)
+
+    def test_heartbeat_timeout_is_scheduled(self):
+        options = schedule_options(WorkerActivities.wait_for_cancel)
+        self.assertEqual(options, {"timeout": "600", "heartbeat_timeout": "3"})
+
+        options = schedule_options(WorkerActivities.add)
+        self.assertEqual(options, {"timeout": "10", "heartbeat_timeout": "NONE"})
+
+    def test_pollers_respect_concurrency(self):
+        worker = Worker(WorkerWorkflow(), concurrency=3, pollers=2)
+        tasks = [activity_task("slow") for _ in range(9)]
+        lock = threading.Lock()
+
+        def poll_for_task(**kwargs):
+            with lock:
+                if not tasks:
+                    raise Stop()
+                return tasks.pop()
+
+        worker.poll_for_task = poll_for_task
+        # Mock's call_count is not thread safe, list.append is
+        completed = []
+        self.client.respond_activity_task_completed.side_effect = lambda **kwargs: completed.append(kwargs)
+        executor = futures.ThreadPoolExecutor(max_workers=worker.concurrency)
+        capacity = threading.BoundedSemaphore(worker.concurrency)
+
+        def run_poller():
+            try:
+                worker.run_poller(executor, capacity)
+            except Stop:
+                pass
+
+        pollers = [threading.Thread(target=run_poller) for _ in range(worker.pollers)]
+
+        for poller in pollers:
+            poller.start()
+
+        for poller in pollers:
+            poller.join()
+
+        executor.shutdown(wait=True)
+
+        self.assertEqual(len(completed), 9)
+        self.assertLessEqual(WorkerActivities.peak, 3)
+        self.assertGreater(WorkerActivities.peak, 1)
+
+
+class TestDispatch(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("flowbee.utils.get_client")
+        self.addCleanup(patcher.stop)
+        self.client = patcher.start().return_value
+
+    def test_inherited_activities_are_found(self):
+        worker = Worker(ExtendedWorkflow())
+        worker.handle_task(activity_task("add", 1, 2))
+
+        result = self.client.respond_activity_task_completed.call_args[1]["result"]
+        self.assertEqual(compression.decompress_b64_json(result), 3)
+
+    def test_inherited_entrypoints_are_registered(self):
+        data = utils.get_workflow_data(ExtendedWorkflow)
+
+        self.assertEqual([version for _, version in data["workflows"]], ["0.0.1", "0.0.2"])
+        self.assertIn(("multiply", "0.0.2"), data["activities"])
+        self.assertIn(("add", "0.0.1"), data["activities"])
+
+    def test_duplicate_activity(self):
+        class DuplicateActivities(WorkerActivities):
+            @activity(name="add", version="0.0.1")
+            def other_add(self, a, b):
+                return a + b
+
+        with self.assertRaises(ValueError):
+            @workflow(domain="flowbee-test", tasklist="flowbee-test-tasks")
+            class DuplicateWorkflow(Workflow):
+                activities = DuplicateActivities()